@@ -0,0 +1,186 @@
+"""Async access to users.db for the ASGI app (asgi.py).
+
+Coroutines never touch SQLite on the event loop. Reads run on a small pool
+of reader threads, each with its own connection, so under WAL they proceed
+side by side and alongside the writer. Writes are serialized through one
+writer task that owns a single connection: pending writes queue up, and
+the writer runs each batch in one transaction on its own thread, with a
+savepoint per write so a failing write is undone without taking the rest
+of the batch with it, then commits once for all of them. Writers from the
+async routes therefore never wait on each other's locks or busy_timeout
+retries, and a burst of small writes costs one commit.
+
+The Flask routes and the task workers still write through db.pool; they
+contend with the writer for SQLite's lock as they always have.
+
+    adb = AsyncDatabase()
+    await adb.start()
+    payload = await adb.read(backend.load_from, sid)
+    turn = await adb.write(chatbot.start_turn, user_id, client_id, user_input)
+
+read() and write() call fn(conn, *args) and return its result. A write
+has been committed by the time write() returns, and its exception, if
+any, is raised there.
+"""
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+import db
+
+DEFAULT_READERS = 4
+DEFAULT_MAX_BATCH = 64
+
+_STOP = object()
+
+
+class _BatchConnection:
+    """The writer's connection as one write sees it.
+
+    Commits belong to the writer, so helpers that commit on their own
+    (conversations.store.append, ...) can run unchanged inside a batch.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def commit(self):
+        pass
+
+
+class AsyncDatabase:
+    def __init__(self, path=None, readers=DEFAULT_READERS, max_batch=DEFAULT_MAX_BATCH):
+        self.path = path
+        self.readers = readers
+        self.max_batch = max_batch
+        self._pool = None
+        self._read_threads = None
+        self._write_thread = None
+        self._queue = None
+        self._writer = None
+        self._lock = threading.Lock()
+        self.counters = {'reads': 0, 'writes': 0, 'failed_writes': 0, 'batches': 0,
+                         'largest_batch': 0}
+        self._write_wait = 0.0
+
+    @property
+    def started(self):
+        return self._writer is not None
+
+    async def start(self):
+        """Open the connections and start the writer on the running loop."""
+        if self._writer is not None:
+            return
+        # One connection per reader thread, plus the writer's
+        self._pool = db.ConnectionPool(self.path or db.pool.path, max_size=self.readers + 1)
+        self._read_threads = concurrent.futures.ThreadPoolExecutor(
+            self.readers, thread_name_prefix="aio-db-read")
+        self._write_thread = concurrent.futures.ThreadPoolExecutor(
+            1, thread_name_prefix="aio-db-write")
+        self._queue = asyncio.Queue()
+        self._writer = asyncio.create_task(self._write_loop())
+
+    async def close(self):
+        if self._writer is None:
+            return
+        await self._queue.put(_STOP)
+        await self._writer
+        self._writer = None
+        self._read_threads.shutdown()
+        self._write_thread.shutdown()
+        self._pool.close_all()
+
+    # ----- reads -----
+
+    def _read(self, fn, args):
+        conn = self._pool.acquire()
+        try:
+            return fn(conn, *args)
+        finally:
+            conn.close()
+
+    async def read(self, fn, *args):
+        with self._lock:
+            self.counters['reads'] += 1
+        return await asyncio.get_running_loop().run_in_executor(
+            self._read_threads, self._read, fn, args)
+
+    async def run(self, fn, *args):
+        """Run blocking code that opens its own connections on a reader thread."""
+        return await asyncio.get_running_loop().run_in_executor(self._read_threads, fn, *args)
+
+    # ----- writes -----
+
+    async def write(self, fn, *args):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((fn, args, future, time.perf_counter()))
+        return await future
+
+    def _apply(self, batch):
+        """Run a batch in one transaction on the writer thread; returns (result, error) per write."""
+        conn = self._pool.acquire()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            outcomes = []
+            batch_conn = _BatchConnection(conn)
+            for fn, args, _, _ in batch:
+                conn.execute("SAVEPOINT write")
+                try:
+                    result = fn(batch_conn, *args)
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write")
+                    outcomes.append((None, e))
+                else:
+                    outcomes.append((result, None))
+                conn.execute("RELEASE write")
+            conn.commit()
+            return outcomes
+        except Exception as e:
+            # The transaction itself failed: nothing in the batch was kept
+            if conn.in_transaction:
+                conn.rollback()
+            return [(None, e)] * len(batch)
+        finally:
+            conn.close()
+
+    async def _write_loop(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            if _STOP in batch:
+                batch.remove(_STOP)
+                stopping = True
+            if not batch:
+                continue
+            started = time.perf_counter()
+            outcomes = await loop.run_in_executor(self._write_thread, self._apply, batch)
+            with self._lock:
+                self.counters['batches'] += 1
+                self.counters['largest_batch'] = max(self.counters['largest_batch'], len(batch))
+                for (_, _, _, queued_at), (_, error) in zip(batch, outcomes):
+                    self.counters['writes'] += 1
+                    self.counters['failed_writes'] += error is not None
+                    self._write_wait += started - queued_at
+            for (_, _, future, _), (result, error) in zip(batch, outcomes):
+                if future.cancelled():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+    def stats(self):
+        with self._lock:
+            writes = self.counters['writes']
+            return dict(self.counters,
+                        avg_batch=round(writes / self.counters['batches'], 2)
+                        if self.counters['batches'] else 0.0,
+                        avg_write_wait_ms=round(self._write_wait / writes * 1000, 3)
+                        if writes else 0.0)
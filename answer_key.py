@@ -0,0 +1,144 @@
+"""Answer keys for test questions, and grading against them.
+
+question_answer_keys holds each test question's options (a JSON list) and
+its correct answer. AnswerKeyIndex loads the whole table into a dict keyed
+by question_id, with the accepted spellings of each correct answer already
+normalized: the option text itself and, for multiple choice, its letter.
+Grading a submission is then one dict lookup and one set membership test,
+with no query per answer.
+
+The app builds the index through the reference-data cache under the
+'answer_keys' namespace; triggers on question_answer_keys (migration v16)
+bump that namespace, so an edited key reaches every worker within the
+cache's check interval.
+
+The running score itself lives on test_sessions (answered_count,
+correct_count), kept up to date by a trigger on test_answers, so
+completing a test reads two columns instead of counting answers.
+
+Migration v16 only keys the seeded questions. Keys for the rest of the
+question bank are loaded from an NDJSON file, one
+{"question_id": ..., "correct_answer": ..., "options": [...]} per line:
+
+    python answer_key.py load keys.ndjson
+
+A submission for a question without a key is refused by /test/answer
+rather than recorded as wrong.
+"""
+import argparse
+import json
+import re
+
+OPTION_LABELS = 'ABCDEFGHIJ'
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize(answer):
+    return _WHITESPACE.sub(' ', str(answer)).strip().casefold()
+
+
+class MissingKey(LookupError):
+    """A test question has no answer key, so it can't be graded."""
+
+
+class AnswerKeyIndex:
+    def __init__(self, rows=()):
+        # question_id -> (options, accepted normalized answers)
+        self._keys = {}
+        for row in rows:
+            options = json.loads(row['options']) if row['options'] else []
+            correct = row['correct_answer']
+            accepted = {normalize(correct)}
+            if correct in options:
+                accepted.add(normalize(OPTION_LABELS[options.index(correct)]))
+            self._keys[row['question_id']] = (options, frozenset(accepted))
+
+    @classmethod
+    def load(cls, conn):
+        return cls(conn.execute(
+            "SELECT question_id, options, correct_answer FROM question_answer_keys"
+        ).fetchall())
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, question_id):
+        return question_id in self._keys
+
+    def options(self, question_id):
+        key = self._keys.get(question_id)
+        return list(key[0]) if key else []
+
+    def grade(self, question_id, answer):
+        """True if answer is correct; raises MissingKey if the question has no key."""
+        key = self._keys.get(question_id)
+        if key is None:
+            raise MissingKey(question_id)
+        return normalize(answer) in key[1]
+
+
+def save(conn, question_id, correct_answer, options=()):
+    """Add or replace a question's key; commit is left to the caller."""
+    options = list(options)
+    if options and correct_answer not in options:
+        raise ValueError("correct_answer must be one of the options")
+    conn.execute(
+        """INSERT INTO question_answer_keys (question_id, options, correct_answer)
+           VALUES (?, ?, ?)
+           ON CONFLICT (question_id) DO UPDATE
+           SET options = excluded.options, correct_answer = excluded.correct_answer""",
+        (question_id, json.dumps(options), correct_answer)
+    )
+
+
+def load(conn, lines):
+    """save() every key in an NDJSON stream; commit is left to the caller.
+
+    Returns (saved, rejected), where rejected lists the line numbers that
+    weren't a key or named a question that doesn't exist.
+    """
+    saved, rejected = 0, []
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            question_id = int(record['question_id'])
+            exists = conn.execute(
+                "SELECT 1 FROM interview_questions WHERE id = ?", (question_id,)
+            ).fetchone()
+            if not exists:
+                raise ValueError("no such question")
+            save(conn, question_id, record['correct_answer'], record.get('options') or ())
+        except (ValueError, TypeError, KeyError):
+            rejected.append(number)
+            continue
+        saved += 1
+    return saved, rejected
+
+
+def main():
+    import db
+
+    parser = argparse.ArgumentParser(description="Answer key tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("load", help="add or replace answer keys from an NDJSON file")
+    p.add_argument("path")
+    args = parser.parse_args()
+
+    conn = db.get_connection()
+    try:
+        with open(args.path, encoding="utf-8") as f:
+            saved, rejected = load(conn, f)
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"saved={saved} rejected={len(rejected)}")
+    if rejected:
+        print("rejected lines: " + " ".join(map(str, rejected[:20]))
+              + (" ..." if len(rejected) > 20 else ""))
+
+
+if __name__ == "__main__":
+    main()
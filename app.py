@@ -1,213 +1,80 @@
 from flask import Flask, render_template, request, redirect, url_for, jsonify, session
 import openai
 import sqlite3
+import hmac
 import os
 from flask_cors import CORS
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 import werkzeug.exceptions 
+import answer_key
+import applications
+import cache
+import chatbot
+import db
+import hashing
+import ingest
+import job_feed
+import matching
+import metrics
+import migrations
+import progress
+import rubric
+import sampling
+import search
+import session_store
+from scoring import analyze_answers
+import tasks
+import write_buffer
 
 app = Flask(__name__, template_folder='templates', static_folder='static')
 CORS(app)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "super_secret_key_should_be_in_env")
+# Keep interview/test state server-side; the cookie only carries a session id
+app.session_interface = session_store.make_session_interface(os.getenv("SESSION_BACKEND", "sqlite"))
 
 # OpenAI API Key
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
+# /chat, streamed or not, for the chatbot page
+app.register_blueprint(chatbot.chat_bp)
+
+# Latency, SQL, template and session metrics on /metrics
+if os.getenv("METRICS", "1") == "1":
+    metrics.init_app(app)
+    metrics.Collected("chat_cache_events_total", "Chat response cache lookups and stores.",
+                      "counter", ("event",),
+                      lambda: {(event,): n for event, n in chatbot.response_cache.counters.items()})
+    metrics.Collected("llm_client_events_total", "Chat model requests, retries and shed load.",
+                      "counter", ("event",),
+                      lambda: {(event,): n for event, n
+                               in getattr(getattr(chatbot.backend, "client", None), "counters", {}).items()})
+
 ALLOWED_TOPICS = ["resume", "interview", "career", "job", "mock"]
 
+# Careers, jobs and question metadata change rarely; serve them from memory
+reference_cache = cache.ReadThroughCache(shared=os.getenv("CACHE_SHARED", "1") == "1")
+
+# Shared secret for the bulk job import endpoint; unset disables it
+INGEST_TOKEN = os.getenv("INGEST_TOKEN")
+
+# Coalesce test answer inserts across requests (single worker process only)
+ANSWER_WRITE_BEHIND = os.getenv("ANSWER_WRITE_BEHIND") == "1"
+if ANSWER_WRITE_BEHIND:
+    write_buffer.answer_buffer.start()
+
 # ======= Database Utilities =======
 def get_db_connection():
-    conn = sqlite3.connect('users.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+    # Pooled, per-thread connection; conn.close() returns it to the pool
+    return db.get_connection()
 
 # ======= Initialize DB =======
 def init_db():
+    """Apply any pending schema migrations. A no-op when the schema is current."""
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Drop tables in reverse order of dependency to avoid foreign key constraint errors
-        cursor.execute("DROP TABLE IF EXISTS test_answers")
-        cursor.execute("DROP TABLE IF EXISTS test_questions")
-        cursor.execute("DROP TABLE IF EXISTS test_sessions")
-        cursor.execute("DROP TABLE IF EXISTS interview_answers")
-        cursor.execute("DROP TABLE IF EXISTS interview_questions_mapping")
-        cursor.execute("DROP TABLE IF EXISTS interviews")
-        cursor.execute("DROP TABLE IF EXISTS interview_questions")
-        cursor.execute("DROP TABLE IF EXISTS user_progress")
-        cursor.execute("DROP TABLE IF EXISTS users")
-        cursor.execute("DROP TABLE IF EXISTS jobs")  # Added jobs table drop
-        cursor.execute("DROP TABLE IF EXISTS careers")
-
-        # Create tables in order of dependency
-        cursor.execute('''
-            CREATE TABLE careers (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                description TEXT
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_activity TIMESTAMP
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE user_progress (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                last_activity TEXT,
-                progress_data TEXT,
-                FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE jobs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                company TEXT NOT NULL,
-                location TEXT NOT NULL,
-                description TEXT,
-                requirements TEXT,
-                posted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                career_id INTEGER,
-                FOREIGN KEY(career_id) REFERENCES careers(id)
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE interview_questions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                career_id INTEGER NOT NULL,
-                question TEXT NOT NULL,
-                question_type TEXT NOT NULL,
-                difficulty_level TEXT NOT NULL,
-                ideal_answer TEXT,
-                FOREIGN KEY(career_id) REFERENCES careers(id)
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE interviews (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                career_id INTEGER NOT NULL,
-                difficulty TEXT NOT NULL,
-                start_time DATETIME NOT NULL,
-                end_time DATETIME,
-                overall_score REAL,
-                FOREIGN KEY(user_id) REFERENCES users(id),
-                FOREIGN KEY(career_id) REFERENCES careers(id)
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE interview_questions_mapping (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                interview_id INTEGER NOT NULL,
-                question_id INTEGER NOT NULL,
-                FOREIGN KEY(interview_id) REFERENCES interviews(id),
-                FOREIGN KEY(question_id) REFERENCES interview_questions(id)
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE interview_answers (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                interview_id INTEGER NOT NULL,
-                question_id INTEGER NOT NULL,
-                answer_text TEXT,
-                is_audio BOOLEAN DEFAULT 0,
-                audio_path TEXT,
-                timestamp DATETIME NOT NULL,
-                score REAL,
-                feedback TEXT,
-                FOREIGN KEY(interview_id) REFERENCES interviews(id),
-                FOREIGN KEY(question_id) REFERENCES interview_questions(id)
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE test_sessions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                subject TEXT NOT NULL,
-                topic TEXT,
-                start_time DATETIME NOT NULL,
-                end_time DATETIME,
-                status TEXT NOT NULL,
-                score INTEGER,
-                FOREIGN KEY(user_id) REFERENCES users(id)
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE test_questions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                test_session_id INTEGER NOT NULL,
-                question_id INTEGER NOT NULL,
-                question_order INTEGER NOT NULL,
-                FOREIGN KEY(test_session_id) REFERENCES test_sessions(id),
-                FOREIGN KEY(question_id) REFERENCES interview_questions(id)
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE test_answers (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                test_session_id INTEGER NOT NULL,
-                question_id INTEGER NOT NULL,
-                user_id INTEGER NOT NULL,
-                answer TEXT NOT NULL,
-                is_correct BOOLEAN NOT NULL,
-                answered_at DATETIME NOT NULL,
-                FOREIGN KEY(test_session_id) REFERENCES test_sessions(id),
-                FOREIGN KEY(question_id) REFERENCES interview_questions(id),
-                FOREIGN KEY(user_id) REFERENCES users(id)
-            )
-        ''')
-        
-        # Insert sample data
-        cursor.execute('''
-            INSERT INTO careers (name, description) VALUES 
-            ('Software Engineering', 'Development of software applications and systems'),
-            ('Data Science', 'Extracting insights from complex data'),
-            ('Product Management', 'Overseeing product development and strategy'),
-            ('UX/UI Design', 'Designing user interfaces and experiences'),
-            ('Digital Marketing', 'Marketing products and services digitally')
-        ''')
-        
-        cursor.execute('''
-            INSERT INTO jobs (title, company, location, description, requirements, career_id)
-            VALUES 
-            ('Software Engineer', 'Tech Corp', 'Remote', 'Develop amazing software', 'Python, Flask, SQL', 1),
-            ('Data Scientist', 'Data Insights', 'New York', 'Analyze complex datasets', 'Python, ML, Statistics', 2),
-            ('UX Designer', 'Creative Solutions', 'San Francisco', 'Design user interfaces', 'Figma, UI/UX principles', 4)
-        ''')
-        
-        cursor.execute('''
-            INSERT INTO interview_questions 
-            (career_id, question, question_type, difficulty_level, ideal_answer) VALUES
-            (1, 'Please introduce yourself.', 'behavioral', 'beginner', 'A concise professional introduction including education and relevant experience.'),
-            (1, 'Explain the concept of object-oriented programming.', 'technical', 'beginner', 'Explanation should include encapsulation, inheritance, and polymorphism with examples.'),
-            (1, 'How would you approach debugging a complex issue?', 'problem-solving', 'intermediate', 'Should mention systematic approach: reproduce, isolate, identify, fix, test.'),
-            (1, 'Describe your experience with version control systems.', 'technical', 'beginner', 'Mention specific systems like Git and workflows like feature branching.'),
-            (1, 'What design patterns have you used in your projects?', 'technical', 'intermediate', 'Should mention common patterns like Singleton, Observer, Factory with context.'),
-            (1, 'How do you optimize application performance?', 'technical', 'advanced', 'Should mention profiling, database optimization, caching strategies, etc.'),
-            (1, 'Tell me about a challenging project you worked on.', 'behavioral', 'intermediate', 'Should demonstrate problem-solving and teamwork skills.')
-        ''')
-        
-        conn.commit()
+        applied = migrations.migrate(conn)
+        if applied:
+            app.logger.info(f"Applied schema migrations: {applied}")
     except Exception as e:
         app.logger.error(f"Database initialization error: {str(e)}")
         raise
@@ -216,6 +83,9 @@ def init_db():
 
 init_db()
 
+# Background workers for interview analysis
+tasks.queue.start(workers=int(os.getenv("TASK_WORKERS", "2")))
+
 # ======= Auth & Home Routes =======
 @app.route('/')
 def home():
@@ -239,7 +109,8 @@ def home():
                             user_data={
                                 'join_date': user['created_at'] if user['created_at'] else 'Unknown',
                                 'last_login': user['last_activity'] if user['last_activity'] else 'Never'
-                            })
+                            },
+                            progress=progress.for_user(conn, user['id']))
     except Exception as e:
         app.logger.error(f"Home route error: {str(e)}")
         return render_template('error.html', message="An error occurred loading your dashboard")
@@ -278,15 +149,35 @@ def login_post():
     if not email or not password:
         return jsonify({"success": False, "message": "Email and password required."}), 400
 
+    # Turn away credential-stuffing bursts before they cost a hash
+    if hashing.limiter.blocked(request.remote_addr, email):
+        return jsonify({"success": False, "message": "Too many failed attempts. Try again later."}), 429
+
     try:
         conn = get_db_connection()
         user = conn.execute(
             "SELECT * FROM users WHERE email = ?", 
             (email,)
         ).fetchone()
-        
-        if not user or not check_password_hash(user['password'], password):
-            return jsonify({"success": False, "message": "Invalid credentials."}), 401
+    except Exception as e:
+        app.logger.error(f"Login error: {str(e)}")
+        return jsonify({"success": False, "message": "An error occurred during login."}), 500
+    finally:
+        conn.close()
+
+    # Hash off the request thread without holding a pooled connection
+    try:
+        valid = user is not None and hashing.executor.verify_password(user['password'], password)
+    except hashing.Saturated:
+        return jsonify({"success": False, "message": "Server busy, please retry."}), 503, {"Retry-After": "1"}
+
+    if not valid:
+        hashing.limiter.record_failure(request.remote_addr, email)
+        return jsonify({"success": False, "message": "Invalid credentials."}), 401
+    hashing.limiter.record_success(email)
+
+    try:
+        conn = get_db_connection()
 
         # Update last login time
         conn.execute(
@@ -295,6 +186,7 @@ def login_post():
         )
         conn.commit()
         
+        session_store.regenerate(session)
         session['user_email'] = email
         session['user_name'] = user['name']
         session['user_id'] = user['id']
@@ -327,7 +219,10 @@ def signup_post():
     if len(password) < 8:
         return jsonify({"success": False, "message": "Password must be at least 8 characters."}), 400
 
-    hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
+    try:
+        hashed_password = hashing.executor.hash_password(password)
+    except hashing.Saturated:
+        return jsonify({"success": False, "message": "Server busy, please retry."}), 503, {"Retry-After": "1"}
 
     try:
         conn = get_db_connection()
@@ -347,6 +242,7 @@ def signup_post():
         
         conn.commit()
         
+        session_store.regenerate(session)
         session['user_email'] = email
         session['user_name'] = name
         session['user_id'] = user_id
@@ -376,20 +272,16 @@ def interview_home():
     
     try:
         conn = get_db_connection()
-        careers = conn.execute('SELECT * FROM careers').fetchall()
-        
-        progress = conn.execute(
-            "SELECT progress_data FROM user_progress WHERE user_id = ?", 
-            (session['user_id'],)
-        ).fetchone()
-        
-        progress_data = progress['progress_data'] if progress else None
+        careers = reference_cache.get_or_load(
+            'careers', ('careers',),
+            lambda: [dict(c) for c in conn.execute('SELECT * FROM careers').fetchall()]
+        )
         
         return render_template('interview.html', 
                             careers=careers,
                             user_email=session.get('user_email'),
                             user_name=session.get('user_name'),
-                            progress=progress_data)
+                            progress=progress.for_user(conn, session['user_id']))
         
     except Exception as e:
         app.logger.error(f"Interview home error: {str(e)}")
@@ -412,35 +304,16 @@ def start_interview():
         conn = get_db_connection()
         
         # Get questions for selected career and difficulty
-        questions = conn.execute(
-            """SELECT id, question, question_type 
-               FROM interview_questions 
-               WHERE career_id = ? AND difficulty_level = ? 
-               ORDER BY RANDOM() LIMIT 7""",
-            (career_id, difficulty)
-        ).fetchall()
+        seen = (sampling.seen_question_ids(conn, session['user_id'])
+                if data.get('avoid_repeats') else None)
+        questions = sampling.sampler.sample(conn, career_id, difficulty, 7, exclude=seen)
         
         if not questions:
             return jsonify({'error': 'No questions available'}), 404
         
-        questions = [dict(q) for q in questions]
-        
-        # Create interview session
-        cur = conn.execute(
-            """INSERT INTO interviews 
-               (user_id, career_id, difficulty, start_time) 
-               VALUES (?, ?, ?, ?)""",
-            (session['user_id'], career_id, difficulty, datetime.utcnow())
-        )
-        interview_id = cur.lastrowid
-        
-        # Save questions for this session
-        for q in questions:
-            conn.execute(
-                """INSERT INTO interview_questions_mapping 
-                   (interview_id, question_id) VALUES (?, ?)""",
-                (interview_id, q['id'])
-            )
+        # Create interview session with its questions
+        interview_id = create_interview(conn, session['user_id'], career_id, difficulty,
+                                        [q['id'] for q in questions])
         
         conn.commit()
         
@@ -512,61 +385,58 @@ def submit_answer():
         app.logger.error(f"Answer submission error: {str(e)}")
         return jsonify({'error': 'Failed to process answer'}), 500
 
+# Result of an interview where no question was answered
+NO_ANSWERS_RESULTS = {
+    'score': 0,
+    'feedback': "You didn't answer any questions. Please try again.",
+    'strengths': "None",
+    'areas_to_improve': "Answer all questions",
+    'technical_score': 0,
+    'communication_score': 0,
+    'confidence_score': 0
+}
+
+def create_interview(conn, user_id, career_id, difficulty, question_ids):
+    """Insert an interview and its questions; commit is left to the caller."""
+    cur = conn.execute(
+        """INSERT INTO interviews 
+           (user_id, career_id, difficulty, start_time) 
+           VALUES (?, ?, ?, ?)""",
+        (user_id, career_id, difficulty, datetime.utcnow())
+    )
+    write_buffer.save_interview_questions(conn, cur.lastrowid, question_ids)
+    return cur.lastrowid
+
+def record_interview(conn, interview):
+    """Save the answers and queue the analysis; returns its job id, or None if nothing was answered.
+
+    Commit is left to the caller.
+    """
+    write_buffer.save_interview_answers(conn, interview['id'], interview['answers'])
+    
+    # Generate analysis only for answered questions
+    if not any(a.get('answered') for a in interview['answers']):
+        return None
+    
+    # Scoring runs on the task workers; the client polls for the result
+    return tasks.queue.enqueue(conn, f"interview-analysis:{interview['id']}",
+                               'interview_analysis', {'interview_id': interview['id']})
+
 def finish_interview(interview):
     try:
         conn = get_db_connection()
         
         # Save all answers to database
-        for answer in interview['answers']:
-            conn.execute(
-                """INSERT INTO interview_answers 
-                   (interview_id, question_id, answer_text, is_audio, timestamp, answered) 
-                   VALUES (?, ?, ?, ?, ?, ?)""",
-                (interview['id'], answer['question_id'], 
-                 answer['text'], answer['is_audio'], answer['timestamp'],
-                 answer.get('answered', False))
-            )
-        
-        # Generate analysis only for answered questions
-        answered_questions = [a for a in interview['answers'] if a.get('answered')]
-        if not answered_questions:
-            return jsonify({
-                'status': 'completed',
-                'results': {
-                    'score': 0,
-                    'feedback': "You didn't answer any questions. Please try again.",
-                    'strengths': "None",
-                    'areas_to_improve': "Answer all questions",
-                    'technical_score': 0,
-                    'communication_score': 0,
-                    'confidence_score': 0
-                }
-            })
-        
-        analysis = analyze_answers(answered_questions)
-        
-        # Update interview completion
-        conn.execute(
-            """UPDATE interviews 
-               SET end_time = ?, overall_score = ? 
-               WHERE id = ?""",
-            (datetime.utcnow(), analysis.get('overall_score'), interview['id'])
-        )
-        
+        job_id = record_interview(conn, interview)
         conn.commit()
+        if job_id is None:
+            return jsonify({'status': 'completed', 'results': NO_ANSWERS_RESULTS})
         
         return jsonify({
-            'status': 'completed',
-            'results': {
-                'score': analysis.get('overall_score', 0),
-                'feedback': analysis.get('feedback'),
-                'strengths': analysis.get('strengths'),
-                'areas_to_improve': analysis.get('areas_to_improve'),
-                'technical_score': analysis.get('technical_score'),
-                'communication_score': analysis.get('communication_score'),
-                'confidence_score': analysis.get('confidence_score')
-            }
-        })
+            'status': 'processing',
+            'job_id': job_id,
+            'results_url': url_for('interview_results', interview_id=interview['id'])
+        }), 202
         
     except Exception as e:
         app.logger.error(f"Interview completion error: {str(e)}")
@@ -574,54 +444,72 @@ def finish_interview(interview):
     finally:
         conn.close()
 
-def analyze_answers(answers):
-    """Analyze only answered questions"""
-    if not answers:
+@tasks.queue.handler('interview_analysis')
+def run_interview_analysis(payload):
+    interview_id = payload['interview_id']
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(
+            """SELECT question_id, answer_text FROM interview_answers
+               WHERE interview_id = ? AND answered = 1
+               ORDER BY id""",
+            (interview_id,)
+        ).fetchall()
+        rubrics = rubric.cache.for_questions(conn, [r['question_id'] for r in rows])
+        analysis = analyze_answers([
+            {'question_id': r['question_id'], 'text': r['answer_text'], 'answered': True}
+            for r in rows
+        ], rubrics)
+        
+        # Update interview completion; a retried task finds it already done
+        finished = conn.execute(
+            """UPDATE interviews 
+               SET end_time = ?, overall_score = ? 
+               WHERE id = ? AND end_time IS NULL""",
+            (datetime.utcnow(), analysis.get('overall_score'), interview_id)
+        ).rowcount
+        if finished:
+            progress.record_interview(conn, interview_id)
+        conn.commit()
+        
         return {
-            'overall_score': 0,
-            'technical_score': 0,
-            'communication_score': 0,
-            'confidence_score': 0,
-            'feedback': "No answers provided",
-            'strengths': "None",
-            'areas_to_improve': "Please attempt all questions"
+            'score': analysis.get('overall_score', 0),
+            'feedback': analysis.get('feedback'),
+            'strengths': analysis.get('strengths'),
+            'areas_to_improve': analysis.get('areas_to_improve'),
+            'technical_score': analysis.get('technical_score'),
+            'communication_score': analysis.get('communication_score'),
+            'confidence_score': analysis.get('confidence_score')
         }
+    finally:
+        conn.close()
+
+@app.route('/interview/<int:interview_id>/results')
+def interview_results(interview_id):
+    if not session.get('user_id'):
+        return jsonify({'error': 'Unauthorized'}), 401
     
-    # Calculate scores only for answered questions
-    total_score = 0
-    tech_score = 0
-    comm_score = 0
-    
-    for answer in answers:
-        if not answer.get('text'):
-            continue
-            
-        length_score = min(len(answer['text']) / 20, 1) * 20
-        keyword_score = 10 if any(kw in answer['text'].lower() 
-                          for kw in ['experience', 'project', 'learn']) else 5
-        total_score += length_score + keyword_score
-        
-        tech_score += length_score * 1.2
+    try:
+        conn = get_db_connection()
+        owner = conn.execute(
+            "SELECT user_id FROM interviews WHERE id = ?", (interview_id,)
+        ).fetchone()
+        if not owner or owner['user_id'] != session['user_id']:
+            return jsonify({'error': 'Interview not found'}), 404
         
-        structure_bonus = 5 if ('first' in answer['text'] and 
-                              'then' in answer['text']) else 0
-        comm_score += length_score * 0.8 + structure_bonus
-    
-    # Normalize scores
-    total_score = min(int(total_score / len(answers)), 100)
-    tech_score = min(int(tech_score / len(answers)), 100)
-    comm_score = min(int(comm_score / len(answers)), 100)
-    confidence_score = min(total_score + 10, 100)
-    
-    return {
-        'overall_score': total_score,
-        'technical_score': tech_score,
-        'communication_score': comm_score,
-        'confidence_score': confidence_score,
-        'feedback': "You demonstrated good knowledge but could improve your answer structure.",
-        'strengths': "Technical understanding, clear communication",
-        'areas_to_improve': "Answer structure, providing more specific examples"
-    }
+        job = tasks.queue.status(conn, f"interview-analysis:{interview_id}")
+        if not job:
+            return jsonify({'error': 'No analysis for this interview'}), 404
+        if job['status'] == 'done':
+            return jsonify({'status': 'completed', 'results': job['result']})
+        if job['status'] == 'failed':
+            return jsonify({'status': 'failed', 'error': 'Interview analysis failed'}), 500
+        return jsonify({'status': 'processing', 'attempts': job['attempts']}), 202
+    except Exception as e:
+        app.logger.error(f"Interview results error: {str(e)}")
+        return jsonify({'error': 'Failed to load interview results'}), 500
+    finally:
+        conn.close()
 
 # ======= Test Routes =======
 @app.route('/test/select')
@@ -631,15 +519,18 @@ def test_selection():
     
     try:
         conn = get_db_connection()
-        subjects = conn.execute('''
-            SELECT DISTINCT c.name FROM careers c
-            JOIN interview_questions iq ON c.id = iq.career_id
-        ''').fetchall()
+        subjects = reference_cache.get_or_load(
+            'test_subjects', ('careers', 'questions'),
+            lambda: [s['name'] for s in conn.execute('''
+                SELECT DISTINCT c.name FROM careers c
+                JOIN interview_questions iq ON c.id = iq.career_id
+            ''').fetchall()]
+        )
         
         return render_template('test_selection.html',
                             user_email=session.get('user_email'),
                             user_name=session.get('user_name'),
-                            subjects=[s['name'] for s in subjects])
+                            subjects=subjects)
     except Exception as e:
         app.logger.error(f"Test selection error: {str(e)}")
         return render_template('error.html',
@@ -648,6 +539,62 @@ def test_selection():
     finally:
         conn.close()
 
+def pick_test_questions(conn, subject):
+    career = conn.execute(
+        "SELECT id FROM careers WHERE name = ?", (subject,)
+    ).fetchone()
+    return sampling.sampler.sample(
+        conn, career['id'], 'beginner', 10,
+        columns="id, question, question_type, difficulty_level"
+    ) if career else []
+
+def answer_key_index():
+    """The answer-key index, rebuilt when question_answer_keys changes."""
+    def load():
+        conn = get_db_connection()
+        try:
+            return answer_key.AnswerKeyIndex.load(conn)
+        finally:
+            conn.close()
+    return reference_cache.get_or_load('answer_keys', ('answer_keys',), load)
+
+def with_options(questions):
+    keys = answer_key_index()
+    return [dict(q, options=keys.options(q['id'])) for q in questions]
+
+def grade_test_answer(current_test, user_id, question_id, answer):
+    """The test_answers row for a submission, graded here rather than by the client.
+
+    Returns None if the question isn't part of this test; raises
+    answer_key.MissingKey if it has no answer key.
+    """
+    if not any(q['id'] == question_id for q in current_test['questions']):
+        return None
+    return (
+        current_test['id'],
+        question_id,
+        user_id,
+        answer,
+        answer_key_index().grade(question_id, answer),
+        datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    )
+
+def create_test_session(conn, user_id, subject, topic, question_ids):
+    """Insert a test session and its questions; commit is left to the caller."""
+    cursor = conn.execute('''
+        INSERT INTO test_sessions 
+        (user_id, subject, topic, start_time, status)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (
+        user_id,
+        subject,
+        topic,
+        datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'in_progress'
+    ))
+    write_buffer.save_test_questions(conn, cursor.lastrowid, question_ids)
+    return cursor.lastrowid
+
 @app.route('/test/start', methods=['POST'])
 def test_start():
     if 'user_id' not in session:
@@ -660,36 +607,10 @@ def test_start():
     try:
         conn = get_db_connection()
         
-        # Create test session
-        cursor = conn.execute('''
-            INSERT INTO test_sessions 
-            (user_id, subject, topic, start_time, status)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (
-            session['user_id'],
-            subject,
-            topic,
-            datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'in_progress'
-        ))
-        test_session_id = cursor.lastrowid
-        
-        # Get questions
-        questions = conn.execute('''
-            SELECT iq.id, iq.question, iq.question_type, iq.difficulty_level
-            FROM interview_questions iq
-            JOIN careers c ON iq.career_id = c.id
-            WHERE c.name = ? AND iq.difficulty_level = ?
-            ORDER BY RANDOM() LIMIT 10
-        ''', (subject, 'beginner')).fetchall()
-        
-        # Add questions to test
-        for i, question in enumerate(questions, 1):
-            conn.execute('''
-                INSERT INTO test_questions
-                (test_session_id, question_id, question_order)
-                VALUES (?, ?, ?)
-            ''', (test_session_id, question['id'], i))
+        # Get questions, then create the test session with them
+        questions = pick_test_questions(conn, subject)
+        test_session_id = create_test_session(conn, session['user_id'], subject, topic,
+                                              [q['id'] for q in questions])
         
         conn.commit()
         
@@ -698,12 +619,13 @@ def test_start():
             'id': test_session_id,
             'subject': subject,
             'topic': topic,
-            'questions': [dict(q) for q in questions]
+            'questions': with_options(questions)
         }
         
         return jsonify({
             'success': True,
-            'redirect': url_for('test_questions')
+            'redirect': url_for('test_questions'),
+            'questions': session['current_test']['questions']
         })
     except Exception as e:
         app.logger.error(f"Test start error: {str(e)}")
@@ -725,7 +647,7 @@ def test_questions():
             ORDER BY tq.question_order
         ''', (session['current_test']['id'],)).fetchall()
         
-        session['current_test']['questions'] = [dict(q) for q in questions]
+        session['current_test']['questions'] = with_options(questions)
         session.modified = True
         
         return render_template('test_questions.html',
@@ -748,32 +670,57 @@ def test_submit_answer():
     data = request.json
     question_id = data.get('question_id')
     answer = data.get('answer')
-    is_correct = data.get('is_correct')
+    
+    if answer is None or not isinstance(question_id, int):
+        return jsonify({'error': 'question_id and answer are required'}), 400
+    
+    # Any client-supplied is_correct is ignored
+    try:
+        row = grade_test_answer(session['current_test'], session['user_id'], question_id, answer)
+    except answer_key.MissingKey:
+        # Recording it as wrong would cost the user a point for our missing data
+        app.logger.error(f"No answer key for question {question_id}; load one with answer_key.py")
+        return jsonify({'error': 'This question cannot be graded yet'}), 500
+    if row is None:
+        return jsonify({'error': 'Question is not part of this test'}), 400
+    
+    if ANSWER_WRITE_BEHIND:
+        write_buffer.answer_buffer.add(row)
+        return jsonify({'success': True, 'correct': row[4]})
     
     try:
         conn = get_db_connection()
-        
-        conn.execute('''
-            INSERT INTO test_answers
-            (test_session_id, question_id, user_id, answer, is_correct, answered_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (
-            session['current_test']['id'],
-            question_id,
-            session['user_id'],
-            answer,
-            is_correct,
-            datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        ))
-        
+        write_buffer.save_test_answers(conn, [row])
         conn.commit()
-        return jsonify({'success': True})
+        return jsonify({'success': True, 'correct': row[4]})
     except Exception as e:
         app.logger.error(f"Answer submission error: {str(e)}")
         return jsonify({'error': 'Failed to submit answer'}), 500
     finally:
         conn.close()
 
+def complete_test_session(conn, test_session_id):
+    """Mark a test session completed; commit is left to the caller.
+
+    The score is the running correct_count a trigger keeps on the session
+    as answers are inserted (migration v16), so nothing is counted here.
+    Completing a test twice leaves it, and the progress rollups, as they were.
+    """
+    completed = conn.execute('''
+        UPDATE test_sessions
+        SET end_time = ?, status = 'completed', score = correct_count
+        WHERE id = ? AND status = 'in_progress'
+    ''', (
+        datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        test_session_id
+    )).rowcount
+    if completed:
+        progress.record_test(conn, test_session_id)
+    result = conn.execute(
+        "SELECT score FROM test_sessions WHERE id = ?", (test_session_id,)
+    ).fetchone()
+    return result['score'] if result else 0
+
 @app.route('/test/complete', methods=['POST'])
 def test_complete():
     if 'user_id' not in session or 'current_test' not in session:
@@ -782,24 +729,11 @@ def test_complete():
     try:
         conn = get_db_connection()
         
-        # Calculate score
-        result = conn.execute('''
-            SELECT COUNT(*) as correct_answers FROM test_answers
-            WHERE test_session_id = ? AND is_correct = 1
-        ''', (session['current_test']['id'],)).fetchone()
-        
-        score = result['correct_answers'] if result else 0
+        # Buffered answers must be on disk before we score them
+        if ANSWER_WRITE_BEHIND:
+            write_buffer.answer_buffer.flush()
         
-        # Update test session
-        conn.execute('''
-            UPDATE test_sessions
-            SET end_time = ?, status = 'completed', score = ?
-            WHERE id = ?
-        ''', (
-            datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            score,
-            session['current_test']['id']
-        ))
+        complete_test_session(conn, session['current_test']['id'])
         
         conn.commit()
         
@@ -835,9 +769,10 @@ def test_results(test_id):
                                 user_email=session.get('user_email'))
         
         questions = conn.execute('''
-            SELECT iq.question, ta.answer, ta.is_correct
+            SELECT iq.question, ta.answer, ta.is_correct, k.correct_answer
             FROM test_answers ta
             JOIN interview_questions iq ON ta.question_id = iq.id
+            LEFT JOIN question_answer_keys k ON k.question_id = ta.question_id
             WHERE ta.test_session_id = ?
             ORDER BY ta.id
         ''', (test_id,)).fetchall()
@@ -944,24 +879,107 @@ def job_listings():
     if not session.get('user_email'):
         return redirect(url_for('register_page'))
     
+    # The page pulls its listings from /api/jobs one page at a time
+    return render_template('jobs.html',
+                        user_email=session.get('user_email'),
+                        user_name=session.get('user_name'))
+
+@app.route('/api/jobs')
+def api_jobs():
+    if 'user_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    filters = {
+        'location': request.args.get('location') or None,
+        'career_id': request.args.get('career_id', type=int),
+        'company': request.args.get('company') or None,
+    }
+    limit = request.args.get('limit', job_feed.DEFAULT_LIMIT, type=int)
+
     try:
         conn = get_db_connection()
-        jobs = conn.execute('''
-            SELECT j.*, c.name as career_name 
-            FROM jobs j
-            LEFT JOIN careers c ON j.career_id = c.id
-            ORDER BY j.posted_at DESC
-        ''').fetchall()
-        
-        return render_template('jobs.html',
-                            jobs=[dict(job) for job in jobs],
-                            user_email=session.get('user_email'),
-                            user_name=session.get('user_name'))
+        return jsonify(job_feed.fetch_page(conn, filters, request.args.get('cursor'), limit))
+    except job_feed.InvalidCursor:
+        return jsonify({"error": "Invalid cursor"}), 400
     except Exception as e:
-        app.logger.error(f"Job listings error: {str(e)}")
-        return render_template('error.html',
-                            message="Error loading job listings",
-                            user_email=session.get('user_email'))
+        app.logger.error(f"Job feed error: {str(e)}")
+        return jsonify({"error": "Failed to load jobs"}), 500
+    finally:
+        conn.close()
+
+@app.route('/api/search')
+def api_search():
+    if 'user_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    kind = request.args.get('type', 'jobs')
+    text = request.args.get('q', '')
+    limit = request.args.get('limit', search.DEFAULT_LIMIT, type=int)
+
+    try:
+        conn = get_db_connection()
+        return jsonify(search.search(conn, kind, text, request.args.get('cursor'), limit))
+    except search.InvalidQuery:
+        return jsonify({"error": "Provide a search query and a type of jobs or questions"}), 400
+    except job_feed.InvalidCursor:
+        return jsonify({"error": "Invalid cursor"}), 400
+    except Exception as e:
+        app.logger.error(f"Search error: {str(e)}")
+        return jsonify({"error": "Search failed"}), 500
+    finally:
+        conn.close()
+
+@app.route('/api/jobs/match', methods=['POST'])
+def api_match_jobs():
+    if 'user_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    data = request.get_json() or {}
+    skills = data.get('skills') or []
+    if not isinstance(skills, list):
+        return jsonify({"error": "skills must be a list"}), 400
+    text = " ".join([data.get('text') or ''] + [str(s) for s in skills]).strip()
+    if not text:
+        return jsonify({"error": "Provide resume text or a list of skills"}), 400
+    try:
+        limit = int(data.get('limit', matching.DEFAULT_LIMIT))
+    except (TypeError, ValueError):
+        return jsonify({"error": "limit must be a number"}), 400
+
+    try:
+        conn = get_db_connection()
+        return jsonify(matching.match_jobs(conn, text, limit))
+    except Exception as e:
+        app.logger.error(f"Job matching error: {str(e)}")
+        return jsonify({"error": "Failed to match jobs"}), 500
+    finally:
+        conn.close()
+
+@app.route('/api/jobs/import', methods=['POST'])
+def api_import_jobs():
+    token = request.headers.get('X-Ingest-Token', '')
+    if not INGEST_TOKEN or not hmac.compare_digest(token, INGEST_TOKEN):
+        return jsonify({"error": "Forbidden"}), 403
+
+    upload = request.files.get('file')
+    name = upload.filename if upload else None
+    fmt = (request.args.get('format')
+           or ingest.guess_format(name, upload.mimetype if upload else request.mimetype))
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({"error": "Send a CSV or NDJSON feed, or pass ?format=csv|ndjson"}), 400
+    batch_size = request.args.get('batch_size', ingest.DEFAULT_BATCH_SIZE, type=int)
+
+    try:
+        conn = get_db_connection()
+        # The body is parsed as it arrives, one batch in memory at a time
+        stats = ingest.ingest_stream(conn, upload.stream if upload else request.stream,
+                                     fmt, max(1, batch_size))
+        if matching.index.built:
+            matching.index.refresh(conn)
+        return jsonify(stats)
+    except Exception as e:
+        app.logger.error(f"Job import error: {str(e)}")
+        return jsonify({"error": "Job import failed"}), 500
     finally:
         conn.close()
 
@@ -973,9 +991,10 @@ def job_details(job_id):
     try:
         conn = get_db_connection()
         job = conn.execute('''
-            SELECT j.*, c.name as career_name 
+            SELECT j.*, c.name as career_name, COALESCE(n.applicants, 0) AS applicants
             FROM jobs j
             LEFT JOIN careers c ON j.career_id = c.id
+            LEFT JOIN job_application_counts n ON n.job_id = j.id
             WHERE j.id = ?
         ''', (job_id,)).fetchone()
         
@@ -1005,33 +1024,61 @@ def apply_for_job():
     if not data:
         return jsonify({"error": "No data provided"}), 400
     
-    job_id = data.get('job_id')
+    try:
+        job_id = int(data.get('job_id'))
+    except (TypeError, ValueError):
+        return jsonify({"error": "job_id is required"}), 400
+    # bool("false") is True, so anything but a JSON boolean is refused
+    allow_contact = data.get('allow_contact', False)
+    if not isinstance(allow_contact, bool):
+        return jsonify({"error": "allow_contact must be true or false"}), 400
     user_id = session['user_id']
     
     try:
         conn = get_db_connection()
         
-        # Verify job exists
-        job = conn.execute('SELECT id FROM jobs WHERE id = ?', (job_id,)).fetchone()
-        if not job:
+        # One statement checks the job and stores the application; repeats are no-ops
+        outcome = applications.submit(conn, user_id, job_id,
+                                      data.get('cover_letter'), allow_contact)
+        if outcome is None:
             return jsonify({"error": "Job not found"}), 404
-        
-        # In a real app, you would:
-        # 1. Create an applications table
-        # 2. Store the application
-        # 3. Send confirmation email
+        conn.commit()
         
         return jsonify({
             "status": "success",
-            "message": "Application submitted successfully",
+            "message": ("Application submitted successfully" if outcome == applications.CREATED
+                        else "You have already applied for this job"),
+            "already_applied": outcome == applications.ALREADY_APPLIED,
             "job_id": job_id,
             "user_id": user_id
-        })
+        }), 201 if outcome == applications.CREATED else 200
     except Exception as e:
         app.logger.error(f"Job application error: {str(e)}")
         return jsonify({"error": "Failed to process application"}), 500
     finally:
         conn.close()
+
+@app.route('/api/applications')
+def list_applications():
+    if 'user_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    try:
+        conn = get_db_connection()
+        return jsonify({"applications": applications.for_user(conn, session['user_id'])})
+    except Exception as e:
+        app.logger.error(f"Applications list error: {str(e)}")
+        return jsonify({"error": "Failed to load applications"}), 500
+    finally:
+        conn.close()
+
+@app.route('/api/cache/stats')
+def cache_stats():
+    # Operational data: same bearer token as /metrics
+    if not metrics.authorized():
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(reference_cache.stats())
+
 # ======= Error Handlers =======
 @app.errorhandler(404)
 def page_not_found(e):
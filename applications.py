@@ -0,0 +1,54 @@
+"""Job applications.
+
+A user applies to a job at most once: applications has a unique index on
+(user_id, job_id), and submit() is a single INSERT ... SELECT that reads
+the job by primary key and ignores the conflict, so a double click or a
+retried request is a no-op rather than an error or a second row.
+
+Per-job applicant counts live in job_application_counts and are kept up
+to date by triggers on applications (migration v13), so reading one is a
+primary-key lookup instead of a COUNT(*) over the job's applications.
+The counts are kept out of the jobs table on purpose: writing to jobs
+would bump the 'jobs' version in cache_versions and send every worker's
+match index (matching.py) looking for changed postings.
+"""
+from datetime import datetime
+
+CREATED = 'created'
+ALREADY_APPLIED = 'already_applied'
+
+
+def submit(conn, user_id, job_id, cover_letter=None, allow_contact=False):
+    """Record an application; commit is left to the caller.
+
+    allow_contact must be a bool, not whatever the request body held.
+    Returns CREATED, ALREADY_APPLIED, or None when the job doesn't exist.
+    """
+    cur = conn.execute(
+        """INSERT INTO applications (user_id, job_id, cover_letter, allow_contact, applied_at)
+           SELECT ?, id, ?, ?, ? FROM jobs WHERE id = ?
+           ON CONFLICT (user_id, job_id) DO NOTHING""",
+        (user_id, cover_letter, allow_contact,
+         datetime.now().strftime("%Y-%m-%d %H:%M:%S"), job_id)
+    )
+    if cur.rowcount:
+        return CREATED
+    # Nothing inserted: either a repeat, or there is no such job
+    exists = conn.execute(
+        "SELECT 1 FROM applications WHERE user_id = ? AND job_id = ?",
+        (user_id, job_id)
+    ).fetchone()
+    return ALREADY_APPLIED if exists else None
+
+
+def for_user(conn, user_id, limit=50):
+    """The user's applications, newest first, with the job they are for."""
+    return [dict(row) for row in conn.execute(
+        """SELECT a.id, a.job_id, a.status, a.applied_at, j.title, j.company, j.location
+           FROM applications a
+           JOIN jobs j ON j.id = a.job_id
+           WHERE a.user_id = ?
+           ORDER BY a.id DESC
+           LIMIT ?""",
+        (user_id, limit)
+    )]
@@ -0,0 +1,402 @@
+"""ASGI entry point: an async /chat, Flask for everything else.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+Under a WSGI server every in-flight request holds a thread, so a /chat
+reply that streams for thirty seconds ties one up for thirty seconds.
+Here POST /chat (model reply, JSON or Server-Sent Events) is a coroutine:
+waiting on the model holds no thread, so one process keeps thousands of
+streams open. Its database work goes through aio_db: reads on a few
+reader threads, writes (session saves included) serialized through a
+single writer task.
+
+Every other request runs the Flask app on a thread pool of WSGI_THREADS,
+so app.py is the only copy of those routes. /chat answers with the same
+JSON, status codes and session cookie as its Flask version, and a session
+started on one is picked up by the other.
+
+They need server-side sessions (SESSION_BACKEND sqlite or memory); with
+signed-cookie sessions, or ASYNC_ROUTES=0, Flask serves everything.
+"""
+import asyncio
+import concurrent.futures
+import io
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import sys
+import time
+from urllib.parse import parse_qsl
+
+from werkzeug.http import dump_cookie, parse_cookie
+
+import aio_db
+import chatbot
+import metrics
+import session_store
+import app as web
+
+flask_app = web.app
+logger = logging.getLogger(__name__)
+
+adb = aio_db.AsyncDatabase(readers=int(os.getenv("ASYNC_DB_READERS", "4")))
+
+
+# ======= Requests and responses =======
+class Request:
+    def __init__(self, scope, body):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1')
+                        for name, value in scope['headers']}
+        self.args = {}
+        for name, value in parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True):
+            self.args.setdefault(name, value)
+        self.cookies = parse_cookie(self.headers.get('cookie', ''))
+        self.body = body
+
+    def json(self):
+        try:
+            return json.loads(self.body) if self.body else None
+        except ValueError:
+            return None
+
+
+class Response:
+    def __init__(self, body=b'', status=200, content_type='application/json', stream=None,
+                 headers=()):
+        self.body = body
+        self.status = status
+        self.headers = [('content-type', content_type), *headers]
+        # Async iterator of str chunks, sent as they come
+        self.stream = stream
+
+
+def jsonify(data, status=200):
+    """flask.jsonify's output, byte for byte."""
+    return Response((flask_app.json.dumps(data, separators=(",", ":")) + "\n").encode(), status)
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+# ======= Sessions =======
+class AsyncSessions:
+    """The Flask app's server-side sessions, loaded and saved off the event loop."""
+
+    def __init__(self, app):
+        self.app = app
+        self.interface = app.session_interface
+        # metrics.TimedSessionInterface passes attribute lookups through
+        self.backend = getattr(self.interface, 'backend', None)
+        self.cookie_name = app.config["SESSION_COOKIE_NAME"]
+
+    @property
+    def supported(self):
+        return self.backend is not None
+
+    async def open(self, req):
+        sid = req.cookies.get(self.cookie_name)
+        if sid:
+            if hasattr(self.backend, 'load_from'):
+                payload = await adb.read(self.backend.load_from, sid)
+            else:
+                payload = self.backend.load(sid)
+            if payload is not None:
+                return session_store.ServerSideSession(session_store.serializer.loads(payload), sid=sid)
+        return session_store.ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+    async def save(self, sess, response):
+        """ServerSideSessionInterface.save_session for an async response."""
+        app, interface = self.app, self.interface
+        domain = interface.get_cookie_domain(app)
+        path = interface.get_cookie_path(app)
+
+        if not sess:
+            if sess.modified and not sess.new:
+                if hasattr(self.backend, 'delete_from'):
+                    await adb.write(self.backend.delete_from, sess.sid)
+                else:
+                    self.backend.delete(sess.sid)
+                response.headers.append(('set-cookie', dump_cookie(
+                    self.cookie_name, expires=0, max_age=0, domain=domain, path=path)))
+            return
+
+        if sess.modified:
+            payload = session_store.serializer.dumps(dict(sess))
+            ttl = int(app.permanent_session_lifetime.total_seconds())
+            if hasattr(self.backend, 'store_to'):
+                await adb.write(self.backend.store_to, sess.sid, payload, ttl)
+            else:
+                self.backend.store(sess.sid, payload, ttl)
+
+        if sess.new or interface.should_set_cookie(app, sess):
+            response.headers.append(('set-cookie', dump_cookie(
+                self.cookie_name,
+                sess.sid,
+                expires=interface.get_expiration_time(app, sess),
+                httponly=interface.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=interface.get_cookie_secure(app),
+                samesite=interface.get_cookie_samesite(app),
+            )))
+
+
+sessions = AsyncSessions(flask_app)
+
+
+# ======= Chat =======
+async def _single(token):
+    yield token
+
+
+async def chat(req, session):
+    data = req.json() or {}
+    user_input = data.get("message", "").strip()
+
+    if not user_input:
+        return jsonify({"content": "Please enter a valid message."})
+
+    conversation, messages = None, chatbot.build_messages(user_input)
+    if session.get('user_id') and data.get("conversation_id"):
+        try:
+            conversation, messages = await adb.write(
+                chatbot.start_turn, session['user_id'], data["conversation_id"], user_input)
+        except sqlite3.Error:
+            chatbot.logger.exception("Chat history unavailable")
+    # Cached replies were written without context, so only the opening
+    # question of a conversation may use or fill the cache
+    standalone = len(messages) == 2 and messages[0]["content"] == chatbot.SYSTEM_PROMPT
+
+    cached = (await adb.run(chatbot.response_cache.get, user_input))[0] if standalone else None
+    if cached is not None:
+        tokens = _single(cached)
+    elif standalone:
+        tokens = chatbot.acached_stream(user_input, chatbot.backend.astream(messages), adb)
+    else:
+        tokens = chatbot.backend.astream(messages)
+    if conversation is not None:
+        tokens = chatbot.arecorded_stream(conversation, tokens, adb)
+    # Outermost, so a canned reply is neither cached nor recorded
+    tokens = chatbot.awith_fallback(tokens)
+
+    if (req.args.get("stream") == "1"
+            or "text/event-stream" in req.headers.get("accept", "")):
+        return Response(content_type="text/event-stream; charset=utf-8",
+                        stream=chatbot.asse_events(tokens),
+                        headers=[("cache-control", "no-cache"), ("x-accel-buffering", "no")])
+
+    try:
+        return jsonify({"content": "".join([token async for token in tokens]).strip()})
+    except Exception:
+        chatbot.logger.exception("Chat reply failed")
+        return jsonify({"content": chatbot.ERROR_REPLY})
+    finally:
+        await tokens.aclose()
+
+
+# (method, path) -> handler(request, session); the path doubles as the
+# endpoint label in /metrics, as url_rule.rule does for the Flask routes
+ROUTES = {
+    ('POST', '/chat'): chat,
+}
+
+
+# ======= Flask, for everything else =======
+class _RequestBody(io.RawIOBase):
+    """wsgi.input that pulls the request body off the ASGI connection as it is read."""
+
+    def __init__(self, receive, loop):
+        self._receive = receive
+        self._loop = loop
+        self._buffer = b''
+        self._more = True
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer and self._more:
+            message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+            self._buffer = message.get('body', b'')
+            self._more = message.get('more_body', False)
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+class WSGIBridge:
+    """Serve a WSGI app to an ASGI server, one worker thread per request.
+
+    The body is streamed both ways, so bulk imports and streamed responses
+    aren't held in memory.
+    """
+
+    def __init__(self, app, threads):
+        self.app = app
+        self._threads = concurrent.futures.ThreadPoolExecutor(threads, thread_name_prefix="wsgi")
+
+    def _environ(self, scope, body):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin-1'),
+            'PATH_INFO': scope['path'].encode().decode('latin-1'),
+            'QUERY_STRING': scope['query_string'].decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BufferedReader(body),
+            'wsgi.input_terminated': True,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope['headers']:
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                environ[name] = value
+                continue
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    async def __call__(self, scope, receive, send):
+        loop = asyncio.get_running_loop()
+        environ = self._environ(scope, _RequestBody(receive, loop))
+
+        def send_now(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def run():
+            status_headers = []
+
+            def start_response(status, headers, exc_info=None):
+                status_headers[:] = [status, headers]
+
+            def start():
+                status, headers = status_headers
+                send_now({'type': 'http.response.start', 'status': int(status.split(" ", 1)[0]),
+                          'headers': [(k.lower().encode('latin-1'), v.encode('latin-1'))
+                                      for k, v in headers]})
+
+            result = self.app(environ, start_response)
+            try:
+                started = False
+                for chunk in result:
+                    if not started:
+                        start()
+                        started = True
+                    if chunk:
+                        send_now({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                if not started:
+                    start()
+                send_now({'type': 'http.response.body', 'body': b''})
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+
+        await loop.run_in_executor(self._threads, run)
+
+
+# ======= The ASGI app =======
+class ASGIApp:
+    def __init__(self, wsgi_app, routes, async_routes=True, wsgi_threads=None):
+        self.wsgi = WSGIBridge(wsgi_app, wsgi_threads or int(os.getenv("WSGI_THREADS", "32")))
+        self.routes = routes if async_routes and sessions.supported else {}
+        if async_routes and not sessions.supported:
+            logger.warning("Async routes need server-side sessions; Flask serves every route")
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+        handler = self.routes.get((scope['method'], scope['path']))
+        if handler is None:
+            return await self.wsgi(scope, receive, send)
+        if not adb.started:
+            # Servers that skip the lifespan protocol
+            await adb.start()
+
+        start = time.perf_counter()
+        req = Request(scope, await read_body(receive))
+        try:
+            session = await sessions.open(req)
+            response = await handler(req, session)
+            await sessions.save(session, response)
+        except Exception:
+            logger.exception("Unhandled error on %s %s", req.method, req.path)
+            response = jsonify({'error': 'Internal server error'}, 500)
+        if 'origin' in req.headers:
+            # What flask_cors adds with its defaults
+            response.headers.append(('access-control-allow-origin', '*'))
+
+        await send({'type': 'http.response.start', 'status': response.status,
+                    'headers': [(k.encode('latin-1'), v.encode('latin-1'))
+                                for k, v in response.headers]})
+        if metrics.enabled:
+            metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, req.path, req.method,
+                                            str(response.status))
+        if response.stream is None:
+            await send({'type': 'http.response.body', 'body': response.body})
+        else:
+            await self._stream(response.stream, receive, send)
+
+    async def _stream(self, chunks, receive, send):
+        """Send chunks as they come; stop (closing the stream) if the client goes away."""
+        async def pump():
+            async for chunk in chunks:
+                await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+
+        async def disconnected():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        sender = asyncio.ensure_future(pump())
+        watcher = asyncio.ensure_future(disconnected())
+        try:
+            await asyncio.wait({sender, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            watcher.cancel()
+            if not sender.done():
+                sender.cancel()
+            try:
+                await sender
+            except asyncio.CancelledError:
+                pass
+            except Exception:
+                logger.exception("Streaming response failed")
+            await chunks.aclose()
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await adb.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await adb.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+application = ASGIApp(flask_app, ROUTES, async_routes=os.getenv("ASYNC_ROUTES", "1") == "1")
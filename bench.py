@@ -0,0 +1,2072 @@
+"""Benchmarks for the career guidance app.
+
+Each benchmark runs against a throwaway database, never users.db:
+
+    python bench.py pool --requests 2000 --threads 8
+
+`bench.py load` drives every route with a seeded mix of user flows and
+fails if it is slower than the baseline in bench_baselines.json. Baselines
+only hold on the machine that recorded them; record one with
+`bench.py load --save-baseline` before comparing.
+
+The query-plan check behind `bench.py plans` also runs, on a small
+database, as test_plans.py, and the golden scoring results `bench.py
+scoring` checks as test_scoring.py: python -m pytest
+"""
+import argparse
+import glob
+import http.cookiejar
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+# Point the app at a scratch database before it is imported
+_tmpdir = tempfile.mkdtemp(prefix="career-bench-")
+os.environ.setdefault("DATABASE_PATH", os.path.join(_tmpdir, "bench.db"))
+
+import db  # noqa: E402
+
+
+def load_app():
+    import app as app_module
+    app_module.app.testing = True
+    if not os.path.isdir(os.path.join(app_module.app.root_path, 'templates')):
+        # The pages sit next to app.py in this checkout
+        app_module.app.template_folder = app_module.app.root_path
+    return app_module
+
+
+def legacy_connection():
+    """Per-request connection, as get_db_connection() worked before pooling."""
+    conn = sqlite3.connect(db.DATABASE_PATH)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def run_concurrently(fn, total, threads):
+    """Call fn(client) `total` times across `threads` workers, return req/sec."""
+    app_module = load_app()
+    per_thread = total // threads
+
+    def worker():
+        client = app_module.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_email'] = 'bench@example.com'
+            sess['user_name'] = 'Bench'
+            sess['user_id'] = 1
+        for _ in range(per_thread):
+            fn(client)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return (per_thread * threads) / elapsed
+
+
+def ensure_bench_user(app_module):
+    from werkzeug.security import generate_password_hash
+
+    conn = app_module.get_db_connection()
+    try:
+        conn.execute(
+            "INSERT OR IGNORE INTO users (id, name, email, password) VALUES (1, ?, ?, ?)",
+            ('Bench', 'bench@example.com',
+             generate_password_hash('benchpass123', method='pbkdf2:sha256'))
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def bench_pool(args):
+    app_module = load_app()
+    ensure_bench_user(app_module)
+
+    routes = {
+        '/jobs': lambda c: c.get('/jobs'),
+        '/api/login': lambda c: c.post('/api/login', json={
+            'email': 'bench@example.com', 'password': 'benchpass123'}),
+    }
+    pooled = app_module.get_db_connection
+
+    print(f"{'route':<12} {'legacy req/s':>14} {'pooled req/s':>14}")
+    for name, fn in routes.items():
+        app_module.get_db_connection = legacy_connection
+        legacy = run_concurrently(fn, args.requests, args.threads)
+        app_module.get_db_connection = pooled
+        tuned = run_concurrently(fn, args.requests, args.threads)
+        print(f"{name:<12} {legacy:>14.1f} {tuned:>14.1f}")
+
+
+def bench_startup(args):
+    import migrations
+
+    path = os.path.join(_tmpdir, "startup.db")
+    timings = {"empty database": [], "schema current": []}
+    for _ in range(args.runs):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        for label in timings:
+            conn = db.ConnectionPool(path, max_size=1).acquire()
+            start = time.perf_counter()
+            migrations.migrate(conn)
+            timings[label].append(time.perf_counter() - start)
+            conn._raw.close()
+
+    for label, samples in timings.items():
+        samples.sort()
+        print(f"{label:<16} median {samples[len(samples) // 2] * 1000:8.3f} ms")
+
+
+def seed_database(conn, users=1000, jobs=1000, questions=1000, sessions=1000, answers=1000):
+    """Fill a migrated database with synthetic rows in bulk."""
+    difficulties = ('beginner', 'intermediate', 'advanced')
+    locations = ('Remote', 'New York', 'San Francisco', 'London', 'Bangalore')
+    careers = [r[0] for r in conn.execute("SELECT id FROM careers")]
+    now = "2024-01-01 00:00:00"
+
+    conn.executemany(
+        "INSERT INTO users (name, email, password) VALUES (?, ?, ?)",
+        ((f"User {i}", f"user{i}@example.com", "x") for i in range(users)))
+    conn.executemany(
+        """INSERT INTO jobs (title, company, location, description, requirements, posted_at, career_id)
+           VALUES (?, ?, ?, ?, ?, datetime('2024-01-01', ? || ' seconds'), ?)""",
+        ((f"Job {i}", f"Company {i % 5000}", locations[i % len(locations)],
+          f"Description for job {i}", "Python, SQL", i, careers[i % len(careers)])
+         for i in range(jobs)))
+    conn.executemany(
+        """INSERT INTO interview_questions
+           (career_id, question, question_type, difficulty_level, ideal_answer)
+           VALUES (?, ?, ?, ?, ?)""",
+        ((careers[i % len(careers)], f"Question {i}?", 'technical',
+          difficulties[i % len(difficulties)], f"Ideal answer {i}")
+         for i in range(questions)))
+    conn.executemany(
+        """INSERT INTO test_sessions (user_id, subject, start_time, status)
+           VALUES (?, 'Software Engineering', ?, 'completed')""",
+        ((i % max(users, 1) + 1, now) for i in range(sessions)))
+    conn.executemany(
+        """INSERT INTO test_answers
+           (test_session_id, question_id, user_id, answer, is_correct, answered_at)
+           VALUES (?, ?, ?, 'answer', ?, ?)""",
+        ((i % max(sessions, 1) + 1, i // max(sessions, 1) % max(questions, 1) + 1,
+          i % max(users, 1) + 1, i % 2, now)
+         for i in range(answers)))
+    # Multiple choice, option A-D by question id
+    conn.execute('''
+        INSERT OR IGNORE INTO question_answer_keys (question_id, options, correct_answer)
+        SELECT id, '["Option A", "Option B", "Option C", "Option D"]', 'Option ' || char(65 + id % 4)
+        FROM interview_questions
+    ''')
+    conn.commit()
+    conn.execute("ANALYZE")
+
+
+# Modules whose SQL statements are checked by `bench.py plans`: all of them
+# but the migrations, whose backfills read whole tables by design
+SQL_MODULES = sorted(path for path in glob.glob(os.path.join(os.path.dirname(__file__) or ".", "*.py"))
+                     if os.path.basename(path) not in ("bench.py", "migrations.py"))
+
+# Reference tables small enough that a full scan is expected
+SMALL_TABLES = {"careers", "cache_versions"}
+
+# (module, table) pairs where a statement loads the whole table on purpose
+INTENTIONAL_SCANS = {
+    ("answer_key.py", "question_answer_keys"),  # AnswerKeyIndex.load, cached per version
+}
+
+
+def collect_sql(paths):
+    """Yield (location, sql) for every literal passed to .execute()/.executemany()."""
+    import ast
+
+    for path in paths:
+        with open(path) as f:
+            tree = ast.parse(f.read(), path)
+        path = os.path.basename(path)
+        for node in ast.walk(tree):
+            if (isinstance(node, ast.Call)
+                    and isinstance(node.func, ast.Attribute)
+                    and node.func.attr in ("execute", "executemany")
+                    and node.args
+                    and isinstance(node.args[0], ast.Constant)
+                    and isinstance(node.args[0].value, str)):
+                yield f"{path}:{node.lineno}", node.args[0].value
+
+
+def full_scans(conn, sql):
+    """Return the tables a statement reads with a full table scan."""
+    import re
+
+    aliases = {alias: table for table, alias in
+               re.findall(r"(?:FROM|JOIN)\s+(\w+)\s+(?:AS\s+)?(\w+)", sql, re.I)}
+    plan = conn.execute("EXPLAIN QUERY PLAN " + sql, (None,) * sql.count("?")).fetchall()
+    scans = []
+    for row in plan:
+        match = re.match(r"SCAN (?:TABLE )?(\w+)(?: AS (\w+))?(.*)", row[3])
+        if (not match or "USING" in match.group(3) or "VIRTUAL TABLE" in match.group(3)
+                or match.group(1) == "CONSTANT"):
+            continue
+        table = aliases.get(match.group(1), match.group(1))
+        if table not in SMALL_TABLES:
+            scans.append(table)
+    return scans
+
+
+def plan_failures(conn):
+    """Return a message for every checked statement that scans a whole table or won't plan.
+
+    conn must be migrated and seeded (and ANALYZEd) so the planner sees
+    realistic table sizes; test_plans.py runs this on a small database.
+    """
+    import job_feed
+    import search
+
+    statements = list(collect_sql(SQL_MODULES))
+    statements += [("job_feed.page_sql", sql) for sql in job_feed.all_page_sql()]
+    statements += [(f"search.INDEXES[{kind!r}]", index.rows_sql.format(ids="?"))
+                   for kind, index in search.INDEXES.items()]
+
+    failures = []
+    for location, sql in statements:
+        if not sql.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "INSERT")):
+            continue
+        try:
+            module = location.split(":")[0]
+            scans = [table for table in full_scans(conn, sql)
+                     if (module, table) not in INTENTIONAL_SCANS]
+        except sqlite3.Error as e:
+            failures.append(f"ERROR {location}: {e}")
+            continue
+        if scans:
+            failures.append(f"FULL SCAN {location}: {', '.join(scans)}\n"
+                            f"    {' '.join(sql.split())}")
+    return failures
+
+
+def bench_plans(args):
+    import migrations
+
+    path = os.path.join(_tmpdir, "plans.db")
+    conn = db.ConnectionPool(path, max_size=1).acquire()
+    migrations.migrate(conn)
+    start = time.perf_counter()
+    seed_database(conn, users=args.rows, jobs=args.rows, questions=args.rows,
+                  sessions=args.rows, answers=args.rows)
+    print(f"seeded {args.rows} rows per table in {time.perf_counter() - start:.1f}s")
+
+    failures = plan_failures(conn)
+    for failure in failures:
+        print(failure)
+    print("ok" if not failures else f"{len(failures)} statement(s) fall back to a full table scan")
+    raise SystemExit(1 if failures else 0)
+
+
+def bench_sampling(args):
+    import migrations
+    from sampling import QuestionSampler
+
+    path = os.path.join(_tmpdir, "sampling.db")
+    conn = db.ConnectionPool(path, max_size=1).acquire()
+    migrations.migrate(conn)
+    seed_database(conn, users=0, jobs=0, questions=args.questions, sessions=0, answers=0)
+    sampler = QuestionSampler()
+    sampler.sample(conn, 1, 'beginner', 7)  # load the pool once
+
+    def order_by_random():
+        conn.execute(
+            """SELECT id, question, question_type FROM interview_questions
+               WHERE career_id = ? AND difficulty_level = ?
+               ORDER BY RANDOM() LIMIT 7""", (1, 'beginner')).fetchall()
+
+    def pooled():
+        sampler.sample(conn, 1, 'beginner', 7)
+
+    print(f"question bank: {args.questions} rows")
+    for label, fn in (("ORDER BY RANDOM()", order_by_random), ("QuestionSampler", pooled)):
+        start = time.perf_counter()
+        for _ in range(args.draws):
+            fn()
+        per_draw = (time.perf_counter() - start) / args.draws
+        print(f"{label:<18} {per_draw * 1e6:10.1f} us/draw")
+
+
+def bench_sessions(args):
+    """Cookie bytes and (de)serialization time for a mid-interview session."""
+    from flask.sessions import SecureCookieSessionInterface
+    from session_store import serializer
+
+    app_module = load_app()
+    answer = "I first reproduced the issue, then isolated the failing module. " * 6
+    payload = {
+        'user_email': 'bench@example.com', 'user_name': 'Bench', 'user_id': 1,
+        'current_interview': {
+            'id': 1, 'career_id': 1, 'current_question': 6, 'difficulty': 'beginner',
+            'questions': [{'id': i, 'question': f"Question text number {i}, asked in full?",
+                           'question_type': 'technical'} for i in range(7)],
+            'answers': [{'question_id': i, 'text': answer, 'is_audio': False,
+                         'timestamp': '2024-01-01T00:00:00', 'answered': True}
+                        for i in range(6)],
+        },
+    }
+    signer = SecureCookieSessionInterface().get_signing_serializer(app_module.app)
+    sid = 'x' * 43  # secrets.token_urlsafe(32)
+
+    def timed(fn):
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            fn()
+        return (time.perf_counter() - start) / args.iterations * 1e6
+
+    cookie = signer.dumps(payload)
+    stored = serializer.dumps(payload)
+    print(f"{'backend':<14} {'cookie bytes':>13} {'encode us':>10} {'decode us':>10}")
+    print(f"{'signed cookie':<14} {len(cookie):>13} "
+          f"{timed(lambda: signer.dumps(payload)):>10.1f} {timed(lambda: signer.loads(cookie)):>10.1f}")
+    print(f"{'server-side':<14} {len(sid):>13} "
+          f"{timed(lambda: serializer.dumps(payload)):>10.1f} {timed(lambda: serializer.loads(stored)):>10.1f}")
+
+
+def bench_answers(args):
+    """Answers/sec with one commit per answer vs. the write-behind buffer."""
+    import migrations
+    import write_buffer
+
+    db.pool.close_all()
+    db.pool = db.ConnectionPool(os.path.join(_tmpdir, "answers.db"), max_size=args.threads + 1)
+    conn = db.get_connection()
+    migrations.migrate(conn)
+    conn.close()
+
+    per_thread = args.answers // args.threads
+
+    def row(t, i):
+        return (t, i + 1, t, 'answer', i % 2, "2024-01-01 00:00:00")
+
+    def per_request(t):
+        for i in range(per_thread):
+            conn = db.get_connection()
+            try:
+                write_buffer.save_test_answers(conn, [row(t, i)])
+                conn.commit()
+            finally:
+                conn.close()
+
+    buffer = write_buffer.AnswerWriteBuffer()
+    buffer.start()
+
+    def buffered(t):
+        for i in range(per_thread):
+            buffer.add(row(t, i))
+
+    for label, fn in (("commit per answer", per_request), ("write-behind", buffered)):
+        workers = [threading.Thread(target=fn, args=(t,)) for t in range(args.threads)]
+        start = time.perf_counter()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        if fn is buffered:
+            buffer.flush()  # what test_complete waits for
+        elapsed = time.perf_counter() - start
+        print(f"{label:<18} {per_thread * args.threads / elapsed:10.0f} answers/s")
+
+
+def bench_grading(args):
+    """Concurrent test-takers graded on the server; scores checked against a recount."""
+    import random
+    import answer_key
+    import migrations
+
+    db.pool.close_all()
+    db.pool = db.ConnectionPool(os.path.join(_tmpdir, "grading.db"), max_size=args.threads + 1)
+    conn = db.get_connection()
+    migrations.migrate(conn)
+    seed_database(conn, users=args.threads, jobs=0, questions=args.questions, sessions=0, answers=0)
+    keys = {row['question_id']: (json.loads(row['options']), row['correct_answer'])
+            for row in conn.execute("SELECT * FROM question_answer_keys")}
+    conn.close()
+    app_module = load_app()
+    logging.getLogger(app_module.app.name).setLevel(logging.CRITICAL)
+
+    per_thread = args.sessions // args.threads
+    submit_times, complete_times, errors = [], [], []
+    expected = {}
+
+    def taker(t):
+        rng = random.Random(t)
+        client = app_module.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_email'] = f"user{t}@example.com"
+            sess['user_name'] = f"User {t}"
+            sess['user_id'] = t + 1
+        for _ in range(per_thread):
+            r = client.post('/test/start', json={'subject': 'Software Engineering', 'topic': 'General'})
+            if r.status_code != 200:
+                errors.append(r.status_code)
+                continue
+            questions = r.get_json()['questions']
+            score = 0
+            for q in questions:
+                options, correct = keys[q['id']]
+                right = rng.random() < 0.6
+                answer = correct if right else rng.choice([o for o in options if o != correct])
+                score += right
+                for _ in range(2 if rng.random() < args.repeat else 1):
+                    # A repeat submits another answer; only the first one counts
+                    start = time.perf_counter()
+                    r = client.post('/test/submit-answer', json={'question_id': q['id'], 'answer': answer})
+                    submit_times.append(time.perf_counter() - start)
+                    if r.status_code != 200:
+                        errors.append(r.status_code)
+                    answer = rng.choice(options)
+            start = time.perf_counter()
+            r = client.post('/test/complete')
+            complete_times.append(time.perf_counter() - start)
+            if r.status_code != 200:
+                errors.append(r.status_code)
+                continue
+            test_id = int(r.get_json()['redirect'].rsplit('/', 1)[1])
+            expected[test_id] = score
+
+    workers = [threading.Thread(target=taker, args=(t,)) for t in range(args.threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+
+    conn = db.get_connection()
+    try:
+        rows = conn.execute('''
+            SELECT ts.id, ts.score, ts.answered_count,
+                   (SELECT COUNT(*) FROM test_answers ta
+                    WHERE ta.test_session_id = ts.id AND ta.is_correct = 1) AS recount
+            FROM test_sessions ts WHERE ts.status = 'completed'
+        ''').fetchall()
+        # Grading one answer: the in-memory index vs. a lookup per answer
+        index = answer_key.AnswerKeyIndex.load(conn)
+        sample = [(qid, correct) for qid, (_, correct) in keys.items()][:1000]
+        start = time.perf_counter()
+        for qid, answer in sample:
+            index.grade(qid, answer)
+        indexed_us = (time.perf_counter() - start) / len(sample) * 1e6
+        start = time.perf_counter()
+        for qid, answer in sample:
+            row = conn.execute("SELECT correct_answer FROM question_answer_keys WHERE question_id = ?",
+                               (qid,)).fetchone()
+            answer_key.normalize(answer) == answer_key.normalize(row['correct_answer'])
+        queried_us = (time.perf_counter() - start) / len(sample) * 1e6
+    finally:
+        conn.close()
+
+    wrong = [r['id'] for r in rows
+             if r['score'] != expected.get(r['id']) or r['score'] != r['recount']]
+    print(f"{len(expected)} tests, {len(submit_times)} answers on {args.threads} threads "
+          f"in {elapsed:.1f}s ({len(submit_times) / elapsed:.0f} answers/s)")
+    print(f"submit-answer p50 {percentile(submit_times, 50) * 1000:.2f} ms, "
+          f"p99 {percentile(submit_times, 99) * 1000:.2f} ms")
+    print(f"complete      p50 {percentile(complete_times, 50) * 1000:.2f} ms, "
+          f"p99 {percentile(complete_times, 99) * 1000:.2f} ms")
+    print(f"grade one answer: index {indexed_us:.2f} us, query per answer {queried_us:.2f} us")
+    ok = not errors and not wrong and len(rows) == len(expected)
+    print("scores match a recount" if ok else
+          f"errors={errors[:10]} mismatched tests={wrong[:10]} completed={len(rows)}/{len(expected)}")
+    raise SystemExit(0 if ok else 1)
+
+
+def bench_progress(args):
+    """Dashboard read from the rollups vs. re-aggregating history; rebuild matches incremental."""
+    import random
+    from datetime import datetime as dt, timedelta
+    import migrations
+    import progress
+
+    db.pool.close_all()
+    db.pool = db.ConnectionPool(os.path.join(_tmpdir, "progress.db"))
+    conn = db.get_connection()
+    migrations.migrate(conn)
+    seed_database(conn, users=args.users, jobs=0, questions=0, sessions=0, answers=0)
+    careers = conn.execute("SELECT id, name FROM careers").fetchall()
+
+    # History in time order, each event recorded as the app would
+    rng = random.Random(args.seed)
+    start = dt(2024, 1, 1)
+    step = timedelta(days=args.days) / args.events
+    recorded = time.perf_counter()
+    for i in range(args.events):
+        at = (start + step * i).strftime("%Y-%m-%d %H:%M:%S")
+        user_id = rng.randint(1, args.users)
+        career_id, subject = rng.choice(careers)
+        if rng.random() < 0.5:
+            cur = conn.execute(
+                """INSERT INTO interviews (user_id, career_id, difficulty, start_time, end_time, overall_score)
+                   VALUES (?, ?, 'beginner', ?, ?, ?)""",
+                (user_id, career_id, at, at, rng.randint(0, 100)))
+            progress.record_interview(conn, cur.lastrowid)
+        else:
+            cur = conn.execute(
+                """INSERT INTO test_sessions (user_id, subject, start_time, end_time, status, score)
+                   VALUES (?, ?, ?, ?, 'completed', ?)""",
+                (user_id, subject, at, at, rng.randint(0, 10)))
+            progress.record_test(conn, cur.lastrowid)
+        if i % 1000 == 999:
+            conn.commit()
+    conn.commit()
+    recorded = (time.perf_counter() - recorded) / args.events
+
+    def snapshot():
+        return (conn.execute("SELECT * FROM user_stats ORDER BY user_id").fetchall(),
+                conn.execute("SELECT * FROM user_career_stats ORDER BY user_id, career_id").fetchall())
+
+    incremental = [[tuple(r) for r in rows] for rows in snapshot()]
+    rebuild_start = time.perf_counter()
+    users = progress.rebuild(conn)
+    conn.commit()
+    rebuild_seconds = time.perf_counter() - rebuild_start
+    rebuilt = [[tuple(r) for r in rows] for rows in snapshot()]
+
+    def adhoc(user_id):
+        """What a dashboard would do without rollups: fold the user's whole history."""
+        stats = progress._empty(progress.USER_COLUMNS, user_id=user_id, streak_days=0)
+        per_career = {}
+        rows = conn.execute('''
+            SELECT career_id, 'interview', overall_score, date(end_time), end_time, id
+            FROM interviews WHERE user_id = ? AND end_time IS NOT NULL
+            UNION ALL
+            SELECT c.id, 'test', ts.score, date(ts.end_time), ts.end_time, ts.id
+            FROM test_sessions ts LEFT JOIN careers c ON c.name = ts.subject
+            WHERE ts.user_id = ? AND ts.end_time IS NOT NULL
+            ORDER BY 5, 6
+        ''', (user_id, user_id)).fetchall()
+        for career_id, kind, score, day, _, _ in rows:
+            progress._advance_streak(stats, day)
+            progress._add(stats, kind, score, day)
+            if career_id not in per_career:
+                per_career[career_id] = progress._empty(progress.CAREER_COLUMNS)
+            progress._add(per_career[career_id], kind, score, day)
+        return stats, per_career
+
+    sample = [rng.randint(1, args.users) for _ in range(args.reads)]
+    print(f"{args.events} finished interviews and tests for {args.users} users over {args.days} days")
+    print(f"record one event: {recorded * 1e6:.0f} us; rebuild {users} users in {rebuild_seconds:.2f}s")
+    print(f"{'dashboard read':<16} {'p50 ms':>8} {'p99 ms':>8}")
+    for label, fn in (("rollups", lambda u: progress.for_user(conn, u)), ("re-aggregate", adhoc)):
+        samples = []
+        for user_id in sample:
+            t0 = time.perf_counter()
+            fn(user_id)
+            samples.append(time.perf_counter() - t0)
+        print(f"{label:<16} {percentile(samples, 50) * 1000:>8.3f} {percentile(samples, 99) * 1000:>8.3f}")
+    conn.close()
+
+    ok = incremental == rebuilt
+    print("rebuild matches the incremental rollups" if ok else "rebuild differs from the incremental rollups")
+    raise SystemExit(0 if ok else 1)
+
+
+def bench_finish(args):
+    """Latency of the final /submit_answer with inline vs. queued scoring."""
+    import migrations
+    import tasks
+
+    db.pool.close_all()
+    db.pool = db.ConnectionPool(os.path.join(_tmpdir, "finish.db"))
+    conn = db.get_connection()
+    migrations.migrate(conn)
+
+    queue = tasks.TaskQueue()
+    print(f"{'scoring cost':>12} {'inline ms':>10} {'queued ms':>10}")
+    for cost in args.costs:
+        def score(payload, cost=cost):
+            time.sleep(cost / 1000)
+            return {'score': 1}
+
+        queue.handler(f"score-{cost}")(score)
+        start = time.perf_counter()
+        score({})
+        inline = time.perf_counter() - start
+
+        start = time.perf_counter()
+        queue.enqueue(conn, f"bench-{cost}", f"score-{cost}", {})
+        conn.commit()
+        queued = time.perf_counter() - start
+        print(f"{cost:>10}ms {inline * 1000:>10.2f} {queued * 1000:>10.2f}")
+    conn.close()
+
+
+# Edge-case interviews and the analysis the original scorer gave them,
+# also checked by test_scoring.py
+SCORING_GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                   "bench_scoring_golden.json")
+
+
+def bench_scoring(args):
+    """batch_analyze vs. analyze_answers; fails if either differs from the golden results."""
+    import random
+    from scoring import analyze_answers, batch_analyze
+
+    with open(SCORING_GOLDEN_PATH) as f:
+        golden = json.load(f)
+    cases = [case['answers'] for case in golden]
+    expected = [case['expected'] for case in golden]
+    mismatches = {
+        'analyze_answers': sum(1 for answers, want in zip(cases, expected)
+                               if analyze_answers([{'text': t} for t in answers]) != want),
+        'batch_analyze': sum(1 for got, want in zip(batch_analyze(cases), expected) if got != want),
+    }
+
+    rng = random.Random(42)
+    words = ["I", "worked", "on", "a", "project", "first", "then", "we", "shipped", "it",
+             "experience", "Learned", "team", "debugging", "First", "Then", "data"]
+    interviews, remaining = [], args.answers
+    while remaining > 0:
+        n = min(rng.randint(1, 7), remaining)
+        interviews.append([
+            "" if rng.random() < 0.05 else " ".join(rng.choices(words, k=rng.randint(0, 60)))
+            for _ in range(n)
+        ])
+        remaining -= n
+
+    start = time.perf_counter()
+    for answers in interviews:
+        analyze_answers([{'text': t} for t in answers])
+    scalar = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(0, len(interviews), args.chunk_size):
+        batch_analyze(interviews[i:i + args.chunk_size])
+    batched = time.perf_counter() - start
+
+    print(f"{args.answers} answers in {len(interviews)} interviews")
+    print(f"analyze_answers loop {scalar:8.2f}s")
+    print(f"batch_analyze        {batched:8.2f}s")
+    for name, count in mismatches.items():
+        print(f"{name}: " + (f"matches {len(golden)} golden interviews" if not count
+                             else f"{count} of {len(golden)} golden interviews differ"))
+    raise SystemExit(1 if any(mismatches.values()) else 0)
+
+
+def bench_rubric(args):
+    """Single-pass rubric matching vs. one boundary-aware scan per term, on essays."""
+    import random
+    import re
+    import rubric
+
+    r = rubric.Rubric('technical',
+                      'Should mention profiling, database optimization, caching strategies, etc.',
+                      'Software Engineering')
+    terms = r.matcher.patterns
+    per_term = [re.compile(r"(?<![^\W_])" + re.escape(t)) for t in terms]
+
+    rng = random.Random(7)
+    vocab = ("first then because database debugging performance caching profiling api "
+             "testing git team project latest scalability design patterns").split()
+    vocab += [f"word{i}" for i in range(500)]
+    essays = [" ".join(rng.choices(vocab, k=args.words)).lower() for _ in range(args.essays)]
+
+    def rescan(text):
+        return {i for i, pattern in enumerate(per_term) if pattern.search(text)}
+
+    mismatches = sum(1 for e in essays if rescan(e) != r.matcher.find(e))
+    print(f"{len(terms)} rubric terms, {args.essays} essays of ~{len(essays[0])} chars")
+    for label, fn in (("scan per term", rescan), ("rubric matcher", r.matcher.find)):
+        start = time.perf_counter()
+        for e in essays:
+            fn(e)
+        print(f"{label:<15} {(time.perf_counter() - start) / len(essays) * 1e6:10.1f} us/answer")
+    print("matches identical" if not mismatches else f"{mismatches} essays differ")
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+class InlineHasher:
+    """Hash on the request thread, as the routes did before hashing.executor."""
+
+    def hash_password(self, password):
+        from werkzeug.security import generate_password_hash
+        return generate_password_hash(password, method='pbkdf2:sha256')
+
+    def verify_password(self, pwhash, password):
+        from werkzeug.security import check_password_hash
+        return check_password_hash(pwhash, password)
+
+
+def bench_login_storm(args):
+    """p50/p99 of /api/jobs while a login storm runs, inline vs. pooled hashing."""
+    import hashing
+
+    app_module = load_app()
+    ensure_bench_user(app_module)
+    pooled = hashing.executor
+    hashing.limiter.max_per_ip = hashing.limiter.max_per_email = float('inf')
+
+    print(f"{'hashing':<8} {'jobs p50 ms':>13} {'jobs p99 ms':>13} {'logins ok':>10} {'shed':>6}")
+    for label, executor in (("inline", InlineHasher()), ("pooled", pooled)):
+        hashing.executor = executor
+        stop = threading.Event()
+        outcomes = {"ok": 0, "shed": 0}
+        lock = threading.Lock()
+
+        def storm():
+            client = app_module.app.test_client()
+            while not stop.is_set():
+                r = client.post('/api/login', json={
+                    'email': 'bench@example.com', 'password': 'benchpass123'})
+                with lock:
+                    outcomes["ok" if r.status_code == 200 else "shed"] += 1
+                if r.status_code == 503:
+                    time.sleep(0.05)  # a well-behaved client backs off
+
+        stormers = [threading.Thread(target=storm) for _ in range(args.attackers)]
+        for t in stormers:
+            t.start()
+
+        client = app_module.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_email'] = 'bench@example.com'
+            sess['user_id'] = 1
+        latencies = []
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            client.get('/api/jobs')
+            latencies.append(time.perf_counter() - start)
+        stop.set()
+        for t in stormers:
+            t.join()
+        print(f"{label:<8} {percentile(latencies, 50) * 1000:>13.1f} "
+              f"{percentile(latencies, 99) * 1000:>13.1f} {outcomes['ok']:>10} {outcomes['shed']:>6}")
+    hashing.executor = pooled
+
+
+def bench_jobs_page(args):
+    """Page-fetch latency of /api/jobs pagination against OFFSET paging."""
+    import migrations
+    import job_feed
+
+    path = os.path.join(_tmpdir, "jobspage.db")
+    conn = db.ConnectionPool(path, max_size=1).acquire()
+    migrations.migrate(conn)
+    start = time.perf_counter()
+    seed_database(conn, users=0, jobs=args.jobs, questions=0, sessions=0, answers=0)
+    conn.commit()
+    print(f"seeded {args.jobs} jobs in {time.perf_counter() - start:.1f}s")
+
+    def timed(fn):
+        samples = []
+        for _ in range(args.fetches):
+            start = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - start)
+        return percentile(samples, 50) * 1000, percentile(samples, 99) * 1000
+
+    # Cursor and offset for a page halfway down the feed
+    depth = args.jobs // 2
+    row = conn.execute(
+        "SELECT posted_at, id FROM jobs ORDER BY posted_at DESC, id DESC LIMIT 1 OFFSET ?",
+        (depth - 1,)).fetchone()
+    middle = job_feed.encode_cursor(row[0], row[1])
+
+    def offset_page(offset):
+        conn.execute(
+            """SELECT j.id, j.title, j.company, j.location, j.posted_at, j.career_id,
+                      c.name AS career_name
+               FROM jobs j LEFT JOIN careers c ON c.id = j.career_id
+               ORDER BY j.posted_at DESC, j.id DESC LIMIT ? OFFSET ?""",
+            (args.limit, offset)).fetchall()
+
+    cases = [
+        ("first page", lambda: job_feed.fetch_page(conn, limit=args.limit)),
+        (f"OFFSET {depth}", lambda: offset_page(depth)),
+        (f"cursor at row {depth}", lambda: job_feed.fetch_page(conn, cursor=middle, limit=args.limit)),
+        ("location=London", lambda: job_feed.fetch_page(
+            conn, {'location': 'London'}, limit=args.limit)),
+        ("company + cursor", lambda: job_feed.fetch_page(
+            conn, {'company': 'Company 7'}, cursor=middle, limit=args.limit)),
+        ("career_id=2", lambda: job_feed.fetch_page(
+            conn, {'career_id': 2}, limit=args.limit)),
+    ]
+    print(f"{'page':<24} {'p50 ms':>9} {'p99 ms':>9}")
+    for label, fn in cases:
+        p50, p99 = timed(fn)
+        print(f"{label:<24} {p50:>9.3f} {p99:>9.3f}")
+
+
+def generate_postings(n, seed=0):
+    """Yield n synthetic job postings with Zipf-distributed vocabulary."""
+    import itertools
+    import random
+
+    rng = random.Random(seed)
+    syllables = ['ka', 'lo', 'mi', 'ra', 'ten', 'vo', 'shi', 'dan', 'pe', 'qua', 'zor', 'bel',
+                 'ti', 'nor', 'ex', 'ul', 'sam', 'gri', 'fo', 'wen']
+    words = ['python', 'java', 'sql', 'react', 'cloud', 'data', 'design', 'marketing',
+             'product', 'analytics', 'kubernetes', 'security', 'mobile', 'testing', 'sales']
+    words += ["".join(p) for k in (2, 3, 4) for p in itertools.product(syllables, repeat=k)]
+    words = words[:20000]
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+    levels = ['Junior', 'Senior', 'Lead', 'Staff', 'Principal', 'Associate']
+    roles = ['Engineer', 'Developer', 'Analyst', 'Designer', 'Manager', 'Scientist', 'Consultant']
+    locations = ('Remote', 'New York', 'San Francisco', 'London', 'Bangalore')
+    for i in range(n):
+        text = rng.choices(words, cum_weights=cum_weights, k=48)
+        yield (f"{rng.choice(levels)} {text[0].title()} {rng.choice(roles)}",
+               f"Company {i % 5000}", locations[i % len(locations)],
+               " ".join(text[1:36]), ", ".join(text[36:]), i)
+
+
+def bench_search(args):
+    """Ranked FTS5 search latency over a generated corpus, against LIKE scans."""
+    import migrations
+    import search
+
+    path = os.path.join(_tmpdir, "search.db")
+    conn = db.ConnectionPool(path, max_size=1).acquire()
+    migrations.migrate(conn)
+    start = time.perf_counter()
+    # Rows go in through the sync triggers, as they do in production
+    conn.executemany(
+        """INSERT INTO jobs (title, company, location, description, requirements, posted_at)
+           VALUES (?, ?, ?, ?, ?, datetime('2024-01-01', ? || ' seconds'))""",
+        generate_postings(args.docs))
+    conn.commit()
+    print(f"indexed {args.docs} postings in {time.perf_counter() - start:.1f}s")
+
+    cursor = search.encode_cursor(100)
+    queries = [
+        ("rare word", "zorbelti", None),
+        ("common word", "python", None),
+        ("prefix", "kalo", None),
+        ("two words", "data sql", None),
+        ("title words", "senior engin", None),
+        ("common, page 6", "python", cursor),
+    ]
+    print(f"{'query':<18} {'matches':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for label, text, page in queries:
+        matches = conn.execute(
+            "SELECT count(*) FROM jobs_fts WHERE jobs_fts MATCH ?",
+            (search.match_expression(text),)).fetchone()[0]
+        samples = []
+        for _ in range(args.queries):
+            start = time.perf_counter()
+            search.search(conn, 'jobs', text, page)
+            samples.append(time.perf_counter() - start)
+        print(f"{label:<18} {matches:>9} {percentile(samples, 50) * 1000:>9.2f} "
+              f"{percentile(samples, 99) * 1000:>9.2f}")
+
+    start = time.perf_counter()
+    conn.execute(
+        """SELECT id FROM jobs WHERE title LIKE ? OR description LIKE ? OR requirements LIKE ?
+           LIMIT 20""", ("%zorbelti%",) * 3).fetchall()
+    print(f"{'LIKE rare word':<18} {'':>9} {(time.perf_counter() - start) * 1000:>9.2f}")
+
+
+def bench_match(args):
+    """Resume-to-job matching latency over a generated corpus, and incremental inserts."""
+    import migrations
+    from matching import JobMatchIndex
+
+    path = os.path.join(_tmpdir, "match.db")
+    conn = db.ConnectionPool(path, max_size=1).acquire()
+    migrations.migrate(conn)
+    insert = """INSERT INTO jobs (title, company, location, description, requirements, posted_at)
+                VALUES (?, ?, ?, ?, ?, datetime('2024-01-01', ? || ' seconds'))"""
+    conn.executemany(insert, generate_postings(args.docs))
+    conn.commit()
+
+    index = JobMatchIndex()
+    start = time.perf_counter()
+    index.refresh(conn)
+    print(f"indexed {len(index)} postings in {time.perf_counter() - start:.1f}s")
+
+    queries = [
+        ("skill list", "python, sql, react, cloud"),
+        ("rare skills", "zorbelti qualo"),
+        ("resume paragraph", " ".join(p[3] for p in generate_postings(3, seed=1))),
+    ]
+    print(f"{'query':<18} {'p50 ms':>9} {'p99 ms':>9}")
+    for label, text in queries:
+        samples = []
+        for _ in range(args.queries):
+            start = time.perf_counter()
+            index.top(text, 10)
+            samples.append(time.perf_counter() - start)
+        print(f"{label:<18} {percentile(samples, 50) * 1000:>9.2f} "
+              f"{percentile(samples, 99) * 1000:>9.2f}")
+
+    # New postings arrive through the table and are picked up by refresh()
+    conn.executemany(insert, generate_postings(args.inserts, seed=2))
+    conn.commit()
+    start = time.perf_counter()
+    index.refresh(conn)
+    elapsed = time.perf_counter() - start
+    print(f"refresh after {args.inserts} inserts {elapsed * 1000:9.1f} ms "
+          f"({elapsed / args.inserts * 1e6:.0f} us/job)")
+
+
+def write_feed(path, rows, fmt):
+    """Write generated postings to a CSV or NDJSON feed file."""
+    import csv
+    import json
+
+    careers = ['Software Engineering', 'Data Science', 'Product Management', 'UX/UI Design',
+               'Digital Marketing']
+    fields = ['title', 'company', 'location', 'description', 'requirements', 'posted_at', 'career']
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f) if fmt == "csv" else None
+        if writer:
+            writer.writerow(fields)
+        for title, company, location, description, requirements, i in generate_postings(rows):
+            record = [title, company, location, description, requirements,
+                      "2024-01-01T00:00:00+00:00", careers[i % len(careers)]]
+            if writer:
+                writer.writerow(record)
+            else:
+                f.write(json.dumps(dict(zip(fields, record))) + "\n")
+
+
+def bench_ingest(args):
+    """Feed ingestion rows/sec and peak RSS: first load, then an unchanged re-load."""
+    import resource
+    import ingest
+    import migrations
+
+    path = os.path.join(_tmpdir, "ingest.db")
+    conn = db.ConnectionPool(path, max_size=1).acquire()
+    migrations.migrate(conn)
+    feed = os.path.join(_tmpdir, f"feed.{args.format}")
+    write_feed(feed, args.rows, args.format)
+    print(f"{args.rows} postings, {os.path.getsize(feed) / 1e6:.0f} MB of {args.format}, "
+          f"batches of {args.batch_size}")
+
+    for label in ("first load", "re-load"):
+        start = time.perf_counter()
+        stats = ingest.ingest_file(conn, feed, args.format, args.batch_size)
+        elapsed = time.perf_counter() - start
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"{label:<11} {stats['read'] / elapsed:>9.0f} rows/s  peak RSS {peak_mb:6.0f} MB  "
+              + " ".join(f"{k}={v}" for k, v in stats.items() if k != 'read'))
+
+
+def bench_apply(args):
+    """Applications/sec from concurrent submitters, with repeat clicks mixed in."""
+    import random
+    import applications
+    import migrations
+
+    db.pool.close_all()
+    db.pool = db.ConnectionPool(os.path.join(_tmpdir, "apply.db"), max_size=args.threads + 1)
+    conn = db.get_connection()
+    migrations.migrate(conn)
+    seed_database(conn, users=args.users, jobs=args.jobs, questions=0, sessions=0, answers=0)
+    conn.close()
+
+    per_thread = args.applications // args.threads
+    outcomes = [[] for _ in range(args.threads)]
+
+    def submitter(t):
+        rng = random.Random(t)
+        last = None
+        for _ in range(per_thread):
+            if last and rng.random() < args.repeat:
+                pair = last
+            else:
+                pair = (rng.randint(1, args.users), rng.randint(1, args.jobs))
+            conn = db.get_connection()
+            try:
+                outcomes[t].append(applications.submit(conn, *pair))
+                conn.commit()
+            finally:
+                conn.close()
+            last = pair
+
+    workers = [threading.Thread(target=submitter, args=(t,)) for t in range(args.threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+
+    created = sum(o.count(applications.CREATED) for o in outcomes)
+    repeats = sum(o.count(applications.ALREADY_APPLIED) for o in outcomes)
+    conn = db.get_connection()
+    try:
+        rows = conn.execute("SELECT COUNT(*) FROM applications").fetchone()[0]
+        counted = conn.execute("SELECT SUM(applicants) FROM job_application_counts").fetchone()[0]
+    finally:
+        conn.close()
+    print(f"{per_thread * args.threads / elapsed:10.0f} submissions/s on {args.threads} threads "
+          f"({created} created, {repeats} repeats)")
+    ok = rows == created == counted
+    print("counters consistent" if ok else f"rows={rows} created={created} counters={counted}")
+    raise SystemExit(0 if ok else 1)
+
+
+def bench_chat(args):
+    """Time to first byte of /chat, whole JSON reply vs. SSE stream, on the fake model."""
+    import chat_cache
+    import chatbot
+
+    chatbot.backend = chatbot.FakeBackend(first_token_delay=args.first_token_ms / 1000,
+                                          token_delay=args.token_ms / 1000)
+    # Every request has to reach the model, so nothing may be cached
+    chatbot.response_cache = chat_cache.ResponseCache(max_entries=0, persist=False)
+    client = chatbot.app.test_client()
+    body = {"message": "How do I write a resume?"}
+
+    def timed(headers):
+        start = time.perf_counter()
+        response = client.post("/chat", json=body, headers=headers, buffered=False)
+        chunks = iter(response.response)
+        next(chunks)
+        first = time.perf_counter() - start
+        for _ in chunks:
+            pass
+        response.close()
+        return first, time.perf_counter() - start
+
+    print(f"{'mode':<8} {'TTFB p50 ms':>12} {'total p50 ms':>13}")
+    for label, headers in (("json", {}), ("stream", {"Accept": "text/event-stream"})):
+        samples = [timed(headers) for _ in range(args.requests)]
+        print(f"{label:<8} {percentile([s[0] for s in samples], 50) * 1000:>12.1f} "
+              f"{percentile([s[1] for s in samples], 50) * 1000:>13.1f}")
+
+    # A client that leaves after the first token must stop the model
+    before = chatbot.backend.cancelled
+    response = client.post("/chat", json=body, headers={"Accept": "text/event-stream"},
+                           buffered=False)
+    next(iter(response.response))
+    response.close()
+    cancelled = chatbot.backend.cancelled - before
+    print("disconnect cancels the upstream stream" if cancelled == 1
+          else "disconnect did NOT cancel the upstream stream")
+    raise SystemExit(0 if cancelled == 1 else 1)
+
+
+def bench_metrics(args):
+    """Instrumentation overhead, a per-endpoint time breakdown, and slow-request profiles."""
+    import metrics
+
+    app_module = load_app()
+    ensure_bench_user(app_module)
+    conn = app_module.get_db_connection()
+    seed_database(conn, users=100, jobs=2000, questions=3000, sessions=0, answers=0)
+    career = conn.execute("SELECT id FROM careers ORDER BY id LIMIT 1").fetchone()[0]
+    conn.close()
+    routes = {
+        '/': lambda c: c.get('/'),
+        '/api/jobs': lambda c: c.get('/api/jobs'),
+        '/start_interview': lambda c: c.post('/start_interview', json={
+            'career_id': career, 'difficulty': 'beginner'}),
+    }
+
+    print(f"{'route':<17} {'off req/s':>10} {'on req/s':>10} {'overhead':>9}")
+    for name, fn in routes.items():
+        # Alternate and keep the best of each, so drift on the machine cancels out
+        off = on = 0
+        for _ in range(args.rounds):
+            metrics.enabled = False
+            off = max(off, run_concurrently(fn, args.requests, args.threads))
+            metrics.enabled = True
+            on = max(on, run_concurrently(fn, args.requests, args.threads))
+        print(f"{name:<17} {off:>10.1f} {on:>10.1f} {(off - on) / off:>9.1%}")
+
+    def mean_ms(histogram, endpoint, **match):
+        total = count = 0
+        for labels, series in histogram._series.items():
+            named = dict(zip(histogram.labels, labels))
+            if named["endpoint"] == endpoint and all(named[k] == v for k, v in match.items()):
+                total += series[-2]
+                count += series[-1]
+        return total, count
+
+    print()
+    print(f"{'endpoint':<17} {'requests':>9} {'mean ms':>8} {'SQL ms':>7} {'stmts':>6} "
+          f"{'session ms':>11} {'template ms':>12}")
+    for name in routes:
+        seconds, requests = mean_ms(metrics.REQUEST_SECONDS, name)
+        sql, _ = mean_ms(metrics.SQL_SECONDS_PER_REQUEST, name)
+        statements, _ = mean_ms(metrics.SQL_PER_REQUEST, name)
+        sessions, _ = mean_ms(metrics.SESSION_SECONDS, name)
+        templates, _ = mean_ms(metrics.TEMPLATE_SECONDS, name)
+        print(f"{name:<17} {requests:>9} {seconds / requests * 1000:>8.2f} "
+              f"{sql / requests * 1000:>7.2f} {statements / requests:>6.1f} "
+              f"{sessions / requests * 1000:>11.2f} {templates / requests * 1000:>12.2f}")
+
+    client = app_module.app.test_client()
+    start = time.perf_counter()
+    body = client.get('/metrics').get_data(as_text=True)
+    print(f"\n/metrics: {len(body.splitlines())} lines, {len(body) / 1024:.0f} KB, "
+          f"{(time.perf_counter() - start) * 1000:.1f} ms")
+
+    # Every request counts as slow, to show what the profiler leaves behind
+    out_dir = os.path.join(_tmpdir, "profiles")
+    metrics.profiler = metrics.SamplingProfiler(0, out_dir, interval=0.001)
+    metrics.profiler.start()
+    run_concurrently(routes['/start_interview'], 40, 4)
+    metrics.profiler = None
+    dumps = sorted(os.listdir(out_dir))
+    print(f"profiler wrote {len(dumps)} folded-stack files to {out_dir}")
+    if dumps:
+        with open(os.path.join(out_dir, dumps[0])) as f:
+            stack, samples = f.readline().rsplit(" ", 1)
+        print(f"hottest stack in {dumps[0]} ({samples.strip()} samples):")
+        print("  " + " <- ".join(reversed(stack.split(";")[-3:])))
+
+
+def bench_history(args):
+    """Prompt size and /chat latency over a long conversation: full replay vs. token window."""
+    import random
+    import chat_cache
+    import chatbot
+    import conversations
+    import migrations
+    import tasks
+
+    db.pool.close_all()
+    db.pool = db.ConnectionPool(os.path.join(_tmpdir, "history.db"))
+    conn = db.get_connection()
+    migrations.migrate(conn)
+    conn.close()
+
+    class RecordingBackend(chatbot.FakeBackend):
+        def stream(self, messages):
+            self.prompt_tokens = sum(conversations.message_tokens(m["content"]) for m in messages)
+            return super().stream(messages)
+
+    rng = random.Random(0)
+    words = ("resume interview salary offer manager team skills python data project "
+             "deadline feedback promotion remote startup portfolio mentor").split()
+    reply = " ".join(rng.choice(words) for _ in range(args.reply_words))
+    chatbot.backend = RecordingBackend(reply=reply, first_token_delay=0, token_delay=0)
+    chatbot.response_cache = chat_cache.ResponseCache(max_entries=0, persist=False)
+    conversations.store = conversations.ConversationStore(budget=args.budget,
+                                                          summarize_after=args.budget // 3)
+    chatbot.app.secret_key = "bench"
+    questions = [" ".join(rng.choice(words) for _ in range(args.question_words)) + "?"
+                 for _ in range(args.turns)]
+    system_tokens = conversations.message_tokens(chatbot.SYSTEM_PROMPT)
+
+    def converse(client_id, cold):
+        client = chatbot.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+        replayed = system_tokens
+        rows = []
+        for question in questions:
+            if cold:
+                # As if every turn landed on a different worker
+                conversations.store.clear()
+            replayed += conversations.message_tokens(question)
+            start = time.perf_counter()
+            client.post("/chat", json={"message": question, "conversation_id": client_id})
+            elapsed = time.perf_counter() - start
+            rows.append((replayed, chatbot.backend.prompt_tokens, elapsed))
+            replayed += conversations.message_tokens(reply)
+            while tasks.queue.run_once():
+                pass
+        return rows
+
+    warm = converse("bench-warm", cold=False)
+    cold = converse("bench-cold", cold=True)
+    print(f"{args.turns} turns, budget {args.budget} tokens, replies of {args.reply_words} words")
+    print(f"{'turn':>5} {'replay tokens':>14} {'window tokens':>14} {'warm ms':>8} {'cold ms':>8}")
+    checkpoints = [t for t in (1, 10, 25, 50, 100, 200, 500, 1000) if t <= args.turns]
+    for turn in checkpoints:
+        span = slice(max(0, turn - 10), turn)
+        print(f"{turn:>5} {warm[turn - 1][0]:>14} {warm[turn - 1][1]:>14} "
+              f"{percentile([r[2] for r in warm[span]], 50) * 1000:>8.2f} "
+              f"{percentile([r[2] for r in cold[span]], 50) * 1000:>8.2f}")
+
+    conn = db.get_connection()
+    summarized = conn.execute(
+        "SELECT COUNT(*) FROM conversations WHERE summary IS NOT NULL"
+    ).fetchone()[0]
+    conn.close()
+    limit = args.budget + system_tokens + conversations.SUMMARY_TOKENS
+    ok = max(r[1] for r in warm + cold) <= limit and summarized == 2
+    print(f"largest prompt {max(r[1] for r in warm + cold)} tokens (limit {limit}), "
+          f"{summarized} of 2 conversations summarized")
+    raise SystemExit(0 if ok else 1)
+
+
+class MockLLMServer:
+    """Local OpenAI-compatible /chat/completions that streams a canned reply.
+
+    `latency` delays the first token and `failure_rate` answers that share
+    of requests with a 503. Counts requests and accepted TCP connections.
+    """
+
+    def __init__(self, latency=0.05, token_delay=0.002, failure_rate=0.0, seed=0):
+        import json
+        import random
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.requests = 0
+        self.connections = 0
+        lock = threading.Lock()
+        rng = random.Random(seed)
+        words = ("Lead with the skills the posting asks for and back each one with a "
+                 "result you can measure.").split(" ")
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with lock:
+                    mock.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def chunk(self, text):
+                data = text.encode()
+                self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with lock:
+                    mock.requests += 1
+                    fail = rng.random() < mock.failure_rate
+                if fail:
+                    body = b'{"error": "overloaded"}'
+                    self.send_response(503)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                time.sleep(mock.latency)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for i, word in enumerate(words):
+                        token = word if i == len(words) - 1 else word + " "
+                        self.chunk(f"data: {json.dumps({'choices': [{'delta': {'content': token}}]})}\n\n")
+                        time.sleep(token_delay)
+                    self.chunk("data: [DONE]\n\n")
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.server.block_on_close = False
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def closed_port_url():
+    import socket
+
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return f"http://127.0.0.1:{port}/v1"
+
+
+def bench_llm(args):
+    """/chat through llm_client against a mock model that is healthy, flaky, slow, down or swamped."""
+    import chat_cache
+    import chatbot
+    import llm_client
+
+    chatbot.response_cache = chat_cache.ResponseCache(max_entries=0, persist=False)
+    # Every fallback logs a warning; the table below counts them instead
+    logging.getLogger("chatbot").setLevel(logging.ERROR)
+    scenarios = [
+        # name, mock server settings (None: nothing listening), concurrent callers
+        ("healthy", dict(latency=0.05), args.concurrency),
+        ("flaky", dict(latency=0.05, failure_rate=0.3), args.concurrency),
+        ("slow", dict(latency=args.deadline * 4), args.concurrency),
+        ("down", None, args.concurrency),
+        ("swamped", dict(latency=0.2), args.threads),
+    ]
+
+    print(f"deadline {args.deadline}s, {args.concurrency} upstream + {args.queue} queued, "
+          f"{args.requests} requests per scenario")
+    print(f"{'scenario':<9} {'p50 ms':>8} {'p99 ms':>8} {'replies':>8} {'fallbacks':>10} "
+          f"{'attempts':>9} {'retries':>8} {'shorted':>8} {'shed':>5} {'conns':>6} {'circuit':>8}")
+    results = {}
+    for name, settings, threads in scenarios:
+        mock = MockLLMServer(**settings) if settings is not None else None
+        client = llm_client.LLMClient(
+            mock.url if mock else closed_port_url(), max_concurrency=args.concurrency,
+            max_queue=args.queue, deadline=args.deadline, connect_timeout=0.5, backoff=0.05,
+            breaker=llm_client.CircuitBreaker(failure_threshold=5, reset_timeout=60))
+        chatbot.backend = chatbot.OpenAIBackend(client=client)
+        latencies, fallbacks = [], []
+        lock = threading.Lock()
+        per_thread = args.requests // threads
+
+        def caller():
+            http = chatbot.app.test_client()
+            for _ in range(per_thread):
+                start = time.perf_counter()
+                content = http.post("/chat", json={"message": "How do I tailor my resume?"}
+                                    ).get_json()["content"]
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+                    fallbacks.append(content == chatbot.FALLBACK_REPLY)
+
+        workers = [threading.Thread(target=caller) for _ in range(threads)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        stats = client.stats()
+        client.close()
+        if mock:
+            mock.stop()
+        results[name] = (latencies, sum(fallbacks), mock.connections if mock else 0)
+        print(f"{name:<9} {percentile(latencies, 50) * 1000:>8.1f} "
+              f"{percentile(latencies, 99) * 1000:>8.1f} {len(latencies) - sum(fallbacks):>8} "
+              f"{sum(fallbacks):>10} {stats['attempts']:>9} {stats['retries']:>8} "
+              f"{stats['short_circuited']:>8} {stats['saturated']:>5} "
+              f"{mock.connections if mock else 0:>6} {stats['circuit']:>8}")
+
+    checks = [
+        ("healthy replies reuse pooled connections",
+         results["healthy"][1] == 0 and results["healthy"][2] <= args.concurrency),
+        ("a slow model is cut off at the deadline, then short-circuited",
+         percentile(results["slow"][0], 50) < args.deadline / 2
+         and max(results["slow"][0]) < args.deadline * 1.5),
+        ("a dead model answers with the fallback right away",
+         percentile(results["down"][0], 50) < 0.05 and results["down"][1] == args.requests),
+        ("overload is shed instead of queued", results["swamped"][1] > 0),
+    ]
+    for label, passed in checks:
+        print(f"{'ok  ' if passed else 'FAIL'} {label}")
+    raise SystemExit(0 if all(passed for _, passed in checks) else 1)
+
+
+CHAT_TOPICS = [
+    "How do I write a resume for a {} role?",
+    "What questions come up in a {} interview?",
+    "How should I negotiate salary as a {}?",
+    "Which skills does a junior {} need?",
+    "How do I move into {} work from another career?",
+]
+CHAT_ROLES = ["data analyst", "nurse", "software engineer", "teacher", "accountant",
+              "product manager", "electrician", "graphic designer"]
+
+
+def chat_prompt(rng):
+    """A user question: often a repeat, with the casing, punctuation and filler people add."""
+    prompt = rng.choice(CHAT_TOPICS).format(rng.choice(CHAT_ROLES))
+    roll = rng.random()
+    if roll < 0.3:
+        prompt = prompt.lower().rstrip("?")
+    elif roll < 0.5:
+        prompt = "  " + prompt.upper() + "!!"
+    elif roll < 0.7:
+        prompt = prompt.replace("How", "Please tell me how", 1).replace("What", "Tell me what", 1)
+    return prompt
+
+
+def bench_chatcache(args):
+    """/chat latency and model calls with the response cache, then across a restart."""
+    import random
+    import chat_cache
+    import chatbot
+    import migrations
+
+    db.pool.close_all()
+    db.pool = db.ConnectionPool(os.path.join(_tmpdir, "chatcache.db"))
+    conn = db.get_connection()
+    migrations.migrate(conn)
+    conn.close()
+
+    chatbot.backend = chatbot.FakeBackend(first_token_delay=args.first_token_ms / 1000,
+                                          token_delay=args.token_ms / 1000)
+    client = chatbot.app.test_client()
+    rng = random.Random(0)
+    prompts = [chat_prompt(rng) for _ in range(args.requests)]
+
+    def run(cache):
+        chatbot.response_cache = cache
+        started = chatbot.backend.started
+        hits, misses = [], []
+        for prompt in prompts:
+            before = cache.counters['misses']
+            start = time.perf_counter()
+            client.post("/chat", json={"message": prompt}).get_json()
+            elapsed = time.perf_counter() - start
+            (misses if cache.counters['misses'] > before else hits).append(elapsed)
+        return chatbot.backend.started - started, hits, misses
+
+    print(f"{len(prompts)} prompts, {len(set(map(chat_cache.normalize, prompts)))} distinct "
+          f"after normalizing, {len(CHAT_TOPICS) * len(CHAT_ROLES)} distinct questions")
+    print(f"{'run':<9} {'model calls':>11} {'exact':>6} {'similar':>8} {'hit rate':>9} "
+          f"{'hit p50 ms':>11} {'miss p50 ms':>12}")
+    ok = True
+    for label in ("cold", "restarted"):
+        # A new cache object on the same database stands in for a new process
+        cache = chat_cache.ResponseCache(similarity=args.similarity)
+        calls, hits, misses = run(cache)
+        stats = cache.stats()
+        print(f"{label:<9} {calls:>11} {stats['exact_hits']:>6} {stats['similar_hits']:>8} "
+              f"{stats['hit_rate']:>9.1%} {percentile(hits, 50) * 1000 if hits else 0:>11.2f} "
+              f"{percentile(misses, 50) * 1000 if misses else 0:>12.1f}")
+        if label == "restarted":
+            ok = calls == 0
+    print("cached replies survive a restart" if ok else "restart lost cached replies")
+    raise SystemExit(0 if ok else 1)
+
+
+class HTTPClient:
+    """Cookie-keeping urllib client with the parts of Flask's test client the load flows use.
+
+    Redirects are returned, not followed, as with the test client.
+    """
+
+    class Response:
+        def __init__(self, status_code, data):
+            self.status_code = status_code
+            self.data = data
+
+        def get_json(self):
+            try:
+                return json.loads(self.data)
+            except ValueError:
+                return None
+
+    class _NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self._opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), self._NoRedirect())
+
+    def open(self, method, path, query_string=None, json_body=None):
+        url = self.base_url + path
+        if query_string:
+            url += ('&' if '?' in url else '?') + urllib.parse.urlencode(query_string)
+        data, headers = None, {}
+        if json_body is not None:
+            data, headers = json.dumps(json_body).encode(), {'Content-Type': 'application/json'}
+        elif method == 'POST':
+            data = b''
+        request = urllib.request.Request(url, data=data, headers=headers, method=method)
+        try:
+            with self._opener.open(request) as response:
+                return self.Response(response.status, response.read())
+        except urllib.error.HTTPError as e:
+            return self.Response(e.code, e.read())
+
+    def get(self, path, query_string=None):
+        return self.open('GET', path, query_string)
+
+    def post(self, path, json=None):
+        return self.open('POST', path, json_body=json)
+
+
+class LoadUser:
+    """One simulated user: its own client, RNG and latency samples."""
+
+    def __init__(self, client, rng, email):
+        self.client = client
+        self.rng = rng
+        self.email = email
+        self.samples = {}   # "METHOD /rule" -> [seconds]
+        self.statuses = {}  # ("METHOD /rule", status) -> count
+        self.signups = 0
+
+    def request(self, method, rule, path=None, **kwargs):
+        route = f"{method.upper()} {rule}"
+        start = time.perf_counter()
+        response = getattr(self.client, method)(path or rule, **kwargs)
+        self.samples.setdefault(route, []).append(time.perf_counter() - start)
+        key = (route, response.status_code)
+        self.statuses[key] = self.statuses.get(key, 0) + 1
+        return response
+
+
+LOAD_WORDS = ("python sql data analysis communication teamwork leadership testing design "
+              "cloud security budget patients customers reporting research").split()
+
+
+def load_answer(rng, words=40):
+    return " ".join(rng.choice(LOAD_WORDS) for _ in range(words)) + "."
+
+
+def flow_account(user, world):
+    """Look at the register page, sign up a fresh account, log out, log back in."""
+    user.request('get', '/register')
+    user.signups += 1
+    user.request('post', '/api/signup', json={
+        'name': 'Load User', 'email': f"new-{user.signups}-{user.email}", 'password': LOAD_PASSWORD})
+    user.request('get', '/logout')
+    user.request('post', '/api/login', json={'email': user.email, 'password': LOAD_PASSWORD})
+
+
+def flow_interview(user, world):
+    """start_interview, an answer to each of the 7 questions, then poll the analysis once."""
+    rng = user.rng
+    user.request('get', '/interview')
+    r = user.request('post', '/start_interview', json={
+        'career_id': rng.choice(world['careers']),
+        'difficulty': rng.choice(('beginner', 'intermediate', 'advanced'))})
+    if r.status_code != 200:
+        return
+    for _ in range(r.get_json()['total_questions']):
+        r = user.request('post', '/submit_answer', json={'answer': load_answer(rng)})
+    results_url = (r.get_json() or {}).get('results_url')
+    if results_url:
+        user.request('get', '/interview/<id>/results', results_url)
+
+
+def flow_test(user, world):
+    """test/select, test/start, ten answers, test/complete, then the results page."""
+    rng = user.rng
+    user.request('get', '/test/select')
+    r = user.request('post', '/test/start', json={
+        'subject': rng.choice(world['subjects']), 'topic': 'General'})
+    if r.status_code != 200:
+        return
+    questions = (r.get_json() or {}).get('questions', [])
+    user.request('get', '/test/questions')
+    for q in questions:
+        user.request('post', '/test/submit-answer', json={
+            'question_id': q['id'], 'answer': rng.choice('ABCD')})
+    r = user.request('post', '/test/complete')
+    redirect = (r.get_json() or {}).get('redirect')
+    if redirect:
+        user.request('get', '/test/results/<id>', redirect)
+
+
+def flow_browse(user, world):
+    """Job listings: a few feed pages, a search, a match, a job page, maybe an application."""
+    rng = user.rng
+    user.request('get', '/jobs')
+    page = user.request('get', '/api/jobs').get_json() or {}
+    for _ in range(rng.randint(0, 2)):
+        if not page.get('next_cursor'):
+            break
+        page = user.request('get', '/api/jobs', query_string={
+            'cursor': page['next_cursor']}).get_json() or {}
+    user.request('get', '/api/jobs', query_string={'location': rng.choice(world['locations'])})
+    user.request('get', '/api/search', query_string={'type': 'jobs', 'q': rng.choice(world['terms'])})
+    user.request('post', '/api/jobs/match', json={'skills': rng.sample(LOAD_WORDS, 4)})
+    job_id = rng.randint(1, world['jobs'])
+    user.request('get', '/jobs/<id>', f"/jobs/{job_id}")
+    if rng.random() < 0.3:
+        user.request('post', '/apply', json={'job_id': job_id, 'cover_letter': load_answer(rng, 60)})
+        user.request('get', '/api/applications')
+
+
+LOAD_PAGES = ('/', '/aboutus', '/library', '/services', '/profile', '/contact', '/resume',
+              '/chatbot', '/api/cache/stats')
+
+
+def flow_pages(user, world):
+    """A few of the mostly static pages."""
+    for page in user.rng.sample(LOAD_PAGES, 3):
+        user.request('get', page)
+
+
+# Flow -> share of flows in the mixed workload
+LOAD_MIX = {flow_interview: 25, flow_test: 25, flow_browse: 35, flow_pages: 10, flow_account: 5}
+
+LOAD_PASSWORD = "loadtest-password"
+
+# Routes with fewer requests than this aren't compared with the baseline
+LOAD_MIN_REQUESTS = 20
+
+# Stored results `bench.py load` compares against; refresh with --save-baseline
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baselines.json")
+
+
+class LockWaitProbe(threading.Thread):
+    """Time how long a writer waits for SQLite's write lock while the load runs."""
+
+    def __init__(self, path, interval):
+        super().__init__(daemon=True)
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.interval = interval
+        self.waits = []
+        self.stop = threading.Event()
+
+    def run(self):
+        while not self.stop.wait(self.interval):
+            start = time.perf_counter()
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.waits.append(time.perf_counter() - start)
+            self.conn.execute("ROLLBACK")
+        self.conn.close()
+
+
+def bench_load(args):
+    """Mixed signup/interview/test/browse workload over every route, checked against a baseline."""
+    import random
+    import hashing
+
+    app_module = load_app()
+    logging.getLogger(app_module.app.name).setLevel(logging.CRITICAL)
+    hashing.limiter.max_per_ip = hashing.limiter.max_per_email = float('inf')
+    conn = app_module.get_db_connection()
+    seed_database(conn, users=args.users, jobs=args.jobs, questions=args.questions,
+                  sessions=args.answers // 10, answers=args.answers)
+    world = {
+        'careers': [r[0] for r in conn.execute("SELECT id FROM careers ORDER BY id")],
+        'subjects': [r[0] for r in conn.execute("SELECT name FROM careers ORDER BY id")],
+        'locations': [r[0] for r in conn.execute("SELECT DISTINCT location FROM jobs ORDER BY 1")],
+        'terms': ("job", "company", "description", "python", "sql"),
+        'jobs': args.jobs,
+        'questions': args.questions,
+    }
+    conn.close()
+
+    server = None
+    if args.transport == "http":
+        from werkzeug.serving import make_server
+        server = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+
+        def new_client():
+            return HTTPClient(base_url)
+    else:
+        new_client = app_module.app.test_client
+
+    # Each simulated user signs up first; that isn't part of the measurement
+    users = []
+    for i in range(args.threads):
+        user = LoadUser(new_client(), random.Random(), f"load{i}@example.com")
+        r = user.client.post('/api/signup', json={
+            'name': f"Load {i}", 'email': user.email, 'password': LOAD_PASSWORD})
+        if r.status_code != 200:
+            raise SystemExit(f"signup for {user.email} failed with {r.status_code}")
+        users.append(user)
+
+    # Time spent waiting for a pooled connection, outside SQLite itself
+    pool_waits = []
+    pool_acquire = db.pool.acquire
+
+    def timed_acquire():
+        start = time.perf_counter()
+        conn = pool_acquire()
+        pool_waits.append(time.perf_counter() - start)
+        return conn
+    db.pool.acquire = timed_acquire
+
+    flows, weights = list(LOAD_MIX), list(LOAD_MIX.values())
+
+    def run(user):
+        for flow in user.rng.choices(flows, weights, k=args.flows):
+            flow(user, world)
+
+    def run_round(concurrent=True):
+        # Every round replays the same flows
+        for i, user in enumerate(users):
+            user.rng.seed(args.seed + i)
+            user.samples, user.statuses = {}, {}
+        probe = LockWaitProbe(db.pool.path, args.probe_ms / 1000)
+        probe.start()
+        start = time.perf_counter()
+        if concurrent:
+            workers = [threading.Thread(target=run, args=(user,)) for user in users]
+            for t in workers:
+                t.start()
+            for t in workers:
+                t.join()
+        else:
+            for user in users:
+                run(user)
+        elapsed = time.perf_counter() - start
+        probe.stop.set()
+        probe.join()
+
+        samples, statuses = {}, {}
+        for user in users:
+            for route, seconds in user.samples.items():
+                samples.setdefault(route, []).extend(seconds)
+            for key, n in user.statuses.items():
+                statuses[key] = statuses.get(key, 0) + n
+        return samples, statuses, elapsed, probe.waits
+
+    print(f"{args.transport}, {args.threads} users x {args.flows} flows, seed {args.seed}; "
+          f"{args.users} users, {args.jobs} jobs, {args.questions} questions, {args.answers} answers")
+    # Keep the best of each figure over the rounds, so a busy moment on the
+    # machine doesn't read as a regression
+    best = {}
+    errors = {}
+    lock_waits = []
+    for number in range(1, args.rounds + 1):
+        samples, statuses, elapsed, waits = run_round()
+        lock_waits.extend(waits)
+        for (route, status), n in statuses.items():
+            if status >= 500:
+                errors[route] = errors.get(route, 0) + n
+        every = [x for s in samples.values() for x in s]
+        print(f"round {number}: {len(every) / elapsed:.1f} req/s, "
+              f"{args.threads * args.flows / elapsed:.1f} flows/s, "
+              f"p95 {percentile(every, 95) * 1000:.2f} ms over {elapsed:.1f}s")
+        samples['all'] = every
+        for route, s in samples.items():
+            figures = (len(s) / elapsed, len(s), percentile(s, 50), percentile(s, 95), percentile(s, 99))
+            if route in best:
+                was = best[route]
+                figures = (max(was[0], figures[0]), was[1] + figures[1],
+                           *(min(a, b) for a, b in zip(was[2:], figures[2:])))
+            best[route] = figures
+
+    # The same flows one at a time. Under load a route's latency mostly
+    # depends on what else was running; alone it is the route's own cost,
+    # steady enough to compare route by route.
+    solo, statuses, _, _ = run_round(concurrent=False)
+    for (route, status), n in statuses.items():
+        if status >= 500:
+            errors[route] = errors.get(route, 0) + n
+    solo['all'] = [x for s in solo.values() for x in s]
+    db.pool.acquire = pool_acquire
+    if server is not None:
+        server.shutdown()
+
+    print(f"\n{'route':<32} {'requests':>9} {'5xx':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'alone p50':>10}")
+    for route in sorted(best, key=lambda r: (r == 'all', r.split(" ", 1)[::-1])):
+        _, n, p50, p95, p99 = best[route]
+        failed = sum(errors.values()) if route == 'all' else errors.get(route, 0)
+        alone = percentile(solo[route], 50) * 1000 if route in solo else float('nan')
+        print(f"{route:<32} {n:>9} {failed:>5} "
+              f"{p50 * 1000:>8.2f} {p95 * 1000:>8.2f} {p99 * 1000:>8.2f} {alone:>10.2f}")
+    print(f"\npool wait: {sum(pool_waits) * 1000:.0f} ms total, "
+          f"p99 {percentile(pool_waits, 99) * 1000:.2f} ms over {len(pool_waits)} checkouts")
+    if lock_waits:
+        print(f"write lock wait ({len(lock_waits)} probes): p50 {percentile(lock_waits, 50) * 1000:.2f} ms, "
+              f"p99 {percentile(lock_waits, 99) * 1000:.2f} ms, max {max(lock_waits) * 1000:.2f} ms")
+
+    result = {
+        'params': {k: getattr(args, k) for k in
+                   ('transport', 'threads', 'flows', 'seed', 'users', 'jobs', 'questions', 'answers')},
+        'requests_per_second': round(best['all'][0], 1),
+        'p95_ms': round(best['all'][3] * 1000, 3),
+        'routes': {route: {'requests': len(s), 'p50_ms': round(percentile(s, 50) * 1000, 3)}
+                   for route, s in solo.items() if route != 'all'},
+    }
+    key = f"load-{args.transport}"
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+
+    if args.save_baseline:
+        baselines[key] = result
+        with open(args.baseline, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nsaved baseline {key} to {args.baseline}")
+        raise SystemExit(1 if errors else 0)
+
+    problems = [f"{n} server errors on {route}" for route, n in sorted(errors.items())]
+    baseline = baselines.get(key)
+    if baseline is None:
+        print(f"\nno baseline {key} in {args.baseline}; run with --save-baseline to record one")
+    elif baseline['params'] != result['params']:
+        print(f"\nbaseline {key} was recorded with {baseline['params']}; not comparing")
+    else:
+        floor = baseline['requests_per_second'] * (1 - args.tolerance)
+        if result['requests_per_second'] < floor:
+            problems.append(f"throughput {result['requests_per_second']} req/s, "
+                            f"baseline {baseline['requests_per_second']}")
+        if result['p95_ms'] > baseline['p95_ms'] * (1 + args.tolerance):
+            problems.append(f"p95 {result['p95_ms']:.2f} ms, baseline {baseline['p95_ms']:.2f} ms")
+        # Per route, compare the cost of the route on its own
+        for route, now in sorted(result['routes'].items()):
+            before = baseline['routes'].get(route)
+            if before is None or min(now['requests'], before['requests']) < LOAD_MIN_REQUESTS:
+                continue
+            p50, was = now['p50_ms'], before['p50_ms']
+            # Fast routes jitter by more than any tolerance
+            if p50 > was * (1 + args.tolerance) and p50 - was > args.min_ms:
+                problems.append(f"{route} p50 alone {p50:.2f} ms, baseline {was:.2f} ms")
+        print(f"\ncompared against baseline {key} (tolerance {args.tolerance:.0%})")
+    for problem in problems:
+        print(f"REGRESSION: {problem}")
+    if baseline is not None and not problems:
+        print("no regressions")
+    raise SystemExit(1 if problems else 0)
+
+
+def asgi_scope(method, path, headers=(), query_string=b''):
+    return {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': method, 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+            'query_string': query_string, 'root_path': '', 'headers': list(headers),
+            'client': ('127.0.0.1', 50000), 'server': ('127.0.0.1', 80)}
+
+
+async def open_chat_streams(app, total, send_stream):
+    """Open `total` /chat SSE streams at once on an ASGI app, called directly.
+
+    Returns time to the first token of each stream, the most streams open
+    at once, and the process's thread count at that moment.
+    """
+    import asyncio
+    import json as json_module
+
+    open_now = peak = peak_threads = 0
+    first_token = []
+    body = json_module.dumps({'message': 'How should I prepare for a behavioural interview?'}).encode()
+    headers = [(b'content-type', b'application/json'), (b'accept', b'text/event-stream')]
+
+    async def one():
+        nonlocal open_now, peak, peak_threads
+        start = time.perf_counter()
+        requested = False
+        seen_first = False
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            # The client never goes away
+            await asyncio.Event().wait()
+
+        async def send(message):
+            nonlocal seen_first, open_now, peak, peak_threads
+            if message['type'] != 'http.response.body':
+                return
+            if not seen_first and b'data:' in message.get('body', b''):
+                seen_first = True
+                first_token.append(time.perf_counter() - start)
+                open_now += 1
+                if open_now > peak:
+                    peak, peak_threads = open_now, threading.active_count()
+            if not message.get('more_body') and seen_first:
+                open_now -= 1
+
+        await app(asgi_scope('POST', '/chat', headers), receive, send)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+    await send_stream()
+    return first_token, peak, peak_threads, elapsed
+
+
+def bench_asgi(args):
+    """Open /chat streams per process: async route vs. the Flask route on the WSGI thread pool."""
+    import asyncio
+    import asgi
+    import chat_cache
+    import chatbot
+
+    logging.getLogger(asgi.flask_app.name).setLevel(logging.CRITICAL)
+    chatbot.backend = chatbot.FakeBackend(first_token_delay=args.first_token_ms / 1000,
+                                          token_delay=args.token_ms / 1000)
+    # Every stream goes to the model
+    chatbot.response_cache = chat_cache.ResponseCache(max_entries=0, persist=False)
+    reply_seconds = (args.first_token_ms + args.token_ms * len(chatbot.backend.reply.split())) / 1000
+
+    print(f"each reply streams for ~{reply_seconds:.1f}s; Flask gets {args.wsgi_threads} WSGI threads")
+    print(f"{'route':<7} {'streams':>8} {'peak open':>10} {'threads':>8} {'ttft p50 ms':>12} "
+          f"{'ttft p99 ms':>12} {'total s':>8}")
+    ok = True
+    for label, routes, total in (("async", asgi.ROUTES, args.streams),
+                                 ("flask", {}, args.flask_streams)):
+        app = asgi.ASGIApp(asgi.flask_app, routes, wsgi_threads=args.wsgi_threads)
+        before = chatbot.backend.started
+        first_token, peak, threads, elapsed = asyncio.run(
+            open_chat_streams(app, total, asgi.adb.close))
+        print(f"{label:<7} {total:>8} {peak:>10} {threads:>8} "
+              f"{percentile(first_token, 50) * 1000:>12.0f} {percentile(first_token, 99) * 1000:>12.0f} "
+              f"{elapsed:>8.1f}")
+        if label == "async":
+            ok = len(first_token) == total and chatbot.backend.started - before == total
+    raise SystemExit(0 if ok else 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("pool", help="pooled vs per-request connections on /jobs and /api/login")
+    p.add_argument("--requests", type=int, default=2000)
+    p.add_argument("--threads", type=int, default=8)
+    p.set_defaults(func=bench_pool)
+
+    p = sub.add_parser("startup", help="init_db() cost on an empty vs. up-to-date database")
+    p.add_argument("--runs", type=int, default=50)
+    p.set_defaults(func=bench_startup)
+
+    p = sub.add_parser("plans", help="fail if any module's SQL does a full table scan")
+    p.add_argument("--rows", type=int, default=1_000_000)
+    p.set_defaults(func=bench_plans)
+
+    p = sub.add_parser("sampling", help="ORDER BY RANDOM() vs. in-memory question pools")
+    p.add_argument("--questions", type=int, default=200_000)
+    p.add_argument("--draws", type=int, default=200)
+    p.set_defaults(func=bench_sampling)
+
+    p = sub.add_parser("sessions", help="signed-cookie vs. server-side session size and cost")
+    p.add_argument("--iterations", type=int, default=5000)
+    p.set_defaults(func=bench_sessions)
+
+    p = sub.add_parser("answers", help="test answer write throughput under concurrent test-takers")
+    p.add_argument("--answers", type=int, default=20000)
+    p.add_argument("--threads", type=int, default=16)
+    p.set_defaults(func=bench_answers)
+
+    p = sub.add_parser("grading", help="server-side test grading under concurrent test sessions")
+    p.add_argument("--sessions", type=int, default=400)
+    p.add_argument("--threads", type=int, default=8)
+    p.add_argument("--questions", type=int, default=5000)
+    p.add_argument("--repeat", type=float, default=0.1)
+    p.set_defaults(func=bench_grading)
+
+    p = sub.add_parser("progress", help="dashboard rollups: read cost, and rebuild vs. incremental")
+    p.add_argument("--users", type=int, default=2000)
+    p.add_argument("--events", type=int, default=100000)
+    p.add_argument("--days", type=int, default=180)
+    p.add_argument("--reads", type=int, default=2000)
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=bench_progress)
+
+    p = sub.add_parser("finish", help="finish_interview latency, inline vs. background scoring")
+    p.add_argument("--costs", type=int, nargs="+", default=[0, 50, 500])
+    p.set_defaults(func=bench_finish)
+
+    p = sub.add_parser("scoring", help="vectorized batch scorer vs. analyze_answers")
+    p.add_argument("--answers", type=int, default=1_000_000)
+    p.add_argument("--chunk-size", type=int, default=10000)
+    p.set_defaults(func=bench_scoring)
+
+    p = sub.add_parser("rubric", help="rubric term matching on essay-length answers")
+    p.add_argument("--essays", type=int, default=500)
+    p.add_argument("--words", type=int, default=1000)
+    p.set_defaults(func=bench_rubric)
+
+    p = sub.add_parser("loginstorm", help="/api/jobs latency during a burst of logins")
+    p.add_argument("--attackers", type=int, default=16)
+    p.add_argument("--requests", type=int, default=200)
+    p.set_defaults(func=bench_login_storm)
+
+    p = sub.add_parser("jobspage", help="/api/jobs keyset page latency vs. OFFSET paging")
+    p.add_argument("--jobs", type=int, default=1_000_000)
+    p.add_argument("--limit", type=int, default=20)
+    p.add_argument("--fetches", type=int, default=200)
+    p.set_defaults(func=bench_jobs_page)
+
+    p = sub.add_parser("search", help="ranked full-text search latency on a generated corpus")
+    p.add_argument("--docs", type=int, default=1_000_000)
+    p.add_argument("--queries", type=int, default=100)
+    p.set_defaults(func=bench_search)
+
+    p = sub.add_parser("match", help="resume-to-job matching latency on a generated corpus")
+    p.add_argument("--docs", type=int, default=500_000)
+    p.add_argument("--queries", type=int, default=100)
+    p.add_argument("--inserts", type=int, default=1000)
+    p.set_defaults(func=bench_match)
+
+    p = sub.add_parser("ingest", help="feed ingestion throughput and memory")
+    p.add_argument("--rows", type=int, default=200_000)
+    p.add_argument("--format", choices=("csv", "ndjson"), default="ndjson")
+    p.add_argument("--batch-size", type=int, default=5000)
+    p.set_defaults(func=bench_ingest)
+
+    p = sub.add_parser("apply", help="job application throughput and counter consistency")
+    p.add_argument("--applications", type=int, default=20000)
+    p.add_argument("--threads", type=int, default=8)
+    p.add_argument("--users", type=int, default=5000)
+    p.add_argument("--jobs", type=int, default=2000)
+    p.add_argument("--repeat", type=float, default=0.2, help="share of repeated clicks")
+    p.set_defaults(func=bench_apply)
+
+    p = sub.add_parser("chat", help="/chat time to first byte, JSON vs. streamed")
+    p.add_argument("--requests", type=int, default=10)
+    p.add_argument("--first-token-ms", type=float, default=300)
+    p.add_argument("--token-ms", type=float, default=20)
+    p.set_defaults(func=bench_chat)
+
+    p = sub.add_parser("chatcache", help="/chat response cache hit rate and latency")
+    p.add_argument("--requests", type=int, default=400)
+    p.add_argument("--similarity", type=float, default=0.85)
+    p.add_argument("--first-token-ms", type=float, default=300)
+    p.add_argument("--token-ms", type=float, default=5)
+    p.set_defaults(func=bench_chatcache)
+
+    p = sub.add_parser("metrics", help="/metrics instrumentation overhead and profiler output")
+    p.add_argument("--requests", type=int, default=2000)
+    p.add_argument("--threads", type=int, default=8)
+    p.add_argument("--rounds", type=int, default=3)
+    p.set_defaults(func=bench_metrics)
+
+    p = sub.add_parser("history", help="/chat prompt size and latency over a long conversation")
+    p.add_argument("--turns", type=int, default=200)
+    p.add_argument("--budget", type=int, default=3000)
+    p.add_argument("--question-words", type=int, default=30)
+    p.add_argument("--reply-words", type=int, default=150)
+    p.set_defaults(func=bench_history)
+
+    p = sub.add_parser("llm", help="/chat upstream deadlines, retries and circuit breaking")
+    p.add_argument("--requests", type=int, default=200)
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--queue", type=int, default=8)
+    p.add_argument("--threads", type=int, default=64, help="callers in the swamped scenario")
+    p.add_argument("--deadline", type=float, default=1.0)
+    p.set_defaults(func=bench_llm)
+
+    p = sub.add_parser("load", help="mixed workload over every route, compared with a stored baseline")
+    p.add_argument("--transport", choices=("inprocess", "http"), default="inprocess",
+                   help="Flask test client, or HTTP against a local threaded server")
+    p.add_argument("--threads", type=int, default=8, help="simulated users")
+    p.add_argument("--flows", type=int, default=25, help="flows per simulated user")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--users", type=int, default=10000)
+    p.add_argument("--jobs", type=int, default=20000)
+    p.add_argument("--questions", type=int, default=20000)
+    p.add_argument("--answers", type=int, default=100000)
+    p.add_argument("--rounds", type=int, default=3, help="runs of the workload; the best of each is kept")
+    p.add_argument("--probe-ms", type=float, default=20, help="write lock probe interval")
+    p.add_argument("--baseline", default=BASELINE_PATH)
+    p.add_argument("--save-baseline", action="store_true")
+    p.add_argument("--tolerance", type=float, default=0.3, help="allowed slowdown before failing")
+    p.add_argument("--min-ms", type=float, default=2.0, help="ignore per-route changes smaller than this")
+    p.set_defaults(func=bench_load)
+
+    p = sub.add_parser("asgi", help="concurrent /chat streams, async route vs. Flask threads")
+    p.add_argument("--streams", type=int, default=5000)
+    p.add_argument("--flask-streams", type=int, default=200)
+    p.add_argument("--wsgi-threads", type=int, default=32)
+    p.add_argument("--first-token-ms", type=float, default=500)
+    p.add_argument("--token-ms", type=float, default=50)
+    p.set_defaults(func=bench_asgi)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Read-through cache for reference data (careers, test subjects, answer keys).
+
+Entries live in an in-process LRU with a TTL. Each entry also records the
+version of every namespace it was built from ('careers', 'questions',
+'answer_keys'); bumping a namespace's version invalidates everything that
+depends on it without having to know the keys.
+
+With shared=True versions are read from the cache_versions table in
+users.db, which triggers keep up to date on every write to the source
+tables, so workers notice each other's writes within check_interval
+seconds. Without it entries only expire by TTL.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import db
+
+
+class ReadThroughCache:
+    def __init__(self, max_entries=1024, ttl=300, shared=False, check_interval=1.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared = shared
+        self.check_interval = check_interval
+        self._entries = OrderedDict()
+        self._shared_versions = {}
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _refresh_shared(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        conn = db.get_connection()
+        try:
+            rows = conn.execute("SELECT namespace, version FROM cache_versions").fetchall()
+        finally:
+            conn.close()
+        self._shared_versions = {row['namespace']: row['version'] for row in rows}
+
+    def _stamp(self, namespaces):
+        if self.shared:
+            self._refresh_shared()
+        return tuple(self._shared_versions.get(ns, 0) for ns in namespaces)
+
+    def get_or_load(self, key, namespaces, loader, ttl=None):
+        """Return the cached value for key, calling loader() on a miss."""
+        stamp = self._stamp(namespaces)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at, entry_stamp = entry
+                if expires_at > now and entry_stamp == stamp:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+
+        value = loader()
+        with self._lock:
+            self._entries[key] = (value, now + (ttl or self.ttl), stamp)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
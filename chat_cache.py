@@ -0,0 +1,293 @@
+"""Response cache for the career chatbot.
+
+Lookups go through two tiers:
+
+    exact    - the prompt normalized (case-folded, punctuation dropped,
+               whitespace collapsed) is the key, so "How do I write a
+               resume?" and "how do i write a resume" share an entry
+    similar  - opt-in (similarity > 0): otherwise, a prompt whose
+               content-word bigrams overlap an earlier prompt's by at
+               least `similarity` (Jaccard) gets that prompt's reply.
+               Bigrams keep word order, so "from data science to
+               software engineering" doesn't match the reverse move.
+               Candidates come from MinHash signatures bucketed by LSH
+               bands, so a lookup compares against a handful of
+               entries, not all of them; each candidate's overlap is
+               then checked exactly, best first, skipping expired ones
+
+Entries live in an in-process LRU with a TTL. With persist=True every
+reply is also written to chat_response_cache in users.db (migration
+v14): the LRU is warmed from it on first use after a restart, and an
+exact miss in memory falls through to it, so workers share replies.
+Persistence is best effort; a database error never fails a chat.
+"""
+import hashlib
+import logging
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import db
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+# Prompts with fewer content words than this only hit on an exact match
+MIN_SIMILAR_WORDS = 2
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'can', 'could', 'do', 'does', 'for', 'how', 'i',
+    'if', 'in', 'is', 'it', 'me', 'my', 'of', 'on', 'or', 'should', 'so', 'some', 'the', 'to',
+    'what', 'when', 'which', 'would', 'you', 'your',
+    # Filler that doesn't change the question
+    'hi', 'hello', 'please', 'tell', 'thanks', 'thank', 'hey',
+}
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(1337)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+
+def normalize(prompt):
+    return " ".join(re.findall(r"\w+", (prompt or '').casefold()))
+
+
+def shingles(normalized):
+    """Adjacent pairs of content words, as 'first second' strings."""
+    words = [w for w in normalized.split() if w not in STOPWORDS]
+    if len(words) < MIN_SIMILAR_WORDS:
+        return frozenset()
+    return frozenset(f"{a} {b}" for a, b in zip(words, words[1:]))
+
+
+def minhash(words):
+    hashes = [int.from_bytes(hashlib.blake2b(w.encode(), digest_size=8).digest(), 'big')
+              for w in words]
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def lsh_bands(signature):
+    return [(band, signature[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+
+class ResponseCache:
+    def __init__(self, max_entries=5000, ttl=86400, similarity=0.0, persist=True,
+                 sweep_every=500):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.persist = persist
+        self.sweep_every = sweep_every
+        self._entries = OrderedDict()   # key -> (response, expires_at, shingles, bands)
+        self._buckets = {}              # LSH band -> keys
+        self._lock = threading.Lock()
+        self._loaded = not persist
+        self._writes = 0
+        self.counters = {'exact_hits': 0, 'similar_hits': 0, 'misses': 0, 'evictions': 0,
+                         'expirations': 0, 'stores': 0}
+        self._lookup_seconds = 0.0
+        self._upstream_seconds = 0.0
+        self._upstream_calls = 0
+
+    # ----- in-memory tiers -----
+
+    def _insert(self, key, response, expires_at):
+        grams = shingles(key) if self.similarity else frozenset()
+        bands = lsh_bands(minhash(grams)) if grams else []
+        self._drop(key)
+        self._entries[key] = (response, expires_at, grams, bands)
+        for band in bands:
+            self._buckets.setdefault(band, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+            self.counters['evictions'] += 1
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for band in entry[3]:
+            keys = self._buckets.get(band)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._buckets[band]
+
+    def _live(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= now:
+            self._drop(key)
+            self.counters['expirations'] += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def _similar(self, key, now):
+        grams = shingles(key) if self.similarity else frozenset()
+        if not grams:
+            return None
+        candidates = set()
+        for band in lsh_bands(minhash(grams)):
+            candidates |= self._buckets.get(band, set())
+        scored = []
+        for candidate in candidates:
+            other = self._entries[candidate][2]
+            score = len(grams & other) / len(grams | other)
+            if score >= self.similarity:
+                scored.append((score, candidate))
+        # Best first; an expired candidate is dropped and the next one tried
+        for _, candidate in sorted(scored, reverse=True):
+            response = self._live(candidate, now)
+            if response is not None:
+                return response
+        return None
+
+    # ----- persistence -----
+
+    def _load(self):
+        now = time.time()
+        conn = db.get_connection()
+        try:
+            conn.execute("DELETE FROM chat_response_cache WHERE expires_at <= ?", (now,))
+            conn.commit()
+            rows = conn.execute(
+                """SELECT key, response, expires_at FROM chat_response_cache
+                   ORDER BY created_at DESC LIMIT ?""",
+                (self.max_entries,)
+            ).fetchall()
+        finally:
+            conn.close()
+        # Oldest first, so the most recent end up at the warm end of the LRU
+        for key, response, expires_at in reversed(rows):
+            self._insert(key, response, expires_at)
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            try:
+                self._load()
+            except sqlite3.Error as e:
+                logger.warning("Chat cache warm-up failed: %s", e)
+
+    def _fetch(self, key, now):
+        conn = db.get_connection()
+        try:
+            row = conn.execute(
+                "SELECT response, expires_at FROM chat_response_cache WHERE key = ? AND expires_at > ?",
+                (key, now)
+            ).fetchone()
+        finally:
+            conn.close()
+        return (row[0], row[1]) if row else None
+
+    def save(self, conn, key, response, expires_at):
+        """Write an entry on the caller's connection; commit is left to the caller."""
+        now = time.time()
+        conn.execute(
+            """INSERT INTO chat_response_cache (key, response, created_at, expires_at)
+               VALUES (?, ?, ?, ?)
+               ON CONFLICT(key) DO UPDATE SET response = excluded.response,
+                                              created_at = excluded.created_at,
+                                              expires_at = excluded.expires_at""",
+            (key, response, now, expires_at)
+        )
+        self._writes += 1
+        if self._writes % self.sweep_every == 0:
+            conn.execute("DELETE FROM chat_response_cache WHERE expires_at <= ?", (now,))
+
+    def _save(self, key, response, expires_at):
+        conn = db.get_connection()
+        try:
+            self.save(conn, key, response, expires_at)
+            conn.commit()
+        finally:
+            conn.close()
+
+    # ----- public API -----
+
+    def get(self, prompt):
+        """Return (response, 'exact' | 'similar'), or (None, None) on a miss."""
+        self._ensure_loaded()
+        start = time.perf_counter()
+        key = normalize(prompt)
+        now = time.time()
+        kind = None
+        with self._lock:
+            response = self._live(key, now)
+            if response is not None:
+                kind = 'exact'
+        if response is None and self.persist:
+            try:
+                stored = self._fetch(key, now)
+            except sqlite3.Error as e:
+                logger.warning("Chat cache read failed: %s", e)
+                stored = None
+            if stored is not None:
+                response, kind = stored[0], 'exact'
+                with self._lock:
+                    self._insert(key, *stored)
+        if response is None:
+            with self._lock:
+                response = self._similar(key, now)
+                if response is not None:
+                    kind = 'similar'
+        with self._lock:
+            self.counters[f"{kind}_hits" if kind else 'misses'] += 1
+            self._lookup_seconds += time.perf_counter() - start
+        return response, kind
+
+    def remember(self, prompt, response):
+        """Store a reply in memory only; returns the (key, response, expires_at) to save, or None."""
+        key = normalize(prompt)
+        if not key or not response:
+            return None
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._insert(key, response, expires_at)
+            self.counters['stores'] += 1
+        return key, response, expires_at
+
+    def put(self, prompt, response):
+        entry = self.remember(prompt, response)
+        if entry is not None and self.persist:
+            try:
+                self._save(*entry)
+            except sqlite3.Error as e:
+                logger.warning("Chat cache write failed: %s", e)
+
+    def record_upstream(self, seconds):
+        """Time a cache miss spent waiting for the model."""
+        with self._lock:
+            self._upstream_seconds += seconds
+            self._upstream_calls += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = (self.counters['exact_hits'] + self.counters['similar_hits']
+                       + self.counters['misses'])
+            hits = lookups - self.counters['misses']
+            return dict(
+                self.counters,
+                entries=len(self._entries),
+                hit_rate=round(hits / lookups, 4) if lookups else 0.0,
+                avg_lookup_ms=round(self._lookup_seconds / lookups * 1000, 3) if lookups else 0.0,
+                avg_upstream_ms=(round(self._upstream_seconds / self._upstream_calls * 1000, 1)
+                                 if self._upstream_calls else 0.0),
+            )
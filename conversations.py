@@ -0,0 +1,259 @@
+"""Server-side chat history with token-budgeted context for the model.
+
+Every turn is appended to conversation_messages (migration v15) together
+with its estimated token count; message rows are never rewritten. The
+conversations row is the head of a conversation: its title, the id of its
+last message, and a rolling summary of every message up to summary_upto.
+
+A model call gets the system prompt with the summary folded in, the most
+recent turns that fit in `budget` tokens, and the new message, so the
+prompt stops growing once a conversation outgrows the budget. Turns that
+drop out of the window are not lost: once more than `summarize_after`
+tokens of them are not yet in the summary, a conversation_summary task
+folds them in on the task workers, off the request path.
+
+The recent turns of each conversation stay in memory between turns. As
+with sampling.py's pools, a cached conversation is checked against its
+head row (a primary-key lookup) and reloaded if another worker appended to
+it or the summary task moved it on.
+"""
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+
+import db
+import tasks
+
+DEFAULT_BUDGET = 3000
+DEFAULT_SUMMARIZE_AFTER = 1000
+
+# Longest summary kept, in tokens; anything beyond is cut off
+SUMMARY_TOKENS = 300
+
+# Role and separators the API adds around every message
+MESSAGE_OVERHEAD = 4
+
+Turn = namedtuple('Turn', 'id role content tokens')
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters each for English text)."""
+    return len(text or '') // 4 + 1
+
+
+def message_tokens(text):
+    return estimate_tokens(text) + MESSAGE_OVERHEAD
+
+
+class Conversation:
+    """The head of one conversation and the turns after its summary."""
+
+    def __init__(self, head, turns, pending_tokens, dropped_upto):
+        self.id = head['id']
+        self.last_message_id = head['last_message_id']
+        self.summary = head['summary']
+        self.summary_upto = head['summary_upto']
+        self.summary_tokens = head['summary_tokens']
+        self.turns = deque(turns)               # oldest first
+        self.tokens = sum(turn.tokens for turn in turns)
+        # Tokens that fell out of the window but aren't summarized yet
+        self.pending_tokens = pending_tokens
+        self.dropped_upto = dropped_upto
+        # pending_tokens when a summary was last queued
+        self.queued_at_tokens = 0
+
+    def matches(self, head):
+        return (self.last_message_id == head['last_message_id']
+                and self.summary_upto == head['summary_upto'])
+
+
+class ConversationStore:
+    def __init__(self, budget=DEFAULT_BUDGET, summarize_after=DEFAULT_SUMMARIZE_AFTER,
+                 max_cached=1000):
+        self.budget = budget
+        self.summarize_after = summarize_after
+        self.max_cached = max_cached
+        self._cache = OrderedDict()     # conversation id -> Conversation
+        self._lock = threading.Lock()
+
+    # ----- loading -----
+
+    def _head(self, conn, user_id, client_id):
+        return conn.execute(
+            """SELECT id, last_message_id, summary, summary_upto, summary_tokens
+               FROM conversations WHERE user_id = ? AND client_id = ?""",
+            (user_id, client_id)
+        ).fetchone()
+
+    def _load(self, conn, head):
+        turns, tokens = [], 0
+        for row in conn.execute(
+            """SELECT id, role, content, tokens FROM conversation_messages
+               WHERE conversation_id = ? AND id > ?
+               ORDER BY id DESC""",
+            (head['id'], head['summary_upto'])
+        ):
+            if tokens + row['tokens'] > self.budget:
+                break
+            tokens += row['tokens']
+            turns.append(Turn(*row))
+        turns.reverse()
+
+        dropped_upto = (turns[0].id if turns else head['last_message_id'] + 1) - 1
+        pending = 0
+        if dropped_upto > head['summary_upto']:
+            pending = conn.execute(
+                """SELECT COALESCE(SUM(tokens), 0) FROM conversation_messages
+                   WHERE conversation_id = ? AND id > ? AND id <= ?""",
+                (head['id'], head['summary_upto'], dropped_upto)
+            ).fetchone()[0]
+        return Conversation(head, turns, pending, max(dropped_upto, head['summary_upto']))
+
+    def open(self, conn, user_id, client_id, title=None):
+        """The user's conversation with this client id, created on first use."""
+        head = self._head(conn, user_id, client_id)
+        if head is None:
+            now = time.time()
+            conn.execute(
+                """INSERT INTO conversations (user_id, client_id, title, created_at, updated_at)
+                   VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT (user_id, client_id) DO NOTHING""",
+                (user_id, client_id, title, now, now)
+            )
+            conn.commit()
+            head = self._head(conn, user_id, client_id)
+
+        with self._lock:
+            conversation = self._cache.get(head['id'])
+            if conversation is not None and conversation.matches(head):
+                self._cache.move_to_end(head['id'])
+                return conversation
+        conversation = self._load(conn, head)
+        with self._lock:
+            self._cache[head['id']] = conversation
+            self._cache.move_to_end(head['id'])
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+        return conversation
+
+    # ----- turns -----
+
+    def context(self, conversation, system_prompt, user_input):
+        """Messages for the model: summary, recent turns within budget, then the new one."""
+        with self._lock:
+            available = self.budget - conversation.summary_tokens - message_tokens(user_input)
+            window = []
+            for turn in reversed(conversation.turns):
+                if turn.tokens > available:
+                    break
+                available -= turn.tokens
+                window.append(turn)
+            summary = conversation.summary
+
+        if summary:
+            system_prompt = f"{system_prompt}\n\nSummary of the conversation so far: {summary}"
+        return ([{"role": "system", "content": system_prompt}]
+                + [{"role": turn.role, "content": turn.content} for turn in reversed(window)]
+                + [{"role": "user", "content": user_input}])
+
+    def append(self, conn, conversation, role, content):
+        """Append a message and commit; queues a summary once enough history piles up."""
+        tokens = message_tokens(content)
+        now = time.time()
+        message_id = conn.execute(
+            """INSERT INTO conversation_messages (conversation_id, role, content, tokens, created_at)
+               VALUES (?, ?, ?, ?, ?)""",
+            (conversation.id, role, content, tokens, now)
+        ).lastrowid
+        conn.execute(
+            "UPDATE conversations SET last_message_id = ?, updated_at = ? WHERE id = ?",
+            (message_id, now, conversation.id)
+        )
+
+        with self._lock:
+            conversation.turns.append(Turn(message_id, role, content, tokens))
+            conversation.tokens += tokens
+            conversation.last_message_id = message_id
+            while conversation.tokens > self.budget and len(conversation.turns) > 1:
+                dropped = conversation.turns.popleft()
+                conversation.tokens -= dropped.tokens
+                conversation.pending_tokens += dropped.tokens
+                conversation.dropped_upto = dropped.id
+            upto = conversation.dropped_upto
+            # Once queued, wait for the summary (which reloads the conversation)
+            # unless another summarize_after tokens pile up in the meantime
+            summarize = (conversation.pending_tokens
+                         >= conversation.queued_at_tokens + self.summarize_after)
+            if summarize:
+                conversation.queued_at_tokens = conversation.pending_tokens
+
+        if summarize:
+            tasks.queue.enqueue(conn, f"conversation-summary:{conversation.id}:{upto}",
+                                'conversation_summary',
+                                {'conversation_id': conversation.id, 'upto': upto})
+        conn.commit()
+        return message_id
+
+    # ----- summaries -----
+
+    def summarize(self, conversation_id, upto, summarize_turns):
+        """Fold messages up to `upto` into the rolling summary.
+
+        summarize_turns(previous_summary, [(role, content)]) writes the new
+        summary. Returns the new summary_upto, or None if a later summary
+        already covers these messages.
+        """
+        conn = db.get_connection()
+        try:
+            head = conn.execute(
+                "SELECT summary, summary_upto FROM conversations WHERE id = ?",
+                (conversation_id,)
+            ).fetchone()
+            if head is None or head['summary_upto'] >= upto:
+                return None
+            turns = [(row['role'], row['content']) for row in conn.execute(
+                """SELECT role, content FROM conversation_messages
+                   WHERE conversation_id = ? AND id > ? AND id <= ?
+                   ORDER BY id""",
+                (conversation_id, head['summary_upto'], upto)
+            )]
+            summary = summarize_turns(head['summary'], turns)[:SUMMARY_TOKENS * 4]
+            # Only move forward from the summary we read
+            updated = conn.execute(
+                """UPDATE conversations SET summary = ?, summary_upto = ?, summary_tokens = ?
+                   WHERE id = ? AND summary_upto = ?""",
+                (summary, upto, estimate_tokens(summary), conversation_id, head['summary_upto'])
+            ).rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        return upto if updated else None
+
+    # ----- listing and removal -----
+
+    def for_user(self, conn, user_id, limit=50):
+        return [dict(row) for row in conn.execute(
+            """SELECT client_id AS id, title, created_at, updated_at FROM conversations
+               WHERE user_id = ?
+               ORDER BY updated_at DESC
+               LIMIT ?""",
+            (user_id, limit)
+        )]
+
+    def delete(self, conn, user_id, client_id):
+        """Remove a conversation and its messages; commit is left to the caller."""
+        head = self._head(conn, user_id, client_id)
+        if head is None:
+            return False
+        conn.execute("DELETE FROM conversation_messages WHERE conversation_id = ?", (head['id'],))
+        conn.execute("DELETE FROM conversations WHERE id = ?", (head['id'],))
+        with self._lock:
+            self._cache.pop(head['id'], None)
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+store = ConversationStore()
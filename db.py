@@ -0,0 +1,171 @@
+import os
+import sqlite3
+import threading
+import time
+import queue
+
+DATABASE_PATH = os.getenv("DATABASE_PATH", "users.db")
+
+# When set, called as observer(sql, seconds) after every statement run
+# through a pooled connection (metrics.py installs one)
+observer = None
+
+# PRAGMAs applied once to every pooled connection
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -20000",      # ~20MB page cache
+    "PRAGMA mmap_size = 268435456",    # 256MB memory-mapped I/O
+    "PRAGMA temp_store = MEMORY",
+)
+
+
+def _observed(run, sql, params):
+    if observer is None:
+        return run(sql, params)
+    start = time.perf_counter()
+    try:
+        return run(sql, params)
+    finally:
+        observer(sql, time.perf_counter() - start)
+
+
+class ObservedCursor:
+    """sqlite3.Cursor whose statements are reported to the observer too."""
+
+    def __init__(self, raw):
+        self._raw = raw
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def execute(self, sql, params=()):
+        _observed(self._raw.execute, sql, params)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        _observed(self._raw.executemany, sql, seq_of_params)
+        return self
+
+
+class PooledConnection:
+    """Thin wrapper around sqlite3.Connection.
+
+    Routes keep calling conn.close() in their finally blocks; for a pooled
+    connection that just hands it back to the pool instead of closing it.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._depth = 0
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self._raw.__enter__()
+
+    def __exit__(self, *exc):
+        return self._raw.__exit__(*exc)
+
+    def execute(self, sql, params=()):
+        return _observed(self._raw.execute, sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return _observed(self._raw.executemany, sql, seq_of_params)
+
+    def cursor(self):
+        return ObservedCursor(self._raw.cursor())
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def close(self):
+        self._pool.release(self)
+
+
+class ConnectionPool:
+    """Bounded pool of tuned SQLite connections with per-thread reuse.
+
+    A thread that already holds a connection gets the same one back, so
+    nested helpers (e.g. finish_interview called from submit_answer) don't
+    check out a second connection.
+    """
+
+    def __init__(self, path=DATABASE_PATH, max_size=8, timeout=30.0, busy_timeout_ms=5000):
+        self.path = path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.busy_timeout_ms = busy_timeout_ms
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._all = []
+
+    def _connect(self):
+        raw = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000,
+                              check_same_thread=False)
+        raw.row_factory = sqlite3.Row
+        raw.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        for pragma in PRAGMAS:
+            raw.execute(pragma)
+        return raw
+
+    def acquire(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn._depth += 1
+            return conn
+
+        if not self._slots.acquire(timeout=self.timeout):
+            raise sqlite3.OperationalError("Timed out waiting for a database connection")
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                conn = PooledConnection(self, self._connect())
+            except Exception:
+                self._slots.release()
+                raise
+            with self._lock:
+                self._all.append(conn)
+
+        conn._depth = 1
+        self._local.conn = conn
+        return conn
+
+    def release(self, conn):
+        conn._depth -= 1
+        if conn._depth > 0:
+            return
+        # Never hand a connection with an open transaction to another request
+        if conn._raw.in_transaction:
+            conn._raw.rollback()
+        self._local.conn = None
+        self._idle.put(conn)
+        self._slots.release()
+
+    def close_all(self):
+        with self._lock:
+            for conn in self._all:
+                try:
+                    conn._raw.close()
+                except sqlite3.Error:
+                    pass
+            self._all = []
+        self._idle = queue.LifoQueue()
+
+
+pool = ConnectionPool(max_size=int(os.getenv("DB_POOL_SIZE", "8")))
+
+
+def get_connection():
+    return pool.acquire()
@@ -0,0 +1,103 @@
+"""Password hashing off the request path, with admission control.
+
+pbkdf2 hashing is deliberately slow. Running it on a small, bounded pool
+caps how much CPU a burst of logins or signups can take, so other routes
+in the same worker keep getting served. hashlib's pbkdf2_hmac releases
+the GIL while it runs, so a thread pool gets the same isolation as a
+process pool without pickling or forking a threaded server.
+
+When the pool and its queue are full, callers get Saturated straight
+away (the routes answer 503) instead of piling up behind it; a hash that
+doesn't finish within `timeout` raises Saturated as well.
+FailedAttemptLimiter counts recent failed logins per IP and per email
+and turns credential-stuffing bursts away (429) before any hashing.
+"""
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class Saturated(Exception):
+    pass
+
+
+class HashingExecutor:
+    def __init__(self, workers=2, max_queue=16, timeout=10.0):
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hashing")
+        # Running + queued jobs; beyond this we shed load
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+
+    def _run(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            raise Saturated()
+        try:
+            future = self._pool.submit(fn, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # Still holds its slot until the hash finishes
+            raise Saturated()
+
+    def hash_password(self, password):
+        return self._run(generate_password_hash, password, method='pbkdf2:sha256')
+
+    def verify_password(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+
+class FailedAttemptLimiter:
+    """Sliding-window count of failed logins per key (IP or email)."""
+
+    def __init__(self, max_per_email=5, max_per_ip=20, window=900):
+        self.max_per_email = max_per_email
+        self.max_per_ip = max_per_ip
+        self.window = window
+        self._failures = defaultdict(deque)
+        self._lock = threading.Lock()
+        self._recorded = 0
+
+    def _count(self, key, now):
+        attempts = self._failures.get(key)
+        if not attempts:
+            return 0
+        while attempts and attempts[0] <= now - self.window:
+            attempts.popleft()
+        if not attempts:
+            del self._failures[key]
+            return 0
+        return len(attempts)
+
+    def blocked(self, ip, email):
+        now = time.time()
+        with self._lock:
+            return (self._count(('email', email.lower()), now) >= self.max_per_email
+                    or self._count(('ip', ip), now) >= self.max_per_ip)
+
+    def record_failure(self, ip, email):
+        now = time.time()
+        with self._lock:
+            self._failures[('email', email.lower())].append(now)
+            self._failures[('ip', ip)].append(now)
+            self._recorded += 1
+            if self._recorded % 1000 == 0:
+                # Drop keys that went quiet so sprayed emails don't pile up
+                for key in list(self._failures):
+                    self._count(key, now)
+
+    def record_success(self, email):
+        with self._lock:
+            self._failures.pop(('email', email.lower()), None)
+
+
+executor = HashingExecutor(workers=int(os.getenv("HASH_WORKERS", "2")),
+                           max_queue=int(os.getenv("HASH_QUEUE", "16")))
+limiter = FailedAttemptLimiter()
@@ -0,0 +1,205 @@
+"""Bulk job ingestion from CSV or NDJSON feeds.
+
+Feeds are read one row at a time, so a file of any size is parsed in
+constant memory. Each row is normalized (whitespace collapsed, posted_at
+in the app's 'YYYY-MM-DD HH:MM:SS' form, career resolved by name) and
+keyed by dedup_hash: a 64-bit hash of the case-folded company, title and
+location. jobs.dedup_hash has a unique index (migration v12), so a batch
+is written with one executemany upsert: new postings are inserted, known
+ones are updated only when their content changed, and unchanged ones are
+left alone so their triggers don't fire.
+
+Every batch is its own transaction. The FTS index (migration v10) follows
+through its triggers; the in-memory match index picks the changes up on
+its next refresh().
+
+    python ingest.py feed.ndjson --batch-size 5000
+"""
+import argparse
+import csv
+import hashlib
+import io
+import json
+from datetime import datetime
+
+FIELDS = ('title', 'company', 'location', 'description', 'requirements', 'posted_at')
+REQUIRED = ('title', 'company', 'location')
+
+DEFAULT_BATCH_SIZE = 5000
+
+# Parameters are numbered because posted_at (?6) is used twice: a record
+# without one keeps the stored date instead of being re-dated to now
+UPSERT_SQL = '''
+    INSERT INTO jobs (title, company, location, description, requirements, posted_at,
+                      career_id, dedup_hash)
+    VALUES (?1, ?2, ?3, ?4, ?5, COALESCE(?6, CURRENT_TIMESTAMP), ?7, ?8)
+    ON CONFLICT (dedup_hash) DO UPDATE SET
+        description = excluded.description,
+        requirements = excluded.requirements,
+        posted_at = COALESCE(?6, jobs.posted_at),
+        career_id = excluded.career_id
+    WHERE description IS NOT excluded.description
+       OR requirements IS NOT excluded.requirements
+       OR career_id IS NOT excluded.career_id
+'''
+
+
+class InvalidFeed(ValueError):
+    pass
+
+
+def _clean(value):
+    if value is None:
+        return None
+    value = " ".join(str(value).split())
+    return value or None
+
+
+def dedup_hash(company, title, location):
+    """Signed 64-bit key for a posting; case and spacing don't matter.
+
+    Stored in jobs.dedup_hash, so it must not change once rows are keyed;
+    migration v12 keys existing rows with its own copy of this function.
+    """
+    key = "\x1f".join(" ".join((v or '').split()).casefold() for v in (company, title, location))
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big', signed=True)
+
+
+def _posted_at(value):
+    if value is None:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return False
+    return parsed.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def career_lookup(conn):
+    """{casefolded career name: id}, loaded once per ingest."""
+    return {row[1].casefold(): row[0] for row in conn.execute("SELECT id, name FROM careers")}
+
+
+def normalize(record, careers):
+    """Return the upsert parameters for one feed record, or None to reject it."""
+    row = {field: _clean(record.get(field)) for field in FIELDS}
+    if not all(row[field] for field in REQUIRED):
+        return None
+    posted_at = _posted_at(row['posted_at'])
+    if posted_at is False:
+        return None
+
+    career_id = record.get('career_id')
+    if career_id in (None, ''):
+        career_id = careers.get((_clean(record.get('career')) or '').casefold())
+    else:
+        try:
+            career_id = int(career_id)
+        except (TypeError, ValueError):
+            return None
+
+    return (row['title'], row['company'], row['location'], row['description'],
+            row['requirements'], posted_at, career_id,
+            dedup_hash(row['company'], row['title'], row['location']))
+
+
+def read_records(stream, fmt):
+    """Yield dicts from a text stream of CSV (with a header row) or NDJSON."""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    elif fmt == 'ndjson':
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield None
+                continue
+            yield record if isinstance(record, dict) else None
+    else:
+        raise InvalidFeed(fmt)
+
+
+def guess_format(name, content_type=None):
+    name = (name or '').lower()
+    if name.endswith('.csv') or (content_type or '').startswith('text/csv'):
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in (content_type or ''):
+        return 'ndjson'
+    return None
+
+
+def _write_batch(conn, batch, stats):
+    # Take the write lock first so the new ids counted below are all ours
+    conn.execute("BEGIN IMMEDIATE")
+    before = conn.execute("SELECT COALESCE(MAX(id), 0) FROM jobs").fetchone()[0]
+    changed = conn.executemany(UPSERT_SQL, list(batch.values())).rowcount
+    inserted = conn.execute("SELECT COUNT(*) FROM jobs WHERE id > ?", (before,)).fetchone()[0]
+    conn.commit()
+    stats['inserted'] += inserted
+    stats['updated'] += changed - inserted
+    stats['unchanged'] += len(batch) - changed
+
+
+def ingest(conn, records, batch_size=DEFAULT_BATCH_SIZE):
+    """Upsert records into jobs; returns counts of what happened to them.
+
+    Within a batch the last record for a posting wins; across batches a
+    later record simply updates the row an earlier one wrote.
+    """
+    careers = career_lookup(conn)
+    stats = {'read': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0,
+             'duplicates': 0, 'rejected': 0}
+    batch = {}
+    for record in records:
+        stats['read'] += 1
+        params = normalize(record, careers) if record is not None else None
+        if params is None:
+            stats['rejected'] += 1
+            continue
+        if params[-1] in batch:
+            stats['duplicates'] += 1
+        batch[params[-1]] = params
+        if len(batch) >= batch_size:
+            _write_batch(conn, batch, stats)
+            batch = {}
+    if batch:
+        _write_batch(conn, batch, stats)
+    return stats
+
+
+def ingest_file(conn, path, fmt=None, batch_size=DEFAULT_BATCH_SIZE):
+    fmt = fmt or guess_format(path)
+    if fmt is None:
+        raise InvalidFeed(path)
+    with open(path, newline='', encoding='utf-8') as f:
+        return ingest(conn, read_records(f, fmt), batch_size)
+
+
+def ingest_stream(conn, binary_stream, fmt, batch_size=DEFAULT_BATCH_SIZE):
+    """Ingest from a binary stream, such as an upload, without buffering it."""
+    text = io.TextIOWrapper(binary_stream, encoding='utf-8', newline='')
+    return ingest(conn, read_records(text, fmt), batch_size)
+
+
+def main():
+    import db
+
+    parser = argparse.ArgumentParser(description="Load a job feed into the jobs table")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=("csv", "ndjson"))
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    conn = db.get_connection()
+    try:
+        stats = ingest_file(conn, args.path, args.format, args.batch_size)
+    finally:
+        conn.close()
+    print(" ".join(f"{key}={value}" for key, value in stats.items()))
+
+
+if __name__ == "__main__":
+    main()
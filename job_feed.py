@@ -0,0 +1,90 @@
+"""Keyset-paginated job listings for /api/jobs.
+
+Pages are ordered newest first by (posted_at, id). Instead of an OFFSET,
+the client sends back an opaque cursor holding the (posted_at, id) of the
+last row it saw, and the next page starts strictly after it. Each page is
+then an index range read of `limit` rows wherever it falls in the feed.
+
+Filters are equality matches on location, career_id and company; each has
+an index ending in (posted_at, id) (migration v9), so a filtered page is
+still read in order straight from the index.
+"""
+import base64
+import binascii
+import itertools
+import json
+
+FIELDS = ['id', 'title', 'company', 'location', 'posted_at', 'career_id', 'career_name']
+FILTERS = ('location', 'career_id', 'company')
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(posted_at, job_id):
+    raw = json.dumps([posted_at, job_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        posted_at, job_id = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if not isinstance(posted_at, str) or not isinstance(job_id, int):
+        raise InvalidCursor(cursor)
+    return posted_at, job_id
+
+
+def page_sql(filters, after):
+    """Build the page query for the given filter columns."""
+    where = [f"j.{column} = ?" for column in filters]
+    if after:
+        where.append("(j.posted_at, j.id) < (?, ?)")
+    return f"""
+        SELECT j.id, j.title, j.company, j.location, j.posted_at, j.career_id,
+               c.name AS career_name
+        FROM jobs j
+        LEFT JOIN careers c ON c.id = j.career_id
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY j.posted_at DESC, j.id DESC
+        LIMIT ?
+    """
+
+
+def all_page_sql():
+    """Every statement page_sql can produce (for plan checks)."""
+    for n in range(len(FILTERS) + 1):
+        for filters in itertools.combinations(FILTERS, n):
+            for after in (False, True):
+                yield page_sql(filters, after)
+
+
+def fetch_page(conn, filters=None, cursor=None, limit=DEFAULT_LIMIT):
+    """Return {'fields', 'rows', 'next_cursor'} for one page.
+
+    `filters` maps a column in FILTERS to the value it must equal; None
+    values are ignored. Rows are lists in FIELDS order.
+    """
+    filters = {k: v for k, v in (filters or {}).items() if k in FILTERS and v is not None}
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    after = decode_cursor(cursor) if cursor else None
+
+    params = list(filters.values())
+    if after:
+        params.extend(after)
+    # One extra row tells us whether there is a next page
+    params.append(limit + 1)
+    rows = [list(row) for row in conn.execute(page_sql(filters, after), params)]
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last[4], last[0])
+    return {'fields': FIELDS, 'rows': rows, 'next_cursor': next_cursor}
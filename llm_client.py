@@ -0,0 +1,350 @@
+"""Client for an OpenAI-compatible chat completions API that fails fast.
+
+Flask workers are threads, so the client runs its own asyncio event loop
+on a background thread with one httpx.AsyncClient on it: every worker
+shares the same keep-alive connection pool instead of opening a TLS
+connection per question. A worker calls stream(), a plain generator that
+hands the request to the loop and reads tokens back off a queue; closing
+the generator cancels the request and drops the upstream connection.
+The queue holds at most stream_buffer tokens: once it is full the
+request stops reading the upstream response until the caller catches
+up, so a slow reader is pushed back to the upstream rather than the
+whole reply piling up in memory.
+
+Around each call:
+
+    admission  at most max_concurrency requests are upstream at once and
+               max_queue more wait for a slot; past that callers get
+               Saturated straight away, as in hashing.HashingExecutor
+    deadline   the whole request, queueing included, must finish within
+               `deadline` seconds, and no read may stall for longer than
+               `idle_timeout`; time spent waiting on a slow reader
+               counts towards the deadline
+    retries    connection errors, timeouts, 429 and 5xx are retried with
+               full-jitter exponential backoff while the deadline allows,
+               but only before the first token: a reply that has started
+               streaming is never restarted
+    breaker    after failure_threshold failed requests in a row the
+               circuit opens and calls fail at once with CircuitOpen; after
+               reset_timeout one probe request is let through, and its
+               outcome closes or reopens the circuit
+
+astream() is the same for a caller on its own event loop (asgi.py).
+
+Saturated, CircuitOpen and running out of time or retries before the
+first token all raise Unavailable, which /chat answers with a canned
+reply. A reply that breaks off after the first token raises Interrupted.
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+
+try:
+    import httpx
+except ImportError:  # only talking to a real model needs it
+    httpx = None
+
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class UpstreamError(Exception):
+    pass
+
+
+class Unavailable(UpstreamError):
+    """The model could not be reached in time; nothing was streamed."""
+
+
+class Saturated(Unavailable):
+    pass
+
+
+class CircuitOpen(Unavailable):
+    pass
+
+
+class DeadlineExceeded(Unavailable):
+    pass
+
+
+class Interrupted(UpstreamError):
+    """The reply stopped partway through."""
+
+
+class _StatusError(Exception):
+    def __init__(self, status, body):
+        super().__init__(f"upstream returned {status}: {body}")
+        self.status = status
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.opened = 0
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opened += 1
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def abandon(self):
+        """A call ended without telling us anything about the upstream."""
+        with self._lock:
+            self._probing = False
+
+
+_DONE = object()
+
+
+class LLMClient:
+    def __init__(self, base_url, api_key=None, max_concurrency=8, max_queue=32, deadline=60.0,
+                 connect_timeout=3.0, idle_timeout=15.0, retries=2, backoff=0.25, breaker=None,
+                 stream_buffer=64):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.max_concurrency = max_concurrency
+        self.deadline = deadline
+        self.connect_timeout = connect_timeout
+        self.idle_timeout = idle_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.stream_buffer = stream_buffer
+        self.breaker = breaker or CircuitBreaker()
+        # Upstream + queued requests; beyond this we shed load
+        self._slots = threading.BoundedSemaphore(max_concurrency + max_queue)
+        self._start_lock = threading.Lock()
+        self._counter_lock = threading.Lock()
+        self._loop = None
+        self._http = None
+        self._upstream = None
+        self.counters = {'requests': 0, 'attempts': 0, 'retries': 0, 'completed': 0,
+                         'failed': 0, 'saturated': 0, 'short_circuited': 0}
+
+    def _count(self, name):
+        with self._counter_lock:
+            self.counters[name] += 1
+
+    # ----- event loop -----
+
+    def _start(self):
+        with self._start_lock:
+            if self._loop is not None:
+                return
+            if httpx is None:
+                raise RuntimeError("the LLM client requires httpx")
+            loop = asyncio.new_event_loop()
+            headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url, headers=headers,
+                timeout=httpx.Timeout(self.idle_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(max_connections=self.max_concurrency,
+                                    max_keepalive_connections=self.max_concurrency))
+            self._upstream = asyncio.Semaphore(self.max_concurrency)
+            threading.Thread(target=loop.run_forever, name="llm-client", daemon=True).start()
+            self._loop = loop
+
+    def close(self):
+        with self._start_lock:
+            if self._loop is None:
+                return
+            asyncio.run_coroutine_threadsafe(self._http.aclose(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+
+    # ----- one request, on the loop -----
+
+    async def _attempt(self, payload, deliver):
+        async with self._http.stream("POST", "/chat/completions", json=payload) as response:
+            if response.status_code != 200:
+                body = (await response.aread())[:200].decode(errors='replace')
+                raise _StatusError(response.status_code, body)
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    # Keep reading to the end so the connection goes back to the pool
+                    continue
+                token = json.loads(data)["choices"][0]["delta"].get("content")
+                if token:
+                    await deliver(token)
+
+    async def _with_retries(self, payload, deliver, deadline_at):
+        streamed = False
+
+        async def first_aware(token):
+            nonlocal streamed
+            streamed = True
+            await deliver(token)
+
+        attempt = 0
+        while True:
+            self._count('attempts')
+            try:
+                await asyncio.wait_for(self._attempt(payload, first_aware),
+                                       deadline_at - time.monotonic())
+                return
+            except asyncio.TimeoutError:
+                error, retryable = DeadlineExceeded("no reply within the deadline"), False
+            except httpx.TransportError as e:
+                error, retryable = e, True
+            except _StatusError as e:
+                error, retryable = e, e.status in RETRY_STATUS
+            except (ValueError, LookupError) as e:
+                error, retryable = UpstreamError(f"malformed reply: {e!r}"), False
+            if streamed:
+                raise Interrupted(str(error)) from error
+            if isinstance(error, Unavailable):
+                raise error
+            if not retryable:
+                raise UpstreamError(str(error)) from error
+            # Full jitter: spread the retries of many callers over the window
+            delay = random.uniform(0, self.backoff * 2 ** attempt)
+            if attempt >= self.retries or time.monotonic() + delay >= deadline_at:
+                raise Unavailable(str(error)) from error
+            attempt += 1
+            self._count('retries')
+            await asyncio.sleep(delay)
+
+    async def _call(self, payload, deliver):
+        deadline_at = time.monotonic() + self.deadline
+        if not self.breaker.allow():
+            self._count('short_circuited')
+            raise CircuitOpen("upstream circuit is open")
+        try:
+            await asyncio.wait_for(self._upstream.acquire(), self.deadline)
+        except BaseException as e:
+            # Waiting our turn says nothing about the upstream
+            self.breaker.abandon()
+            if isinstance(e, asyncio.TimeoutError):
+                raise DeadlineExceeded("queued past the deadline") from None
+            raise
+        try:
+            await self._with_retries(payload, deliver, deadline_at)
+        except (Unavailable, Interrupted):
+            self.breaker.record_failure()
+            raise
+        except UpstreamError:
+            # It answered, just not with a reply (a 4xx)
+            self.breaker.record_success()
+            raise
+        except BaseException:
+            self.breaker.abandon()
+            raise
+        else:
+            self.breaker.record_success()
+        finally:
+            self._upstream.release()
+
+    # ----- worker-facing -----
+
+    def _submit(self, messages, model):
+        """Start a request on the loop.
+
+        Returns (future, next_item): next_item() is a coroutine, run on the
+        client's loop, that returns each token, then _DONE or an exception.
+        """
+        if not self._slots.acquire(blocking=False):
+            self._count('saturated')
+            raise Saturated("too many chat requests in flight")
+        try:
+            self._start()
+        except Exception:
+            self._slots.release()
+            raise
+        self._count('requests')
+
+        # Bounded, so a full buffer holds up the upstream read in put()
+        tokens = asyncio.Queue(self.stream_buffer)
+
+        async def run():
+            try:
+                await self._call({"model": model, "messages": messages, "stream": True},
+                                 tokens.put)
+            except Exception as e:
+                await tokens.put(e)
+            else:
+                await tokens.put(_DONE)
+
+        future = asyncio.run_coroutine_threadsafe(run(), self._loop)
+        future.add_done_callback(lambda _: self._slots.release())
+        return future, tokens.get
+
+    def _settle(self, item):
+        """True once the reply is complete; raises the request's error."""
+        if item is _DONE:
+            self._count('completed')
+            return True
+        if isinstance(item, Exception):
+            self._count('failed')
+            raise item
+        return False
+
+    def stream(self, messages, model):
+        """Yield reply tokens; closing the generator cancels the request."""
+        future, next_item = self._submit(messages, model)
+        try:
+            while True:
+                item = asyncio.run_coroutine_threadsafe(next_item(), self._loop).result()
+                if self._settle(item):
+                    return
+                yield item
+        finally:
+            future.cancel()
+
+    async def astream(self, messages, model):
+        """stream() for a caller on another event loop (the ASGI app's).
+
+        Each token is awaited across loops with wrap_future, so a caller
+        waiting for the next one holds no thread.
+        """
+        future, next_item = self._submit(messages, model)
+        try:
+            while True:
+                item = await asyncio.wrap_future(
+                    asyncio.run_coroutine_threadsafe(next_item(), self._loop))
+                if self._settle(item):
+                    return
+                yield item
+        finally:
+            future.cancel()
+
+    def stats(self):
+        with self._counter_lock:
+            return dict(self.counters, circuit=self.breaker.state,
+                        circuit_opened=self.breaker.opened)
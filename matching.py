@@ -0,0 +1,258 @@
+"""Resume-to-job matching over an in-memory TF-IDF index.
+
+Every job's requirements and description are tokenized into a sparse term
+vector, stored column by column: for each term, the index rows of the
+jobs that contain it and the job's (length-normalized, sublinear) term
+weight. That is a CSC sparse matrix whose columns can grow, so inserting a
+job appends to the postings of its terms and never touches existing rows.
+
+A query (resume text or a skill list) only has a few dozen terms. Scoring
+gathers their columns, scales each by the query weight times idf and sums
+them per row with one np.bincount, which is the matrix-vector product
+restricted to the non-zero query terms; np.argpartition then picks the top
+k without sorting every job. idf is applied at query time rather than
+stored, so document frequencies can change without rewriting postings.
+
+The index follows the jobs table the way sampling.py follows question
+pools: it remembers the 'jobs' stamp from cache_versions (migration v8)
+and, when that moves, reads jobs with an id above the highest it has seen
+plus any ids logged in job_match_changes by the update/delete triggers of
+migration v11. Removed or edited jobs leave dead rows behind (their old
+postings still count towards df) until enough pile up to rebuild.
+"""
+import math
+import re
+import threading
+from array import array
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:  # only scoring needs it
+    np = None
+
+from job_feed import FIELDS
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+# Rebuild once this share of rows belongs to removed or replaced jobs
+COMPACT_RATIO = 0.25
+
+# Query terms found in more than this share of jobs barely move the ranking
+# (idf is close to 1) but their postings dominate scoring time, so they are
+# dropped unless nothing else in the query is indexed
+MAX_DF = 0.5
+
+# Requirements are the skill list; count them twice against the prose
+REQUIREMENTS_WEIGHT = 2
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is', 'it', 'of',
+    'on', 'or', 'our', 'that', 'the', 'this', 'to', 'we', 'will', 'with', 'you', 'your',
+}
+
+_TOKEN = re.compile(r"[a-z0-9][a-z0-9+#]*")
+
+
+def tokenize(text):
+    """Lower-cased word tokens; keeps 'c++' and 'c#' whole."""
+    return [t for t in _TOKEN.findall((text or '').lower()) if t not in STOPWORDS]
+
+
+def term_weights(counts):
+    """Sublinear tf, L2-normalized: {term: weight}."""
+    weights = {term: 1 + math.log(n) for term, n in counts.items()}
+    norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+    return {term: w / norm for term, w in weights.items()}
+
+
+def job_terms(description, requirements):
+    counts = Counter(tokenize(description))
+    for term in tokenize(requirements):
+        counts[term] += REQUIREMENTS_WEIGHT
+    return counts
+
+
+class JobMatchIndex:
+    def __init__(self, compact_ratio=COMPACT_RATIO, max_df=MAX_DF):
+        self.compact_ratio = compact_ratio
+        self.max_df = max_df
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._vocab = {}        # term -> column
+        self._rows = []         # column -> array('i') of job rows
+        self._values = []       # column -> array('f') of weights
+        self._job_ids = array('q')
+        self._alive = bytearray()
+        self._row_of = {}       # job id -> live row
+        self._dead = 0
+        self._max_id = 0
+        self._change_seq = 0
+        self._version = None
+        self.built = False
+
+    def __len__(self):
+        return len(self._row_of)
+
+    # ----- keeping up with the jobs table -----
+
+    def _stamp(self, conn):
+        row = conn.execute(
+            "SELECT version FROM cache_versions WHERE namespace = 'jobs'"
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _add(self, job_id, description, requirements):
+        self._remove(job_id)
+        row = len(self._job_ids)
+        self._job_ids.append(job_id)
+        self._alive.append(1)
+        self._row_of[job_id] = row
+        for term, weight in term_weights(job_terms(description, requirements)).items():
+            col = self._vocab.get(term)
+            if col is None:
+                col = self._vocab[term] = len(self._rows)
+                self._rows.append(array('i'))
+                self._values.append(array('f'))
+            self._rows[col].append(row)
+            self._values[col].append(weight)
+        if job_id > self._max_id:
+            self._max_id = job_id
+
+    def _remove(self, job_id):
+        row = self._row_of.pop(job_id, None)
+        if row is not None:
+            self._alive[row] = 0
+            self._dead += 1
+
+    def _load_new(self, conn):
+        for job_id, description, requirements in conn.execute(
+            """SELECT id, description, requirements FROM jobs
+               WHERE id > ? ORDER BY id""",
+            (self._max_id,)
+        ):
+            self._add(job_id, description, requirements)
+
+    def _load_changes(self, conn):
+        changed = []
+        for seq, job_id in conn.execute(
+            "SELECT seq, job_id FROM job_match_changes WHERE seq > ? ORDER BY seq",
+            (self._change_seq,)
+        ):
+            changed.append(job_id)
+            self._change_seq = seq
+        # Ids above _max_id are new to us and come in through _load_new
+        ids = [job_id for job_id in dict.fromkeys(changed) if job_id <= self._max_id]
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            for job_id in chunk:
+                self._remove(job_id)
+            placeholders = ", ".join("?" * len(chunk))
+            for job_id, description, requirements in conn.execute(
+                f"SELECT id, description, requirements FROM jobs WHERE id IN ({placeholders})",
+                chunk
+            ):
+                self._add(job_id, description, requirements)
+
+    def _build(self, conn):
+        self._reset()
+        row = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM job_match_changes").fetchone()
+        self._change_seq = row[0]
+        self._version = self._stamp(conn)
+        self._load_new(conn)
+        self.built = True
+
+    def refresh(self, conn):
+        """Bring the index up to date with the jobs table."""
+        with self._lock:
+            if not self.built:
+                self._build(conn)
+                return
+            version = self._stamp(conn)
+            if version == self._version:
+                return
+            self._version = version
+            self._load_changes(conn)
+            self._load_new(conn)
+            if self._dead > self.compact_ratio * len(self._job_ids):
+                self._build(conn)
+
+    # ----- scoring -----
+
+    def query_vector(self, text):
+        """Return ([columns], [weights]) for the query terms the index knows."""
+        weights = term_weights(Counter(tokenize(text)))
+        n = len(self._job_ids) + 1
+        known = [(self._vocab[term], weight) for term, weight in weights.items()
+                 if term in self._vocab]
+        selective = [(col, weight) for col, weight in known
+                     if len(self._rows[col]) <= self.max_df * n]
+        cols, values = [], []
+        for col, weight in selective or known:
+            # Smoothed idf, once for the query side and once for the job side
+            idf = math.log(n / (len(self._rows[col]) + 1)) + 1
+            cols.append(col)
+            values.append(weight * idf * idf)
+        return cols, values
+
+    def top(self, text, k=DEFAULT_LIMIT):
+        """Return [(job_id, score)] for the k best-matching live jobs, best first."""
+        if np is None:
+            raise RuntimeError("job matching requires numpy")
+        with self._lock:
+            cols, weights = self.query_vector(text)
+            if not cols:
+                return []
+            # Copy out under the lock: arrays can't grow while numpy views them
+            lengths = [len(self._rows[c]) for c in cols]
+            rows = np.concatenate([np.frombuffer(self._rows[c], dtype=np.int32) for c in cols])
+            values = np.concatenate([np.frombuffer(self._values[c], dtype=np.float32)
+                                     for c in cols])
+            alive = np.frombuffer(self._alive, dtype=np.uint8).astype(bool)
+            job_ids = np.frombuffer(self._job_ids, dtype=np.int64).copy()
+
+        scores = np.bincount(rows, weights=values * np.repeat(weights, lengths),
+                             minlength=len(job_ids))
+        scores[~alive] = 0
+        hits = np.flatnonzero(scores)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.lexsort((-hits, -scores[hits]))]
+        return [(int(job_ids[r]), round(float(scores[r]), 4)) for r in hits]
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+
+def match_jobs(conn, text, limit=DEFAULT_LIMIT, match_index=None):
+    """Return {'fields', 'rows'} for the jobs that best match a resume.
+
+    Rows are job_feed.FIELDS followed by 'score', best match first.
+    """
+    if match_index is None:
+        match_index = index
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    match_index.refresh(conn)
+    ranked = match_index.top(text, limit)
+    fields = FIELDS + ['score']
+    if not ranked:
+        return {'fields': fields, 'rows': []}
+
+    placeholders = ", ".join("?" * len(ranked))
+    rows = {row[0]: list(row) for row in conn.execute(
+        f"""SELECT j.id, j.title, j.company, j.location, j.posted_at, j.career_id,
+                   c.name AS career_name
+            FROM jobs j
+            LEFT JOIN careers c ON c.id = j.career_id
+            WHERE j.id IN ({placeholders})""",
+        [job_id for job_id, _ in ranked]
+    )}
+    return {'fields': fields,
+            'rows': [rows[job_id] + [score] for job_id, score in ranked if job_id in rows]}
+
+
+index = JobMatchIndex()
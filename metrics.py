@@ -0,0 +1,397 @@
+"""Request metrics in the Prometheus text format, plus an opt-in profiler.
+
+init_app() instruments a Flask app:
+
+    http_request_duration_seconds    latency per endpoint, method and status
+    db_statement_duration_seconds    every statement run through the pooled
+                                     connections (db.observer), by endpoint
+                                     and verb; '-' is work outside a request,
+                                     such as the task workers
+    db_statements_per_request        statements and SQL time per request, so
+    db_seconds_per_request           an endpoint's time can be split between
+    template_render_duration_seconds SQL, templates and the session store
+    session_duration_seconds
+    session_cookie_bytes             cookie sent by the browser (in) and set
+                                     on the response (out)
+
+and serves them on /metrics, behind a bearer token when METRICS_TOKEN is
+set. Other operational endpoints use the same check, authorized().
+
+Request time is measured up to the response headers, so a streamed
+body such as /chat's is not included. A statement's time is its execute()
+call: for a SELECT, rows fetched afterwards are not counted.
+
+With PROFILE_SLOW_MS set, a background thread samples the stacks of
+threads that are serving a request every PROFILE_INTERVAL_MS, and each
+request slower than the threshold leaves a file of folded stacks in
+PROFILE_DIR that flamegraph.pl or speedscope can read directly.
+"""
+import bisect
+import hmac
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+
+from flask import Response, current_app, request
+from flask.sessions import SessionInterface
+from flask.signals import before_render_template, template_rendered
+
+import db
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+BYTES_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}   # label values -> [per-bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            i = bisect.bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, series in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, series):
+                cumulative += n
+                le = _labels(self.labels, values, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _labels(self.labels, values, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, values)} {series[-2]}")
+            lines.append(f"{self.name}_count{_labels(self.labels, values)} {series[-1]}")
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(self.labels, values)} {n}" for values, n in items]
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Collected:
+    """Values read from elsewhere at scrape time: fn() -> {label values: number}."""
+
+    def __init__(self, name, help, kind, labels, fn):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labels = labels
+        self.fn = fn
+        _registry.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{self.name}{_labels(self.labels, values)} {n}"
+                  for values, n in sorted(self.fn().items())]
+        return lines
+
+    def clear(self):
+        pass
+
+
+def render():
+    return "\n".join(line for metric in _registry for line in metric.render()) + "\n"
+
+
+def clear():
+    for metric in _registry:
+        metric.clear()
+
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds",
+                            "Time from loading the session to the response headers.",
+                            ("endpoint", "method", "status"), LATENCY_BUCKETS)
+SQL_SECONDS = Histogram("db_statement_duration_seconds", "Time in each SQL statement's execute().",
+                        ("endpoint", "verb"), SQL_BUCKETS)
+SQL_PER_REQUEST = Histogram("db_statements_per_request", "SQL statements run by one request.",
+                            ("endpoint",), COUNT_BUCKETS)
+SQL_SECONDS_PER_REQUEST = Histogram("db_seconds_per_request", "SQL time spent by one request.",
+                                    ("endpoint",), LATENCY_BUCKETS)
+TEMPLATE_SECONDS = Histogram("template_render_duration_seconds", "Time to render a template.",
+                             ("endpoint", "template"), LATENCY_BUCKETS)
+SESSION_SECONDS = Histogram("session_duration_seconds", "Time to load or save the session.",
+                            ("endpoint", "phase"), SQL_BUCKETS)
+SESSION_COOKIE_BYTES = Histogram("session_cookie_bytes", "Size of the session cookie.",
+                                 ("endpoint", "direction"), BYTES_BUCKETS)
+SLOW_PROFILES = Counter("slow_request_profiles_total", "Stack dumps written for slow requests.",
+                        ("endpoint",))
+
+# True while instrumentation records anything; the bench toggles it
+enabled = True
+
+_request = threading.local()
+_VERB = re.compile(r"\s*(\w+)")
+
+
+def _endpoint():
+    return getattr(_request, "endpoint", None) or "-"
+
+
+def _observe_sql(sql, seconds):
+    if not enabled:
+        return
+    match = _VERB.match(sql)
+    SQL_SECONDS.observe(seconds, _endpoint(), match.group(1).upper() if match else "OTHER")
+    # The session store's own SQL is part of session time
+    if getattr(_request, "endpoint", None) is not None and not _request.in_session:
+        _request.sql_count += 1
+        _request.sql_seconds += seconds
+
+
+# ----- sampling profiler -----
+
+class SamplingProfiler:
+    """Samples the stacks of in-flight requests; writes folded stacks for slow ones."""
+
+    def __init__(self, slow_seconds, out_dir, interval=0.005, max_dumps=200):
+        self.slow_seconds = slow_seconds
+        self.out_dir = out_dir
+        self.interval = interval
+        self.max_dumps = max_dumps
+        self.dumps = 0
+        self._active = {}   # thread ident -> stack counts of its current request
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            os.makedirs(self.out_dir, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+
+    def begin(self):
+        with self._lock:
+            self._active[threading.get_ident()] = StackCounter()
+
+    def end(self, seconds, label):
+        with self._lock:
+            stacks = self._active.pop(threading.get_ident(), None)
+        if not stacks or seconds < self.slow_seconds or self.dumps >= self.max_dumps:
+            return None
+        self.dumps += 1
+        name = re.sub(r"[^\w.-]+", "_", label).strip("_") or "root"
+        path = os.path.join(self.out_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{self.dumps}-"
+                                          f"{name}-{int(seconds * 1000)}ms.folded")
+        with open(path, "w") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        SLOW_PROFILES.inc(label)
+        return path
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                idents = list(self._active)
+            if not idents:
+                continue
+            frames = sys._current_frames()
+            for ident in idents:
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:"
+                                 f"{code.co_firstlineno})")
+                    frame = frame.f_back
+                if not stack:
+                    continue
+                folded = ";".join(reversed(stack))
+                with self._lock:
+                    counts = self._active.get(ident)
+                    if counts is not None:
+                        counts[folded] += 1
+
+
+profiler = None
+
+
+# ----- Flask hooks -----
+
+class TimedSessionInterface(SessionInterface):
+    """Wraps the app's session interface to time it and measure the cookie."""
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    def open_session(self, app, req):
+        start = time.perf_counter()
+        try:
+            return self.inner.open_session(app, req)
+        finally:
+            # The URL isn't matched yet; recorded by _before_request, and the
+            # request's time starts here so it includes loading the session
+            _request.session_started = start
+            _request.session_open = time.perf_counter() - start
+
+    def make_null_session(self, app):
+        return self.inner.make_null_session(app)
+
+    def is_null_session(self, obj):
+        return self.inner.is_null_session(obj)
+
+    def save_session(self, app, sess, response):
+        start = time.perf_counter()
+        _request.in_session = True
+        try:
+            return self.inner.save_session(app, sess, response)
+        finally:
+            _request.in_session = False
+            if enabled:
+                SESSION_SECONDS.observe(time.perf_counter() - start, _endpoint(), "save")
+                prefix = app.config["SESSION_COOKIE_NAME"] + "="
+                for header in response.headers.getlist("Set-Cookie"):
+                    if header.startswith(prefix):
+                        SESSION_COOKIE_BYTES.observe(len(header), _endpoint(), "out")
+
+
+def _before_request():
+    _request.start = getattr(_request, "session_started", None) or time.perf_counter()
+    _request.session_started = None
+    _request.endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    _request.status = None
+    _request.sql_count = 0
+    _request.sql_seconds = 0.0
+    _request.in_session = False
+    _request.templates = []
+    if profiler is not None:
+        profiler.begin()
+    if enabled:
+        # The session is opened before the URL is matched, so it is recorded here
+        opened = getattr(_request, "session_open", None)
+        if opened is not None:
+            SESSION_SECONDS.observe(opened, _request.endpoint, "open")
+        cookie = request.cookies.get(current_app.config["SESSION_COOKIE_NAME"])
+        if cookie is not None:
+            SESSION_COOKIE_BYTES.observe(len(cookie), _request.endpoint, "in")
+    _request.session_open = None
+
+
+def _after_request(response):
+    _request.status = response.status_code
+    return response
+
+
+def _teardown_request(exc):
+    start = getattr(_request, "start", None)
+    if start is None:
+        return
+    seconds = time.perf_counter() - start
+    endpoint = _request.endpoint
+    status = _request.status if exc is None and _request.status is not None else 500
+    _request.start = None
+    _request.endpoint = None
+    if profiler is not None:
+        profiler.end(seconds, endpoint)
+    if not enabled:
+        return
+    REQUEST_SECONDS.observe(seconds, endpoint, request.method, str(status))
+    SQL_PER_REQUEST.observe(_request.sql_count, endpoint)
+    SQL_SECONDS_PER_REQUEST.observe(_request.sql_seconds, endpoint)
+
+
+def _template_started(sender, template, context, **extra):
+    if getattr(_request, "start", None) is not None:
+        _request.templates.append(time.perf_counter())
+
+
+def _template_rendered(sender, template, context, **extra):
+    stack = getattr(_request, "templates", None)
+    if stack and enabled:
+        TEMPLATE_SECONDS.observe(time.perf_counter() - stack.pop(), _endpoint(), template.name or "-")
+
+
+def authorized():
+    """False when METRICS_TOKEN is set and the request doesn't carry it."""
+    token = os.getenv("METRICS_TOKEN")
+    if not token:
+        return True
+    # Constant time, as for INGEST_TOKEN; bytes so any header value compares
+    return hmac.compare_digest(request.headers.get("Authorization", "").encode(),
+                               f"Bearer {token}".encode())
+
+
+def metrics_view():
+    if not authorized():
+        return Response("Unauthorized\n", status=401, mimetype="text/plain")
+    return Response(render(), mimetype="text/plain; version=0.0.4")
+
+
+def init_app(app):
+    global profiler
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_rendered, app)
+    app.session_interface = TimedSessionInterface(app.session_interface)
+    db.observer = _observe_sql
+    app.add_url_rule("/metrics", "metrics", metrics_view)
+
+    slow_ms = os.getenv("PROFILE_SLOW_MS")
+    if slow_ms:
+        profiler = SamplingProfiler(float(slow_ms) / 1000, os.getenv("PROFILE_DIR", "profiles"),
+                                    interval=float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000)
+        profiler.start()
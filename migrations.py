@@ -0,0 +1,819 @@
+"""Versioned schema migrations for users.db.
+
+The applied version is stored in PRAGMA user_version. Each step runs at
+most once, inside a BEGIN IMMEDIATE transaction so concurrent workers
+serialise on the SQLite write lock and re-check the version before doing
+anything. To change the schema, append a new function to MIGRATIONS;
+never edit a step that has already shipped.
+"""
+import hashlib
+import json
+import threading
+
+_lock = threading.Lock()
+
+
+def _create_base_schema(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS careers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            description TEXT
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_activity TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_progress (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            last_activity TEXT,
+            progress_data TEXT,
+            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            company TEXT NOT NULL,
+            location TEXT NOT NULL,
+            description TEXT,
+            requirements TEXT,
+            posted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            career_id INTEGER,
+            FOREIGN KEY(career_id) REFERENCES careers(id)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS interview_questions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            career_id INTEGER NOT NULL,
+            question TEXT NOT NULL,
+            question_type TEXT NOT NULL,
+            difficulty_level TEXT NOT NULL,
+            ideal_answer TEXT,
+            FOREIGN KEY(career_id) REFERENCES careers(id)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS interviews (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            career_id INTEGER NOT NULL,
+            difficulty TEXT NOT NULL,
+            start_time DATETIME NOT NULL,
+            end_time DATETIME,
+            overall_score REAL,
+            FOREIGN KEY(user_id) REFERENCES users(id),
+            FOREIGN KEY(career_id) REFERENCES careers(id)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS interview_questions_mapping (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            interview_id INTEGER NOT NULL,
+            question_id INTEGER NOT NULL,
+            FOREIGN KEY(interview_id) REFERENCES interviews(id),
+            FOREIGN KEY(question_id) REFERENCES interview_questions(id)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS interview_answers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            interview_id INTEGER NOT NULL,
+            question_id INTEGER NOT NULL,
+            answer_text TEXT,
+            is_audio BOOLEAN DEFAULT 0,
+            audio_path TEXT,
+            timestamp DATETIME NOT NULL,
+            score REAL,
+            feedback TEXT,
+            FOREIGN KEY(interview_id) REFERENCES interviews(id),
+            FOREIGN KEY(question_id) REFERENCES interview_questions(id)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS test_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            subject TEXT NOT NULL,
+            topic TEXT,
+            start_time DATETIME NOT NULL,
+            end_time DATETIME,
+            status TEXT NOT NULL,
+            score INTEGER,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS test_questions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            test_session_id INTEGER NOT NULL,
+            question_id INTEGER NOT NULL,
+            question_order INTEGER NOT NULL,
+            FOREIGN KEY(test_session_id) REFERENCES test_sessions(id),
+            FOREIGN KEY(question_id) REFERENCES interview_questions(id)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS test_answers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            test_session_id INTEGER NOT NULL,
+            question_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            answer TEXT NOT NULL,
+            is_correct BOOLEAN NOT NULL,
+            answered_at DATETIME NOT NULL,
+            FOREIGN KEY(test_session_id) REFERENCES test_sessions(id),
+            FOREIGN KEY(question_id) REFERENCES interview_questions(id),
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    ''')
+
+
+def _seed_reference_data(cursor):
+    # Only seed an empty database; existing installs keep their data
+    if cursor.execute("SELECT 1 FROM careers LIMIT 1").fetchone():
+        return
+
+    cursor.execute('''
+        INSERT INTO careers (name, description) VALUES
+        ('Software Engineering', 'Development of software applications and systems'),
+        ('Data Science', 'Extracting insights from complex data'),
+        ('Product Management', 'Overseeing product development and strategy'),
+        ('UX/UI Design', 'Designing user interfaces and experiences'),
+        ('Digital Marketing', 'Marketing products and services digitally')
+    ''')
+
+    cursor.execute('''
+        INSERT INTO jobs (title, company, location, description, requirements, career_id)
+        VALUES
+        ('Software Engineer', 'Tech Corp', 'Remote', 'Develop amazing software', 'Python, Flask, SQL', 1),
+        ('Data Scientist', 'Data Insights', 'New York', 'Analyze complex datasets', 'Python, ML, Statistics', 2),
+        ('UX Designer', 'Creative Solutions', 'San Francisco', 'Design user interfaces', 'Figma, UI/UX principles', 4)
+    ''')
+
+    cursor.execute('''
+        INSERT INTO interview_questions
+        (career_id, question, question_type, difficulty_level, ideal_answer) VALUES
+        (1, 'Please introduce yourself.', 'behavioral', 'beginner', 'A concise professional introduction including education and relevant experience.'),
+        (1, 'Explain the concept of object-oriented programming.', 'technical', 'beginner', 'Explanation should include encapsulation, inheritance, and polymorphism with examples.'),
+        (1, 'How would you approach debugging a complex issue?', 'problem-solving', 'intermediate', 'Should mention systematic approach: reproduce, isolate, identify, fix, test.'),
+        (1, 'Describe your experience with version control systems.', 'technical', 'beginner', 'Mention specific systems like Git and workflows like feature branching.'),
+        (1, 'What design patterns have you used in your projects?', 'technical', 'intermediate', 'Should mention common patterns like Singleton, Observer, Factory with context.'),
+        (1, 'How do you optimize application performance?', 'technical', 'advanced', 'Should mention profiling, database optimization, caching strategies, etc.'),
+        (1, 'Tell me about a challenging project you worked on.', 'behavioral', 'intermediate', 'Should demonstrate problem-solving and teamwork skills.')
+    ''')
+
+
+def _v1_base_schema(cursor):
+    _create_base_schema(cursor)
+    _seed_reference_data(cursor)
+
+
+def _v2_hot_query_indexes(cursor):
+    # start_interview / test_start filter by career and difficulty
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_interview_questions_career_difficulty
+        ON interview_questions (career_id, difficulty_level)
+    ''')
+    # test_start resolves the subject by career name
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_careers_name ON careers (name, id)")
+    # test_complete counts correct answers, test_results lists them
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_test_answers_session_correct
+        ON test_answers (test_session_id, is_correct)
+    ''')
+    # test_questions page, in question_order
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_test_questions_session_order
+        ON test_questions (test_session_id, question_order, question_id)
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_test_sessions_user ON test_sessions (user_id, id)")
+    # job_listings, newest first
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_posted_at ON jobs (posted_at, id)")
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_interview_questions_mapping_interview
+        ON interview_questions_mapping (interview_id, question_id)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_interview_answers_interview
+        ON interview_answers (interview_id)
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_interviews_user ON interviews (user_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_progress_user ON user_progress (user_id)")
+
+
+def _v3_interview_answers_answered(cursor):
+    # finish_interview has always written this column, but it was never created
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(interview_answers)")]
+    if 'answered' not in columns:
+        cursor.execute("ALTER TABLE interview_answers ADD COLUMN answered BOOLEAN DEFAULT 0")
+
+
+def _v4_question_pool_versions(cursor):
+    # Bumped whenever a (career, difficulty) pool changes; see sampling.py
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS question_pool_versions (
+            career_id INTEGER NOT NULL,
+            difficulty_level TEXT NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (career_id, difficulty_level)
+        ) WITHOUT ROWID
+    ''')
+    bump = '''
+        INSERT INTO question_pool_versions (career_id, difficulty_level, version)
+        VALUES ({row}.career_id, {row}.difficulty_level, 1)
+        ON CONFLICT (career_id, difficulty_level) DO UPDATE SET version = version + 1;
+    '''
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_interview_questions_pool_insert
+        AFTER INSERT ON interview_questions
+        BEGIN {bump.format(row='NEW')} END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_interview_questions_pool_delete
+        AFTER DELETE ON interview_questions
+        BEGIN {bump.format(row='OLD')} END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_interview_questions_pool_update
+        AFTER UPDATE OF career_id, difficulty_level ON interview_questions
+        BEGIN {bump.format(row='OLD')} {bump.format(row='NEW')} END
+    ''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO question_pool_versions (career_id, difficulty_level, version)
+        SELECT DISTINCT career_id, difficulty_level, 1 FROM interview_questions
+    ''')
+
+
+def _v5_sessions(cursor):
+    # Server-side session store, see session_store.py
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)")
+
+
+def _v6_task_queue(cursor):
+    # Background jobs, see tasks.py
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS task_queue (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL,
+            result TEXT,
+            error TEXT,
+            run_after REAL NOT NULL,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_task_queue_status_run_after ON task_queue (status, run_after)")
+
+
+def _v7_question_edit_versions(cursor):
+    # Edited questions invalidate compiled rubrics (rubric.py) the same way
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_interview_questions_content_update
+        AFTER UPDATE OF question, question_type, ideal_answer ON interview_questions
+        BEGIN
+            INSERT INTO question_pool_versions (career_id, difficulty_level, version)
+            VALUES (NEW.career_id, NEW.difficulty_level, 1)
+            ON CONFLICT (career_id, difficulty_level) DO UPDATE SET version = version + 1;
+        END
+    ''')
+
+
+def _v8_cache_versions(cursor):
+    # Version stamps for the reference-data cache, see cache.py
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            namespace TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    for table, namespace in (('careers', 'careers'), ('jobs', 'jobs'),
+                             ('interview_questions', 'questions')):
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_cache_{event.lower()}
+                AFTER {event} ON {table}
+                BEGIN
+                    INSERT INTO cache_versions (namespace, version) VALUES ('{namespace}', 1)
+                    ON CONFLICT (namespace) DO UPDATE SET version = version + 1;
+                END
+            ''')
+
+
+def _v9_job_filter_indexes(cursor):
+    # /api/jobs pages newest first by (posted_at, id), optionally filtered on
+    # one column; each filter gets an index that ends in the sort key
+    for column in ('location', 'career_id', 'company'):
+        cursor.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_jobs_{column}_posted_at
+            ON jobs ({column}, posted_at, id)
+        ''')
+
+
+def _v10_full_text_search(cursor):
+    # External-content FTS5 indexes: the text lives once, in the base table,
+    # and triggers keep the index in step with every insert, update and delete
+    for table, fts, columns, weights in (
+        ('jobs', 'jobs_fts', ('title', 'company', 'description', 'requirements'),
+         '10.0, 5.0, 1.0, 2.0'),
+        ('interview_questions', 'interview_questions_fts', ('question', 'ideal_answer'),
+         '4.0, 1.0'),
+    ):
+        cols = ", ".join(columns)
+        new_cols = ", ".join(f"new.{c}" for c in columns)
+        old_cols = ", ".join(f"old.{c}" for c in columns)
+        cursor.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                {cols},
+                content='{table}', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{fts}_insert AFTER INSERT ON {table}
+            BEGIN
+                INSERT INTO {fts} (rowid, {cols}) VALUES (new.id, {new_cols});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{fts}_delete AFTER DELETE ON {table}
+            BEGIN
+                INSERT INTO {fts} ({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{fts}_update AFTER UPDATE OF {cols} ON {table}
+            BEGIN
+                INSERT INTO {fts} ({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+                INSERT INTO {fts} (rowid, {cols}) VALUES (new.id, {new_cols});
+            END
+        ''')
+        # Index whatever is already there, and weight title-like columns up in bm25()
+        cursor.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+        cursor.execute(f"INSERT INTO {fts} ({fts}, rank) VALUES ('rank', 'bm25({weights})')")
+
+
+def _v11_job_match_changes(cursor):
+    # Edited and deleted jobs, for the in-memory match index in matching.py;
+    # new jobs need no entry, the index picks up ids above the last it saw
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS job_match_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_jobs_match_update
+        AFTER UPDATE OF description, requirements ON jobs
+        BEGIN
+            INSERT INTO job_match_changes (job_id) VALUES (old.id);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_jobs_match_delete AFTER DELETE ON jobs
+        BEGIN
+            INSERT INTO job_match_changes (job_id) VALUES (old.id);
+        END
+    ''')
+
+
+def _v12_dedup_hash(company, title, location):
+    # A frozen copy of ingest.dedup_hash as it was when v12 shipped, so this
+    # step keys rows the same way whatever later happens to ingest.py
+    key = "\x1f".join(" ".join((v or '').split()).casefold() for v in (company, title, location))
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big', signed=True)
+
+
+def _v12_job_dedup_hash(cursor):
+    # Feed postings are deduplicated on (company, title, location), see ingest.py
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(jobs)")]
+    if 'dedup_hash' not in columns:
+        cursor.execute("ALTER TABLE jobs ADD COLUMN dedup_hash INTEGER")
+    # Existing duplicates keep a NULL hash; only the oldest copy is keyed
+    cursor.connection.create_function("job_dedup_hash", 3, _v12_dedup_hash, deterministic=True)
+    cursor.execute('''
+        UPDATE jobs SET dedup_hash = job_dedup_hash(company, title, location)
+        WHERE id IN (
+            SELECT MIN(id) FROM jobs GROUP BY job_dedup_hash(company, title, location)
+        )
+    ''')
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_dedup_hash ON jobs (dedup_hash)")
+
+
+def _v13_applications(cursor):
+    # Job applications, see applications.py
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS applications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            job_id INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'submitted',
+            cover_letter TEXT,
+            allow_contact BOOLEAN NOT NULL DEFAULT 0,
+            applied_at DATETIME NOT NULL,
+            FOREIGN KEY(user_id) REFERENCES users(id),
+            FOREIGN KEY(job_id) REFERENCES jobs(id)
+        )
+    ''')
+    # One application per user and job; also serves the per-user listing
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_applications_user_job
+        ON applications (user_id, job_id)
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS job_application_counts (
+            job_id INTEGER PRIMARY KEY,
+            applicants INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_applications_count_insert
+        AFTER INSERT ON applications
+        BEGIN
+            INSERT INTO job_application_counts (job_id, applicants) VALUES (NEW.job_id, 1)
+            ON CONFLICT (job_id) DO UPDATE SET applicants = applicants + 1;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_applications_count_delete
+        AFTER DELETE ON applications
+        BEGIN
+            UPDATE job_application_counts SET applicants = applicants - 1
+            WHERE job_id = OLD.job_id;
+        END
+    ''')
+
+
+def _v14_chat_response_cache(cursor):
+    # Persisted chatbot replies, see chat_cache.py
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS chat_response_cache (
+            key TEXT PRIMARY KEY,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_chat_response_cache_created
+        ON chat_response_cache (created_at)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_chat_response_cache_expires
+        ON chat_response_cache (expires_at)
+    ''')
+
+
+def _v15_conversations(cursor):
+    # Server-side chatbot history, see conversations.py
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS conversations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            client_id TEXT NOT NULL,
+            title TEXT,
+            last_message_id INTEGER NOT NULL DEFAULT 0,
+            summary TEXT,
+            summary_upto INTEGER NOT NULL DEFAULT 0,
+            summary_tokens INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_conversations_user_client
+        ON conversations (user_id, client_id)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_conversations_user_updated
+        ON conversations (user_id, updated_at)
+    ''')
+    # Append-only; a conversation's messages are read newest first by id
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS conversation_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            conversation_id INTEGER NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            tokens INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            FOREIGN KEY(conversation_id) REFERENCES conversations(id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_conversation_messages_conversation
+        ON conversation_messages (conversation_id, id)
+    ''')
+
+
+# Multiple-choice keys for the seeded questions: (question, options, correct option)
+SEED_ANSWER_KEYS = [
+    ('Please introduce yourself.',
+     ['A short summary of your background, experience and what you are looking for',
+      'Your full life story, starting from childhood',
+      'A list of every technology you have heard of',
+      'Your salary expectations'],
+     'A short summary of your background, experience and what you are looking for'),
+    ('Explain the concept of object-oriented programming.',
+     ['Organizing code around functions that never share data',
+      'Organizing code around objects, using encapsulation, inheritance and polymorphism',
+      'Writing programs only in Java',
+      'Storing all program state in global variables'],
+     'Organizing code around objects, using encapsulation, inheritance and polymorphism'),
+    ('How would you approach debugging a complex issue?',
+     ['Rewrite the module from scratch',
+      'Add random sleeps until the problem goes away',
+      'Reproduce it, isolate the cause, fix it, then test the fix',
+      'Wait for a user to report it again'],
+     'Reproduce it, isolate the cause, fix it, then test the fix'),
+    ('Describe your experience with version control systems.',
+     ['Emailing zip files of the code to the team',
+      'Using Git with feature branches and code review',
+      'Keeping one copy of the code on a shared drive',
+      'Version control is only needed for large teams'],
+     'Using Git with feature branches and code review'),
+    ('What design patterns have you used in your projects?',
+     ['Copy and paste', 'Singleton, Observer and Factory, applied where they fit',
+      'Every pattern in every class', 'Patterns are only for UI code'],
+     'Singleton, Observer and Factory, applied where they fit'),
+    ('How do you optimize application performance?',
+     ['Buy faster servers before measuring anything',
+      'Profile first, then fix the hot spots: queries, caching, algorithms',
+      'Remove all logging', 'Rewrite everything in assembly'],
+     'Profile first, then fix the hot spots: queries, caching, algorithms'),
+    ('Tell me about a challenging project you worked on.',
+     ['Describe the problem, your part in solving it, and the outcome',
+      'Say you have never faced a challenge',
+      'Blame your previous team',
+      'Talk only about the technology stack'],
+     'Describe the problem, your part in solving it, and the outcome'),
+]
+
+
+def _v16_test_grading(cursor):
+    # Answer keys for server-side grading, see answer_key.py
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS question_answer_keys (
+            question_id INTEGER PRIMARY KEY,
+            options TEXT NOT NULL DEFAULT '[]',
+            correct_answer TEXT NOT NULL,
+            FOREIGN KEY(question_id) REFERENCES interview_questions(id)
+        )
+    ''')
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_question_answer_keys_cache_{event.lower()}
+            AFTER {event} ON question_answer_keys
+            BEGIN
+                INSERT INTO cache_versions (namespace, version) VALUES ('answer_keys', 1)
+                ON CONFLICT (namespace) DO UPDATE SET version = version + 1;
+            END
+        ''')
+    for question, options, correct in SEED_ANSWER_KEYS:
+        cursor.execute('''
+            INSERT OR IGNORE INTO question_answer_keys (question_id, options, correct_answer)
+            SELECT id, ?, ? FROM interview_questions WHERE question = ?
+        ''', (json.dumps(options), correct, question))
+
+    # One answer per question per test: the first one counts
+    cursor.execute('''
+        DELETE FROM test_answers WHERE id NOT IN (
+            SELECT MIN(id) FROM test_answers GROUP BY test_session_id, question_id
+        )
+    ''')
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_test_answers_session_question
+        ON test_answers (test_session_id, question_id)
+    ''')
+
+    # Running score, so test_complete doesn't count answers
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(test_sessions)")]
+    for column in ('answered_count', 'correct_count'):
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE test_sessions ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+    cursor.execute('''
+        UPDATE test_sessions SET
+            answered_count = (SELECT COUNT(*) FROM test_answers
+                              WHERE test_session_id = test_sessions.id),
+            correct_count = (SELECT COUNT(*) FROM test_answers
+                             WHERE test_session_id = test_sessions.id AND is_correct = 1)
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_test_answers_score_insert
+        AFTER INSERT ON test_answers
+        BEGIN
+            UPDATE test_sessions
+            SET answered_count = answered_count + 1,
+                correct_count = correct_count + (NEW.is_correct = 1)
+            WHERE id = NEW.test_session_id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_test_answers_score_delete
+        AFTER DELETE ON test_answers
+        BEGIN
+            UPDATE test_sessions
+            SET answered_count = answered_count - 1,
+                correct_count = correct_count - (OLD.is_correct = 1)
+            WHERE id = OLD.test_session_id;
+        END
+    ''')
+
+
+def _v17_progress_rollups(cursor):
+    # Per-user and per-career score rollups for the dashboard, see progress.py
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INTEGER PRIMARY KEY,
+            interview_count INTEGER NOT NULL DEFAULT 0,
+            interview_score_sum REAL NOT NULL DEFAULT 0,
+            interview_best REAL,
+            interview_last REAL,
+            test_count INTEGER NOT NULL DEFAULT 0,
+            test_score_sum INTEGER NOT NULL DEFAULT 0,
+            test_best INTEGER,
+            test_last INTEGER,
+            last_active_day TEXT,
+            streak_days INTEGER NOT NULL DEFAULT 0,
+            best_streak_days INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_career_stats (
+            user_id INTEGER NOT NULL,
+            career_id INTEGER NOT NULL,
+            interview_count INTEGER NOT NULL DEFAULT 0,
+            interview_score_sum REAL NOT NULL DEFAULT 0,
+            interview_best REAL,
+            interview_last REAL,
+            test_count INTEGER NOT NULL DEFAULT 0,
+            test_score_sum INTEGER NOT NULL DEFAULT 0,
+            test_best INTEGER,
+            test_last INTEGER,
+            last_active_day TEXT,
+            PRIMARY KEY (user_id, career_id),
+            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE,
+            FOREIGN KEY(career_id) REFERENCES careers(id)
+        ) WITHOUT ROWID
+    ''')
+    # Backfill from the history that is already there: every finished
+    # interview and test, the latest of each kind per user (and per career)
+    # ranked first
+    events = '''
+        WITH events AS (
+            SELECT user_id, career_id, 'interview' AS kind, overall_score AS score,
+                   date(end_time) AS day, end_time, id
+            FROM interviews
+            WHERE end_time IS NOT NULL AND overall_score IS NOT NULL
+            UNION ALL
+            SELECT ts.user_id, c.id, 'test', ts.score, date(ts.end_time), ts.end_time, ts.id
+            FROM test_sessions ts
+            LEFT JOIN careers c ON c.name = ts.subject
+            WHERE ts.end_time IS NOT NULL AND ts.score IS NOT NULL
+        ),
+        ranked AS (
+            SELECT *,
+                   ROW_NUMBER() OVER (PARTITION BY user_id, kind
+                                      ORDER BY end_time DESC, id DESC) AS user_rank,
+                   ROW_NUMBER() OVER (PARTITION BY user_id, career_id, kind
+                                      ORDER BY end_time DESC, id DESC) AS career_rank
+            FROM events
+        )
+    '''
+    totals = '''
+        SUM(kind = 'interview'),
+        TOTAL(CASE WHEN kind = 'interview' THEN score END),
+        MAX(CASE WHEN kind = 'interview' THEN score END),
+        MAX(CASE WHEN kind = 'interview' AND {rank} = 1 THEN score END),
+        SUM(kind = 'test'),
+        COALESCE(SUM(CASE WHEN kind = 'test' THEN score END), 0),
+        MAX(CASE WHEN kind = 'test' THEN score END),
+        MAX(CASE WHEN kind = 'test' AND {rank} = 1 THEN score END),
+        MAX(day)
+    '''
+    # Runs of consecutive active days: days in one run share day - row number.
+    # The streak is the run that ends on the user's last active day.
+    cursor.execute(events + ''',
+        days AS (
+            SELECT DISTINCT user_id, day FROM events
+        ),
+        runs AS (
+            SELECT user_id, COUNT(*) AS length, MAX(day) AS last_day
+            FROM (SELECT user_id, day,
+                         julianday(day) - ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY day) AS run
+                  FROM days)
+            GROUP BY user_id, run
+        ),
+        streaks AS (
+            SELECT user_id, MAX(length) AS best_streak_days,
+                   (SELECT r2.length FROM runs r2 WHERE r2.user_id = runs.user_id
+                    ORDER BY r2.last_day DESC LIMIT 1) AS streak_days
+            FROM runs
+            GROUP BY user_id
+        )
+        INSERT INTO user_stats
+        (user_id, interview_count, interview_score_sum, interview_best, interview_last,
+         test_count, test_score_sum, test_best, test_last, last_active_day,
+         streak_days, best_streak_days)
+        SELECT r.user_id, ''' + totals.format(rank='user_rank') + ''',
+               s.streak_days, s.best_streak_days
+        FROM ranked r
+        JOIN streaks s ON s.user_id = r.user_id
+        GROUP BY r.user_id
+    ''')
+    cursor.execute(events + '''
+        INSERT INTO user_career_stats
+        (user_id, career_id, interview_count, interview_score_sum, interview_best,
+         interview_last, test_count, test_score_sum, test_best, test_last, last_active_day)
+        SELECT user_id, career_id, ''' + totals.format(rank='career_rank') + '''
+        FROM ranked
+        WHERE career_id IS NOT NULL
+        GROUP BY user_id, career_id
+    ''')
+
+
+# Index in this list + 1 is the schema version the step brings you to
+MIGRATIONS = [
+    _v1_base_schema,
+    _v2_hot_query_indexes,
+    _v3_interview_answers_answered,
+    _v4_question_pool_versions,
+    _v5_sessions,
+    _v6_task_queue,
+    _v7_question_edit_versions,
+    _v8_cache_versions,
+    _v9_job_filter_indexes,
+    _v10_full_text_search,
+    _v11_job_match_changes,
+    _v12_job_dedup_hash,
+    _v13_applications,
+    _v14_chat_response_cache,
+    _v15_conversations,
+    _v16_test_grading,
+    _v17_progress_rollups,
+]
+
+LATEST_VERSION = len(MIGRATIONS)
+
+
+def current_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Bring the database up to LATEST_VERSION. Returns the steps applied."""
+    # Fast path: nothing to do, no write lock taken
+    if current_version(conn) >= LATEST_VERSION:
+        return []
+
+    applied = []
+    with _lock:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another worker may have migrated while we waited for the lock
+            version = current_version(conn)
+            cursor = conn.cursor()
+            for step in MIGRATIONS[version:]:
+                step(cursor)
+                version += 1
+                applied.append(version)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return applied
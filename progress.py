@@ -0,0 +1,263 @@
+"""Per-user progress rollups for the dashboard.
+
+Interview and test scores live in interviews and test_sessions. Rather
+than re-aggregate a user's whole history on every page view, two rollup
+tables (migration v17) are updated in the same transaction that produces
+a score:
+
+    user_stats          one row per user: count, score sum, best and last
+                        score for interviews and for tests, and the run of
+                        consecutive active days
+    user_career_stats   one row per (user, career), the same figures for
+                        that career (a test counts towards its subject)
+
+record_interview() runs when the analysis task stores an interview's
+overall_score, record_test() when complete_test_session() marks a test
+completed; both callers only do so on the transition, so a retried task
+or a repeated /test/complete is not counted twice. Each is an upsert of
+a few additions; averages are sum / count at read time. for_user() reads
+the summary by primary key and the per-career rows by a primary-key
+range, so the dashboard never aggregates.
+
+A day is the date of the finished interview's or test's end_time. Bulk
+changes to scores (scoring.py rescore, imports) leave the rollups stale;
+rebuild() recomputes them from the source tables in one ordered pass:
+
+    python progress.py rebuild
+"""
+import argparse
+from datetime import date, timedelta
+
+KINDS = ('interview', 'test')
+
+# The finished interview or test, as (user_id, career_id, score, day)
+_EVENT_SQL = {
+    'interview': '''
+        SELECT user_id, career_id, overall_score, date(end_time) FROM interviews
+        WHERE id = ? AND end_time IS NOT NULL AND overall_score IS NOT NULL
+    ''',
+    'test': '''
+        SELECT ts.user_id, c.id, ts.score, date(ts.end_time)
+        FROM test_sessions ts
+        LEFT JOIN careers c ON c.name = ts.subject
+        WHERE ts.id = ? AND ts.end_time IS NOT NULL AND ts.score IS NOT NULL
+    ''',
+}
+
+# Every finished interview and test, in the order record_*() sees them
+_HISTORY_SQL = '''
+    SELECT user_id, career_id, 'interview', overall_score, date(end_time), end_time, id
+    FROM interviews
+    WHERE end_time IS NOT NULL AND overall_score IS NOT NULL
+    UNION ALL
+    SELECT ts.user_id, c.id, 'test', ts.score, date(ts.end_time), ts.end_time, ts.id
+    FROM test_sessions ts
+    LEFT JOIN careers c ON c.name = ts.subject
+    WHERE ts.end_time IS NOT NULL AND ts.score IS NOT NULL
+    ORDER BY 1, 6, 7
+'''
+
+# Same rule as _advance_streak(): a day right after the last one extends
+# the run, a later one starts a new run, the same or an earlier day keeps it
+_STREAK = '''CASE
+    WHEN last_active_day < date(excluded.last_active_day, '-1 day') THEN 1
+    WHEN last_active_day = date(excluded.last_active_day, '-1 day') THEN streak_days + 1
+    ELSE streak_days
+END'''
+
+
+def _kind_updates(kind):
+    return [
+        f"{kind}_count = {kind}_count + 1",
+        f"{kind}_score_sum = {kind}_score_sum + excluded.{kind}_score_sum",
+        f"{kind}_best = MAX(COALESCE({kind}_best, excluded.{kind}_best), excluded.{kind}_best)",
+        f"{kind}_last = excluded.{kind}_last",
+    ]
+
+
+def _user_upsert(kind):
+    updates = _kind_updates(kind) + [
+        f"streak_days = {_STREAK}",
+        f"best_streak_days = MAX(best_streak_days, {_STREAK})",
+        "last_active_day = MAX(last_active_day, excluded.last_active_day)",
+    ]
+    return f'''
+        INSERT INTO user_stats
+        (user_id, {kind}_count, {kind}_score_sum, {kind}_best, {kind}_last,
+         last_active_day, streak_days, best_streak_days)
+        VALUES (:user_id, 1, :score, :score, :score, :day, 1, 1)
+        ON CONFLICT (user_id) DO UPDATE SET {", ".join(updates)}
+    '''
+
+
+def _career_upsert(kind):
+    updates = _kind_updates(kind) + [
+        "last_active_day = MAX(last_active_day, excluded.last_active_day)",
+    ]
+    return f'''
+        INSERT INTO user_career_stats
+        (user_id, career_id, {kind}_count, {kind}_score_sum, {kind}_best, {kind}_last,
+         last_active_day)
+        VALUES (:user_id, :career_id, 1, :score, :score, :score, :day)
+        ON CONFLICT (user_id, career_id) DO UPDATE SET {", ".join(updates)}
+    '''
+
+
+_USER_UPSERT = {kind: _user_upsert(kind) for kind in KINDS}
+_CAREER_UPSERT = {kind: _career_upsert(kind) for kind in KINDS}
+
+
+def _record(conn, kind, source_id):
+    event = conn.execute(_EVENT_SQL[kind], (source_id,)).fetchone()
+    if event is None:
+        return False
+    user_id, career_id, score, day = event
+    params = {'user_id': user_id, 'career_id': career_id, 'score': score, 'day': day}
+    conn.execute(_USER_UPSERT[kind], params)
+    if career_id is not None:
+        conn.execute(_CAREER_UPSERT[kind], params)
+    return True
+
+
+def record_interview(conn, interview_id):
+    """Add a just-scored interview to the rollups; commit is left to the caller."""
+    return _record(conn, 'interview', interview_id)
+
+
+def record_test(conn, test_session_id):
+    """Add a just-completed test to the rollups; commit is left to the caller."""
+    return _record(conn, 'test', test_session_id)
+
+
+def _with_averages(row, today):
+    stats = dict(row)
+    for kind in KINDS:
+        count = stats[f'{kind}_count']
+        stats[f'{kind}_avg'] = round(stats[f'{kind}_score_sum'] / count, 1) if count else None
+    if 'streak_days' in stats:
+        # A run is still current if the user was active today or yesterday
+        active = stats['last_active_day'] and stats['last_active_day'] >= _previous_day(today)
+        stats['current_streak_days'] = stats['streak_days'] if active else 0
+    return stats
+
+
+def for_user(conn, user_id, today=None):
+    """A user's dashboard figures, or None if they haven't finished anything yet."""
+    row = conn.execute("SELECT * FROM user_stats WHERE user_id = ?", (user_id,)).fetchone()
+    if row is None:
+        return None
+    today = today or date.today().isoformat()
+    summary = _with_averages(row, today)
+    summary['careers'] = [_with_averages(r, today) for r in conn.execute(
+        """SELECT s.*, c.name AS career FROM user_career_stats s
+           JOIN careers c ON c.id = s.career_id
+           WHERE s.user_id = ?
+           ORDER BY s.career_id""",
+        (user_id,)
+    )]
+    return summary
+
+
+# ----- bulk rebuild -----
+
+USER_COLUMNS = ('user_id', 'interview_count', 'interview_score_sum', 'interview_best',
+                'interview_last', 'test_count', 'test_score_sum', 'test_best', 'test_last',
+                'last_active_day', 'streak_days', 'best_streak_days')
+CAREER_COLUMNS = ('user_id', 'career_id', 'interview_count', 'interview_score_sum',
+                  'interview_best', 'interview_last', 'test_count', 'test_score_sum',
+                  'test_best', 'test_last', 'last_active_day')
+
+
+def _previous_day(day):
+    return (date.fromisoformat(day) - timedelta(days=1)).isoformat()
+
+
+def _empty(columns, **keys):
+    stats = dict.fromkeys(columns, None)
+    for kind in KINDS:
+        stats[f'{kind}_count'] = 0
+        stats[f'{kind}_score_sum'] = 0
+    stats.update(keys)
+    return stats
+
+
+def _add(stats, kind, score, day):
+    stats[f'{kind}_count'] += 1
+    stats[f'{kind}_score_sum'] += score
+    best = stats[f'{kind}_best']
+    stats[f'{kind}_best'] = score if best is None else max(best, score)
+    stats[f'{kind}_last'] = score
+    stats['last_active_day'] = max(stats['last_active_day'] or day, day)
+
+
+def _advance_streak(stats, day):
+    last = stats['last_active_day']
+    if last is None or last < _previous_day(day):
+        streak = 1
+    elif last == _previous_day(day):
+        streak = stats['streak_days'] + 1
+    else:
+        streak = stats['streak_days']
+    stats['streak_days'] = streak
+    stats['best_streak_days'] = max(stats['best_streak_days'] or 0, streak)
+
+
+def _insert(conn, table, columns, rows):
+    conn.executemany(
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+        [tuple(r[c] for c in columns) for r in rows]
+    )
+
+
+def rebuild(conn, chunk_size=10000):
+    """Recompute both rollup tables from interviews and test_sessions.
+
+    Commit is left to the caller; until then readers keep seeing the old
+    rollups. Returns the number of users with a rollup.
+    """
+    conn.execute("DELETE FROM user_stats")
+    conn.execute("DELETE FROM user_career_stats")
+    users, careers = [], {}
+    current = None
+    rebuilt = 0
+    for user_id, career_id, kind, score, day, _, _ in conn.execute(_HISTORY_SQL):
+        if user_id != current:
+            if len(users) >= chunk_size:
+                _insert(conn, "user_stats", USER_COLUMNS, users)
+                _insert(conn, "user_career_stats", CAREER_COLUMNS, careers.values())
+                rebuilt += len(users)
+                users, careers = [], {}
+            current = user_id
+            users.append(_empty(USER_COLUMNS, user_id=user_id, streak_days=0))
+        _advance_streak(users[-1], day)
+        _add(users[-1], kind, score, day)
+        if career_id is not None:
+            if (user_id, career_id) not in careers:
+                careers[user_id, career_id] = _empty(CAREER_COLUMNS, user_id=user_id,
+                                                     career_id=career_id)
+            _add(careers[user_id, career_id], kind, score, day)
+    _insert(conn, "user_stats", USER_COLUMNS, users)
+    _insert(conn, "user_career_stats", CAREER_COLUMNS, careers.values())
+    return rebuilt + len(users)
+
+
+def main():
+    import db
+
+    parser = argparse.ArgumentParser(description="Progress rollup tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("rebuild", help="recompute user_stats and user_career_stats from history")
+    p.add_argument("--chunk-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    conn = db.get_connection()
+    try:
+        users = rebuild(conn, args.chunk_size)
+        conn.commit()
+        print(f"Rebuilt progress for {users} users")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Per-question scoring rubrics compiled into multi-pattern matchers.
+
+A rubric holds the terms a good answer to one question should mention:
+keywords pulled from its ideal_answer, the keyword list for its career,
+and structure markers chosen by question_type. All of them are compiled
+into one automaton, so an answer is scored in a single pass over its
+text no matter how many terms the rubric has.
+
+Compiled rubrics are cached per question and tagged with the question's
+pool version from question_pool_versions. Triggers bump that version
+when a question is added, removed or edited, so a stale rubric is
+rebuilt on its next use.
+"""
+import re
+import threading
+
+CAREER_KEYWORDS = {
+    'Software Engineering': ['python', 'java', 'algorithm', 'data structure', 'api', 'database',
+                             'testing', 'git', 'debug', 'performance', 'scalab', 'design pattern',
+                             'refactor', 'code review', 'deploy'],
+    'Data Science': ['python', 'statistic', 'regression', 'classification', 'model', 'feature',
+                     'pandas', 'visualiz', 'machine learning', 'dataset', 'hypothesis', 'sql'],
+    'Product Management': ['roadmap', 'stakeholder', 'user research', 'metric', 'prioritiz',
+                           'requirement', 'launch', 'customer', 'market', 'mvp', 'okr'],
+    'UX/UI Design': ['user research', 'wirefram', 'prototyp', 'usability', 'persona', 'figma',
+                     'accessib', 'user flow', 'design system', 'iterat'],
+    'Digital Marketing': ['seo', 'campaign', 'conversion', 'analytics', 'audience', 'content',
+                          'social media', 'engagement', 'roi', 'a/b test', 'funnel'],
+}
+
+STRUCTURE_MARKERS = {
+    'behavioral': ['situation', 'task', 'action', 'result', 'learned', 'team', 'for example'],
+    'problem-solving': ['first', 'then', 'finally', 'reproduce', 'isolate', 'identify',
+                        'approach', 'because', 'step'],
+    'technical': ['first', 'then', 'for example', 'because', 'such as', 'trade-off'],
+}
+
+STOPWORDS = {
+    'about', 'should', 'with', 'like', 'include', 'including', 'mention', 'specific', 'their',
+    'they', 'that', 'this', 'from', 'into', 'your', 'have', 'been', 'were', 'what', 'when',
+    'examples', 'explanation', 'demonstrate', 'relevant', 'common', 'etc', 'concise',
+}
+
+
+class TermMatcher:
+    """Multi-pattern matcher over lower-cased text.
+
+    Patterns are stored in a trie. Matches must start at a word boundary
+    (but may end mid-word, so the stem 'prototyp' matches 'prototyping'
+    while 'test' doesn't match 'latest'), which means no failure links are
+    needed: the trie is compiled into one regular expression and the re
+    engine walks it from every word start in a single pass over the text.
+    Every pattern that ends along a matched path is reported, so 'test'
+    and 'testing' are both found in 'testing'.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self._trie = {}
+        for pid, pattern in enumerate(self.patterns):
+            node = self._trie
+            for ch in pattern:
+                node = node.setdefault(ch, {})
+            node.setdefault(None, []).append(pid)
+        self._regex = (re.compile(r"(?<![^\W_])(?=(" + self._compile(self._trie) + "))")
+                       if self.patterns else None)
+        # Longest match at a position -> every pattern id along its trie path
+        self._paths = {}
+
+    def _compile(self, node):
+        branches = [re.escape(ch) + self._compile(child)
+                    for ch, child in node.items() if ch is not None]
+        if not branches:
+            return ""
+        alt = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return "(?:" + alt + ")?" if None in node else alt
+
+    def _path(self, match):
+        ids = self._paths.get(match)
+        if ids is None:
+            ids = set()
+            node = self._trie
+            for ch in match:
+                node = node[ch]
+                ids.update(node.get(None, ()))
+            self._paths[match] = ids
+        return ids
+
+    def find(self, text):
+        """Return the ids of every pattern that occurs in text."""
+        found = set()
+        if self._regex is not None:
+            for match in set(self._regex.findall(text)):
+                found |= self._path(match)
+        return found
+
+
+def ideal_answer_terms(ideal_answer):
+    words = re.findall(r"[a-z][a-z\-/]{3,}", (ideal_answer or '').lower())
+    return [w for w in dict.fromkeys(words) if w not in STOPWORDS]
+
+
+class Rubric:
+    def __init__(self, question_type, ideal_answer, career_name, version=0):
+        self.version = version
+        technical = ideal_answer_terms(ideal_answer)
+        if question_type != 'behavioral':
+            technical += CAREER_KEYWORDS.get(career_name, [])
+        technical = list(dict.fromkeys(technical))
+        structure = STRUCTURE_MARKERS.get(question_type, STRUCTURE_MARKERS['technical'])
+
+        self.technical_ids = set(range(len(technical)))
+        self.structure_ids = set(range(len(technical), len(technical) + len(structure)))
+        self.ideal_ids = set(range(len(ideal_answer_terms(ideal_answer))))
+        self.matcher = TermMatcher(technical + list(structure))
+
+    def score(self, text):
+        """Return (technical_score, communication_score), each 0-100, for one answer."""
+        found = self.matcher.find((text or '').lower())
+        tech_hits = len(found & self.technical_ids)
+        ideal_hits = len(found & self.ideal_ids)
+        structure_hits = len(found & self.structure_ids)
+
+        # A handful of relevant terms is a full marks answer; ideal_answer terms count double
+        technical = min(100, (tech_hits + ideal_hits) * 100 // max(1, min(len(self.technical_ids), 6)))
+        length_part = min(len(text or '') / 400, 1) * 50
+        communication = min(100, int(length_part + structure_hits * 12.5))
+        return technical, communication
+
+
+class RubricCache:
+    def __init__(self):
+        self._rubrics = {}
+        self._lock = threading.Lock()
+
+    def for_questions(self, conn, question_ids):
+        """Return {question_id: Rubric}, compiling only missing or stale rubrics."""
+        ids = list(dict.fromkeys(question_ids))
+        if not ids:
+            return {}
+        placeholders = ", ".join("?" * len(ids))
+        rows = conn.execute(
+            f"""SELECT iq.id, iq.question_type, iq.ideal_answer, c.name AS career_name,
+                       COALESCE(v.version, 0) AS version
+                FROM interview_questions iq
+                LEFT JOIN careers c ON c.id = iq.career_id
+                LEFT JOIN question_pool_versions v
+                       ON v.career_id = iq.career_id AND v.difficulty_level = iq.difficulty_level
+                WHERE iq.id IN ({placeholders})""",
+            ids
+        ).fetchall()
+
+        rubrics = {}
+        for row in rows:
+            with self._lock:
+                rubric = self._rubrics.get(row['id'])
+            if rubric is None or rubric.version != row['version']:
+                rubric = Rubric(row['question_type'], row['ideal_answer'], row['career_name'],
+                                row['version'])
+                with self._lock:
+                    self._rubrics[row['id']] = rubric
+            rubrics[row['id']] = rubric
+        return rubrics
+
+    def clear(self):
+        with self._lock:
+            self._rubrics.clear()
+
+
+cache = RubricCache()
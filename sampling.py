@@ -0,0 +1,113 @@
+"""Random interview question sampling without ORDER BY RANDOM().
+
+Question ids are kept in memory per (career_id, difficulty_level) pool.
+Drawing n questions is random.sample over that list, so the cost depends
+on n, not on the size of the question bank.
+
+Pools stay in sync through question_pool_versions, which triggers on
+interview_questions bump whenever a pool gains or loses a question. Before
+sampling we compare the stored version (a primary-key lookup) with the one
+the pool was loaded at and reload the pool if it moved, so every worker
+picks up changes made by any other.
+"""
+import random
+import threading
+
+
+class QuestionPool:
+    """Ids of one (career, difficulty) pool, as loaded at `version`."""
+
+    def __init__(self, ids, version):
+        self.ids = list(ids)
+        self.version = version
+
+    def sample(self, n, exclude=None):
+        if not self.ids:
+            return []
+        if not exclude:
+            return random.sample(self.ids, min(n, len(self.ids)))
+
+        # Rejection sampling stays cheap while most of the pool is unseen
+        picked = []
+        chosen = set()
+        attempts = 0
+        while len(picked) < n and attempts < n * 8:
+            qid = self.ids[random.randrange(len(self.ids))]
+            attempts += 1
+            if qid in exclude or qid in chosen:
+                continue
+            chosen.add(qid)
+            picked.append(qid)
+        if len(picked) < n:
+            # User has seen most of this pool; fall back to a filtered draw
+            remaining = [qid for qid in self.ids if qid not in exclude and qid not in chosen]
+            picked += random.sample(remaining, min(n - len(picked), len(remaining)))
+        return picked
+
+
+class QuestionSampler:
+    def __init__(self):
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def _version(self, conn, career_id, difficulty):
+        row = conn.execute(
+            """SELECT version FROM question_pool_versions
+               WHERE career_id = ? AND difficulty_level = ?""",
+            (career_id, difficulty)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _pool(self, conn, career_id, difficulty):
+        key = (career_id, difficulty)
+        version = self._version(conn, career_id, difficulty)
+        pool = self._pools.get(key)
+        if pool is not None and pool.version == version:
+            return pool
+
+        ids = [row[0] for row in conn.execute(
+            """SELECT id FROM interview_questions
+               WHERE career_id = ? AND difficulty_level = ?""",
+            (career_id, difficulty)
+        )]
+        pool = QuestionPool(ids, version)
+        with self._lock:
+            self._pools[key] = pool
+        return pool
+
+    def sample_ids(self, conn, career_id, difficulty, n, exclude=None):
+        """Return up to n distinct question ids from the pool, in random order."""
+        pool = self._pool(conn, career_id, difficulty)
+        with self._lock:
+            return pool.sample(n, exclude)
+
+    def sample(self, conn, career_id, difficulty, n, columns="id, question, question_type",
+               exclude=None):
+        """Return up to n random interview_questions rows as dicts."""
+        ids = self.sample_ids(conn, career_id, difficulty, n, exclude)
+        if not ids:
+            return []
+        placeholders = ", ".join("?" * len(ids))
+        rows = conn.execute(
+            f"SELECT {columns} FROM interview_questions WHERE id IN ({placeholders})",
+            ids
+        ).fetchall()
+        by_id = {row['id']: dict(row) for row in rows}
+        return [by_id[qid] for qid in ids if qid in by_id]
+
+    def clear(self):
+        with self._lock:
+            self._pools.clear()
+
+
+def seen_question_ids(conn, user_id):
+    """Question ids already asked to a user in previous interviews."""
+    return {row[0] for row in conn.execute(
+        """SELECT m.question_id FROM interviews i
+           JOIN interview_questions_mapping m ON m.interview_id = i.id
+           WHERE i.user_id = ?""",
+        (user_id,)
+    )}
+
+
+sampler = QuestionSampler()
@@ -0,0 +1,204 @@
+"""Interview answer scoring.
+
+analyze_answers scores one interview. batch_analyze computes exactly the
+same numbers for many interviews at once: per-answer sub-scores are NumPy
+arrays over every answer in the batch, and each interview's sums are
+accumulated one answer position at a time, which is the order
+analyze_answers adds them in. The float results (and the int()
+truncation applied to them) therefore match bit for bit.
+
+    python scoring.py rescore          # recompute interviews.overall_score
+"""
+import argparse
+
+try:
+    import numpy as np
+except ImportError:  # only batch_analyze needs it
+    np = None
+
+KEYWORDS = ['experience', 'project', 'learn']
+
+EMPTY_ANALYSIS = {
+    'overall_score': 0,
+    'technical_score': 0,
+    'communication_score': 0,
+    'confidence_score': 0,
+    'feedback': "No answers provided",
+    'strengths': "None",
+    'areas_to_improve': "Please attempt all questions"
+}
+
+
+def analyze_answers(answers, rubrics=None):
+    """Analyze only answered questions.
+
+    `rubrics` maps question_id to a rubric.Rubric; answers whose question
+    has one get their technical and communication sub-scores from it.
+    """
+    if not answers:
+        return dict(EMPTY_ANALYSIS)
+
+    # Calculate scores only for answered questions
+    total_score = 0
+    tech_score = 0
+    comm_score = 0
+
+    for answer in answers:
+        if not answer.get('text'):
+            continue
+
+        length_score = min(len(answer['text']) / 20, 1) * 20
+        keyword_score = 10 if any(kw in answer['text'].lower()
+                          for kw in KEYWORDS) else 5
+        total_score += length_score + keyword_score
+
+        rubric = rubrics.get(answer.get('question_id')) if rubrics else None
+        if rubric is not None:
+            technical, communication = rubric.score(answer['text'])
+            tech_score += technical
+            comm_score += communication
+            continue
+
+        tech_score += length_score * 1.2
+
+        structure_bonus = 5 if ('first' in answer['text'] and
+                              'then' in answer['text']) else 0
+        comm_score += length_score * 0.8 + structure_bonus
+
+    # Normalize scores
+    total_score = min(int(total_score / len(answers)), 100)
+    tech_score = min(int(tech_score / len(answers)), 100)
+    comm_score = min(int(comm_score / len(answers)), 100)
+    confidence_score = min(total_score + 10, 100)
+
+    return _analysis(total_score, tech_score, comm_score, confidence_score)
+
+
+def _analysis(total_score, tech_score, comm_score, confidence_score):
+    return {
+        'overall_score': total_score,
+        'technical_score': tech_score,
+        'communication_score': comm_score,
+        'confidence_score': confidence_score,
+        'feedback': "You demonstrated good knowledge but could improve your answer structure.",
+        'strengths': "Technical understanding, clear communication",
+        'areas_to_improve': "Answer structure, providing more specific examples"
+    }
+
+
+def batch_analyze(interviews):
+    """Score many interviews at once.
+
+    `interviews` is a list of answer-text lists, one per interview. Returns
+    a list of analysis dicts equal to calling analyze_answers on each
+    without rubrics.
+    """
+    if np is None:
+        raise RuntimeError("batch_analyze requires numpy")
+
+    n = len(interviews)
+    counts = np.fromiter((len(a) for a in interviews), dtype=np.int64, count=n)
+    texts = [text or '' for answers in interviews for text in answers]
+
+    # Which interview each answer belongs to, and its position within it
+    owner = np.repeat(np.arange(n), counts)
+    starts = np.cumsum(counts) - counts
+    position = np.arange(len(texts)) - np.repeat(starts, counts)
+
+    # Substring flags come from one C-level scan per answer; everything
+    # after this point is array arithmetic
+    lengths = np.fromiter(map(len, texts), dtype=np.float64, count=len(texts))
+    has_keyword = np.fromiter(
+        (any(kw in t for kw in KEYWORDS) for t in map(str.lower, texts)),
+        dtype=bool, count=len(texts))
+    has_structure = np.fromiter(
+        ('first' in t and 'then' in t for t in texts), dtype=bool, count=len(texts))
+
+    length_score = np.minimum(lengths / 20, 1) * 20
+    answer_total = length_score + np.where(has_keyword, 10, 5)
+    answer_tech = length_score * 1.2
+    answer_comm = length_score * 0.8 + np.where(has_structure, 5, 0)
+    present = lengths > 0
+
+    # Accumulate one answer position at a time so each interview's sum is
+    # built in the same order as analyze_answers adds it
+    total = np.zeros(n)
+    tech = np.zeros(n)
+    comm = np.zeros(n)
+    for col in range(int(counts.max()) if n else 0):
+        idx = np.flatnonzero((position == col) & present)
+        rows = owner[idx]
+        total[rows] += answer_total[idx]
+        tech[rows] += answer_tech[idx]
+        comm[rows] += answer_comm[idx]
+
+    safe_counts = np.maximum(counts, 1)
+    total_i = np.minimum(np.trunc(total / safe_counts), 100).astype(np.int64)
+    tech_i = np.minimum(np.trunc(tech / safe_counts), 100).astype(np.int64)
+    comm_i = np.minimum(np.trunc(comm / safe_counts), 100).astype(np.int64)
+    conf_i = np.minimum(total_i + 10, 100)
+
+    return [
+        _analysis(int(t), int(te), int(c), int(cf)) if cnt else dict(EMPTY_ANALYSIS)
+        for t, te, c, cf, cnt in zip(total_i.tolist(), tech_i.tolist(), comm_i.tolist(),
+                                     conf_i.tolist(), counts.tolist())
+    ]
+
+
+def _answered_interviews(conn, chunk_size):
+    """Yield (interview_ids, answer_texts) chunks in analyze_answers order."""
+    ids, texts = [], []
+    current, answers = None, None
+    for row in conn.execute(
+        """SELECT interview_id, answer_text FROM interview_answers
+           WHERE answered = 1
+           ORDER BY interview_id, id"""
+    ):
+        if row[0] != current:
+            if current is not None:
+                ids.append(current)
+                texts.append(answers)
+                if len(ids) >= chunk_size:
+                    yield ids, texts
+                    ids, texts = [], []
+            current, answers = row[0], []
+        answers.append(row[1])
+    if current is not None:
+        ids.append(current)
+        texts.append(answers)
+    if ids:
+        yield ids, texts
+
+
+def rescore_interviews(conn, chunk_size=10000):
+    """Recompute overall_score for every interview with answers, in bulk."""
+    updated = 0
+    for ids, texts in _answered_interviews(conn, chunk_size):
+        results = batch_analyze(texts)
+        conn.executemany(
+            "UPDATE interviews SET overall_score = ? WHERE id = ?",
+            [(r['overall_score'], interview_id) for r, interview_id in zip(results, ids)]
+        )
+        updated += len(ids)
+    conn.commit()
+    return updated
+
+
+def main():
+    import db
+
+    parser = argparse.ArgumentParser(description="Interview scoring tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("rescore", help="recompute interviews.overall_score from stored answers")
+    p.add_argument("--chunk-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    conn = db.get_connection()
+    try:
+        print(f"Rescored {rescore_interviews(conn, args.chunk_size)} interviews")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Ranked full-text search over jobs and interview questions.
+
+Both tables have an FTS5 index (migration v10) that triggers keep in sync.
+A query's words are AND-ed together and each matches as a prefix, so
+'pyth dev' finds 'Python developer'. Results are ordered by bm25 with the
+title-like columns weighted up.
+
+bm25 has to be computed for every matching row before the best can be
+picked, which for a word found in most of a million documents costs
+seconds. So only the newest CANDIDATE_WINDOW matches are ranked: rowids
+grow with inserts, FTS5 reads a doclist newest-first cheaply, and for a
+broad query the best of the most recent postings is what people want
+anyway. Narrow queries have fewer matches than the window and are ranked
+in full. Pages are offsets into that ranked window.
+
+Highlights and snippets are computed for the returned page only, HTML
+escaped, and the matched terms wrapped in <mark>.
+"""
+import base64
+import binascii
+import html
+import json
+import re
+from collections import namedtuple
+
+from job_feed import InvalidCursor
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 50
+MAX_TERMS = 8
+CANDIDATE_WINDOW = 10000
+
+# Private-use markers FTS5 wraps around matches; swapped for <mark> after escaping
+_OPEN, _CLOSE = '\ue000', '\ue001'
+
+Index = namedtuple('Index', 'fts rows_sql fields')
+
+INDEXES = {
+    'jobs': Index(
+        'jobs_fts',
+        """SELECT j.id, j.title, j.company, j.location, j.posted_at, j.career_id,
+                  c.name AS career_name
+           FROM jobs j
+           LEFT JOIN careers c ON c.id = j.career_id
+           WHERE j.id IN ({ids})""",
+        ['id', 'title', 'company', 'location', 'posted_at', 'career_id', 'career_name'],
+    ),
+    'questions': Index(
+        'interview_questions_fts',
+        """SELECT q.id, q.question, q.question_type, q.difficulty_level, q.career_id,
+                  c.name AS career_name
+           FROM interview_questions q
+           LEFT JOIN careers c ON c.id = q.career_id
+           WHERE q.id IN ({ids})""",
+        ['id', 'question', 'question_type', 'difficulty_level', 'career_id', 'career_name'],
+    ),
+}
+
+
+class InvalidQuery(ValueError):
+    pass
+
+
+def match_expression(text):
+    """Turn user input into an FTS5 query: every word, as a prefix, AND-ed."""
+    terms = re.findall(r"\w+", (text or '').lower())[:MAX_TERMS]
+    if not terms:
+        raise InvalidQuery(text)
+    # Quoting makes each word a plain string, whatever FTS5 syntax it contains;
+    # one-letter prefixes would expand to most of the vocabulary
+    return " AND ".join(f'"{t}"*' if len(t) >= 2 else f'"{t}"' for t in terms)
+
+
+def encode_cursor(offset):
+    return base64.urlsafe_b64encode(json.dumps([offset]).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        (offset,) = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if not isinstance(offset, int) or not 0 <= offset < CANDIDATE_WINDOW:
+        raise InvalidCursor(cursor)
+    return offset
+
+
+def _marked(text):
+    return (html.escape(text or '')
+            .replace(_OPEN, '<mark>').replace(_CLOSE, '</mark>'))
+
+
+def search(conn, kind, text, cursor=None, limit=DEFAULT_LIMIT):
+    """Return {'fields', 'rows', 'next_cursor'} for one page of results.
+
+    Rows are the kind's fields followed by 'highlight' (the first column
+    with matches marked) and 'snippet' (the best matching passage).
+    """
+    index = INDEXES.get(kind)
+    if index is None:
+        raise InvalidQuery(kind)
+    query = match_expression(text)
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    offset = decode_cursor(cursor) if cursor else 0
+
+    fts = index.fts
+    fields = index.fields + ['highlight', 'snippet']
+    ranked = [row[0] for row in conn.execute(
+        f"""SELECT rowid FROM (
+                SELECT rowid, rank FROM {fts} WHERE {fts} MATCH ?
+                ORDER BY rowid DESC LIMIT ?
+            )
+            ORDER BY rank, rowid DESC
+            LIMIT ? OFFSET ?""",
+        (query, CANDIDATE_WINDOW, limit + 1, offset)
+    )]
+    next_cursor = None
+    if len(ranked) > limit:
+        ranked = ranked[:limit]
+        if offset + limit < CANDIDATE_WINDOW:
+            next_cursor = encode_cursor(offset + limit)
+    if not ranked:
+        return {'fields': fields, 'rows': [], 'next_cursor': None}
+
+    ids = ", ".join("?" * len(ranked))
+    marks = {row[0]: (row[1], row[2]) for row in conn.execute(
+        f"""SELECT rowid, highlight({fts}, 0, ?, ?), snippet({fts}, -1, ?, ?, '...', 16)
+            FROM {fts} WHERE {fts} MATCH ? AND rowid IN ({ids})""",
+        (_OPEN, _CLOSE, _OPEN, _CLOSE, query, *ranked)
+    )}
+    rows = {row[0]: list(row) for row in conn.execute(index.rows_sql.format(ids=ids), ranked)}
+
+    results = []
+    for rowid in ranked:
+        if rowid in rows:
+            highlight, snippet = marks.get(rowid, ('', ''))
+            results.append(rows[rowid] + [_marked(highlight), _marked(snippet)])
+    return {'fields': fields, 'rows': results, 'next_cursor': next_cursor}
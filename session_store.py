@@ -0,0 +1,195 @@
+"""Server-side Flask sessions.
+
+Only a random session id travels in the cookie; the session dict lives in
+a backend. SESSION_BACKEND picks one:
+
+    sqlite  - the sessions table in users.db, shared by every worker (default)
+    memory  - an in-process LRU with TTL, for single-worker deployments
+    cookie  - Flask's stock signed-cookie sessions
+
+Call regenerate(session) before marking a session as logged in: a sid the
+browser arrived with may have been planted, so the authenticated session
+gets a fresh one and the old backend entry is deleted.
+"""
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSessionInterface, SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+import db
+
+serializer = TaggedJSONSerializer()
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.replaced_sid = None
+
+    def regenerate(self):
+        """Move to a fresh sid; the old one is deleted when the session is saved."""
+        if not self.new and self.replaced_sid is None:
+            self.replaced_sid = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.new = True
+        self.modified = True
+
+
+def regenerate(session):
+    """New sid for a session about to be authenticated; no-op for cookie sessions."""
+    if isinstance(session, ServerSideSession):
+        session.regenerate()
+
+
+class MemorySessionBackend:
+    """LRU of serialized sessions with per-entry expiry."""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, sid):
+        with self._lock:
+            entry = self._data.get(sid)
+            if entry is None:
+                return None
+            payload, expires_at = entry
+            if expires_at < time.time():
+                del self._data[sid]
+                return None
+            self._data.move_to_end(sid)
+            return payload
+
+    def store(self, sid, payload, ttl):
+        with self._lock:
+            self._data[sid] = (payload, time.time() + ttl)
+            self._data.move_to_end(sid)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+
+
+class SQLiteSessionBackend:
+    """Sessions table in users.db; expired rows are swept every few hundred writes."""
+
+    sweep_every = 500
+
+    def __init__(self):
+        self._writes = 0
+
+    # On the caller's connection (the ASGI app's reader and writer);
+    # commit is left to the caller
+
+    def load_from(self, conn, sid):
+        row = conn.execute(
+            "SELECT data FROM sessions WHERE id = ? AND expires_at > ?",
+            (sid, time.time())
+        ).fetchone()
+        return row['data'] if row else None
+
+    def store_to(self, conn, sid, payload, ttl):
+        now = time.time()
+        conn.execute(
+            """INSERT INTO sessions (id, data, expires_at) VALUES (?, ?, ?)
+               ON CONFLICT(id) DO UPDATE SET data = excluded.data,
+                                             expires_at = excluded.expires_at""",
+            (sid, payload, now + ttl)
+        )
+        self._writes += 1
+        if self._writes % self.sweep_every == 0:
+            conn.execute("DELETE FROM sessions WHERE expires_at < ?", (now,))
+
+    def delete_from(self, conn, sid):
+        conn.execute("DELETE FROM sessions WHERE id = ?", (sid,))
+
+    def load(self, sid):
+        conn = db.get_connection()
+        try:
+            return self.load_from(conn, sid)
+        finally:
+            conn.close()
+
+    def store(self, sid, payload, ttl):
+        conn = db.get_connection()
+        try:
+            self.store_to(conn, sid, payload, ttl)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def delete(self, sid):
+        conn = db.get_connection()
+        try:
+            self.delete_from(conn, sid)
+            conn.commit()
+        finally:
+            conn.close()
+
+
+class ServerSideSessionInterface(SessionInterface):
+    def __init__(self, backend):
+        self.backend = backend
+
+    def _ttl(self, app):
+        return int(app.permanent_session_lifetime.total_seconds())
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            payload = self.backend.load(sid)
+            if payload is not None:
+                return ServerSideSession(serializer.loads(payload), sid=sid)
+        return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.replaced_sid is not None:
+            self.backend.delete(session.replaced_sid)
+
+        if not session:
+            if session.modified and not session.new:
+                self.backend.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if session.modified:
+            self.backend.store(session.sid, serializer.dumps(dict(session)), self._ttl(app))
+
+        if session.new or self.should_set_cookie(app, session):
+            response.set_cookie(
+                name,
+                session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+
+def make_session_interface(kind):
+    if kind == "memory":
+        return ServerSideSessionInterface(MemorySessionBackend())
+    if kind == "sqlite":
+        return ServerSideSessionInterface(SQLiteSessionBackend())
+    if kind == "cookie":
+        return SecureCookieSessionInterface()
+    raise ValueError(f"Unknown SESSION_BACKEND: {kind}")
@@ -0,0 +1,168 @@
+"""Background task queue backed by the task_queue table in users.db.
+
+Handlers are registered by name and called with the task's JSON payload;
+whatever they return is stored as the task result. Task ids are chosen by
+the caller, so enqueueing the same id twice is a no-op. Failed tasks are
+retried with exponential backoff until max_attempts, and a task whose
+worker died mid-run is picked up again once its lease expires, unless
+that was its last attempt.
+"""
+import json
+import logging
+import threading
+import time
+
+import db
+
+logger = logging.getLogger(__name__)
+
+
+class TaskQueue:
+    def __init__(self, poll_interval=0.5, lease_seconds=300, max_attempts=3, backoff=2.0):
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._handlers = {}
+        self._wakeup = threading.Condition()
+        self._threads = []
+        self._stopping = False
+
+    def handler(self, kind):
+        def register(fn):
+            self._handlers[kind] = fn
+            return fn
+        return register
+
+    def enqueue(self, conn, task_id, kind, payload):
+        """Queue a task on the caller's connection; commit is left to the caller."""
+        now = time.time()
+        conn.execute(
+            """INSERT OR IGNORE INTO task_queue
+               (id, kind, payload, status, attempts, max_attempts, run_after, created_at, updated_at)
+               VALUES (?, ?, ?, 'queued', 0, ?, ?, ?, ?)""",
+            (task_id, kind, json.dumps(payload), self.max_attempts, now, now, now)
+        )
+        with self._wakeup:
+            self._wakeup.notify()
+        return task_id
+
+    def status(self, conn, task_id):
+        row = conn.execute(
+            "SELECT status, attempts, result, error FROM task_queue WHERE id = ?",
+            (task_id,)
+        ).fetchone()
+        if not row:
+            return None
+        return {
+            'status': row['status'],
+            'attempts': row['attempts'],
+            'result': json.loads(row['result']) if row['result'] else None,
+            'error': row['error'],
+        }
+
+    def _claim(self, conn):
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # An expired lease whose worker used up the last attempt is not retried
+            conn.execute(
+                """UPDATE task_queue
+                   SET status = 'failed', error = 'Lease expired on the last attempt', updated_at = ?
+                   WHERE status = 'running' AND run_after <= ? AND attempts >= max_attempts""",
+                (now, now)
+            )
+            row = conn.execute(
+                """SELECT id, kind, payload, attempts, max_attempts FROM task_queue
+                   WHERE (status = 'queued' AND run_after <= ?)
+                      OR (status = 'running' AND run_after <= ?)
+                   ORDER BY run_after LIMIT 1""",
+                (now, now)
+            ).fetchone()
+            if row:
+                # While running, run_after doubles as the lease expiry
+                conn.execute(
+                    """UPDATE task_queue
+                       SET status = 'running', attempts = attempts + 1,
+                           run_after = ?, updated_at = ?
+                       WHERE id = ?""",
+                    (now + self.lease_seconds, now, row['id'])
+                )
+            conn.commit()
+            return row
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _finish(self, conn, task, result=None, error=None):
+        now = time.time()
+        if error is None:
+            conn.execute(
+                """UPDATE task_queue SET status = 'done', result = ?, error = NULL, updated_at = ?
+                   WHERE id = ?""",
+                (json.dumps(result), now, task['id'])
+            )
+        elif task['attempts'] + 1 >= task['max_attempts']:
+            conn.execute(
+                "UPDATE task_queue SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+                (error, now, task['id'])
+            )
+        else:
+            retry_at = now + self.backoff ** (task['attempts'] + 1)
+            conn.execute(
+                """UPDATE task_queue SET status = 'queued', error = ?, run_after = ?, updated_at = ?
+                   WHERE id = ?""",
+                (error, retry_at, now, task['id'])
+            )
+        conn.commit()
+
+    def run_once(self):
+        """Claim and run a single due task. Returns False if there was nothing to do."""
+        conn = db.get_connection()
+        try:
+            task = self._claim(conn)
+            if not task:
+                return False
+            handler = self._handlers.get(task['kind'])
+            try:
+                if handler is None:
+                    raise LookupError(f"No handler registered for {task['kind']}")
+                result = handler(json.loads(task['payload']))
+            except Exception as e:
+                logger.error(f"Task {task['id']} failed: {str(e)}")
+                # The handler shares this pooled connection; drop its half-done writes
+                conn.rollback()
+                self._finish(conn, task, error=str(e))
+            else:
+                self._finish(conn, task, result=result)
+            return True
+        finally:
+            conn.close()
+
+    def _worker(self):
+        while not self._stopping:
+            try:
+                if self.run_once():
+                    continue
+            except Exception as e:
+                logger.error(f"Task worker error: {str(e)}")
+            with self._wakeup:
+                self._wakeup.wait(self.poll_interval)
+
+    def start(self, workers=2):
+        for i in range(workers):
+            t = threading.Thread(target=self._worker, name=f"task-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        self._stopping = True
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for t in self._threads:
+            t.join()
+        self._threads = []
+        self._stopping = False
+
+
+queue = TaskQueue()
@@ -0,0 +1,31 @@
+"""Every SQL statement the app runs must be able to use an index.
+
+The statements are the literals passed to execute()/executemany() in each
+module (bench.SQL_MODULES) plus the generated job feed and search queries;
+`bench.py plans --rows N` runs the same check on a bigger database.
+"""
+import bench
+import migrations
+from db import ConnectionPool
+
+ROWS = 2000
+
+
+def test_no_statement_falls_back_to_a_full_table_scan(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "plans.db"), max_size=1)
+    conn = pool.acquire()
+    try:
+        migrations.migrate(conn)
+        bench.seed_database(conn, users=ROWS, jobs=ROWS, questions=ROWS,
+                            sessions=ROWS, answers=ROWS)
+        failures = bench.plan_failures(conn)
+    finally:
+        pool.close_all()
+    assert not failures, "\n".join(failures)
+
+
+def test_every_module_is_checked():
+    checked = {path.replace("\\", "/").rsplit("/", 1)[-1] for path in bench.SQL_MODULES}
+    assert {"app.py", "progress.py", "answer_key.py", "session_store.py",
+            "aio_db.py"} <= checked
+    assert "migrations.py" not in checked
@@ -0,0 +1,31 @@
+"""The scorers against stored results from the original analyze_answers.
+
+bench_scoring_golden.json holds interviews chosen to hit the edges of the
+scoring rules: nothing answered, empty answers counted in the average,
+the length buckets around 20 characters, keywords present or missing,
+and the first/then structure bonus. `bench.py scoring` times the same
+functions on a large random corpus.
+"""
+import json
+import os
+
+import pytest
+
+from scoring import analyze_answers, batch_analyze
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_scoring_golden.json")
+
+with open(GOLDEN_PATH, encoding="utf-8") as f:
+    GOLDEN = json.load(f)
+
+
+def test_batch_analyze_matches_golden():
+    pytest.importorskip("numpy")
+    actual = batch_analyze([case['answers'] for case in GOLDEN])
+    for i, (case, result) in enumerate(zip(GOLDEN, actual)):
+        assert result == case['expected'], f"case {i}: {case['answers']!r}"
+
+
+@pytest.mark.parametrize("case", GOLDEN, ids=range(len(GOLDEN)))
+def test_analyze_answers_matches_golden(case):
+    assert analyze_answers([{'text': t} for t in case['answers']]) == case['expected']
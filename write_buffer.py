@@ -0,0 +1,135 @@
+"""Batched writes for interview and test answers.
+
+save_* helpers write a whole batch with executemany in one transaction.
+AnswerWriteBuffer optionally coalesces /test/submit-answer calls across
+requests and flushes them when the batch fills up or max_delay elapses.
+
+The buffer lives in process memory. test_complete calls flush() before
+scoring, which makes every answer this process accepted durable. Only
+enable it (ANSWER_WRITE_BEHIND=1) when a test session is served by a
+single worker process; threads within that process are fine.
+
+Only the first answer to a question in a test is kept; repeats are
+dropped by the unique index on (test_session_id, question_id), before the
+score trigger sees them.
+"""
+import atexit
+import logging
+import sqlite3
+import threading
+import time
+
+import db
+
+logger = logging.getLogger(__name__)
+
+TEST_ANSWER_INSERT = '''
+    INSERT INTO test_answers
+    (test_session_id, question_id, user_id, answer, is_correct, answered_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (test_session_id, question_id) DO NOTHING
+'''
+
+
+def save_test_answers(conn, rows):
+    conn.executemany(TEST_ANSWER_INSERT, rows)
+
+
+def save_interview_answers(conn, interview_id, answers):
+    conn.executemany(
+        """INSERT INTO interview_answers
+           (interview_id, question_id, answer_text, is_audio, timestamp, answered)
+           VALUES (?, ?, ?, ?, ?, ?)""",
+        [(interview_id, a['question_id'], a['text'], a['is_audio'], a['timestamp'],
+          a.get('answered', False)) for a in answers]
+    )
+
+
+def save_interview_questions(conn, interview_id, question_ids):
+    conn.executemany(
+        """INSERT INTO interview_questions_mapping
+           (interview_id, question_id) VALUES (?, ?)""",
+        [(interview_id, qid) for qid in question_ids]
+    )
+
+
+def save_test_questions(conn, test_session_id, question_ids):
+    conn.executemany(
+        '''INSERT INTO test_questions
+           (test_session_id, question_id, question_order)
+           VALUES (?, ?, ?)''',
+        [(test_session_id, qid, i) for i, qid in enumerate(question_ids, 1)]
+    )
+
+
+class AnswerWriteBuffer:
+    def __init__(self, max_batch=200, max_delay=0.05):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._pending = []
+        self._cond = threading.Condition()
+        # Serialises flushes so flush() returns only once earlier rows are committed
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="answer-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def add(self, row):
+        with self._cond:
+            self._pending.append(row)
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify()
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of rows written."""
+        with self._flush_lock:
+            with self._cond:
+                rows, self._pending = self._pending, []
+            if not rows:
+                return 0
+            conn = db.get_connection()
+            try:
+                save_test_answers(conn, rows)
+                conn.commit()
+            except sqlite3.IntegrityError:
+                # One bad row must not block the rest of the batch
+                conn.rollback()
+                written = 0
+                for row in rows:
+                    try:
+                        save_test_answers(conn, [row])
+                        written += 1
+                    except sqlite3.IntegrityError:
+                        logger.error(f"Dropping invalid test answer: {row}")
+                conn.commit()
+                return written
+            except Exception:
+                conn.rollback()
+                # Put the batch back so a later flush can retry it
+                with self._cond:
+                    self._pending[:0] = rows
+                raise
+            finally:
+                conn.close()
+            return len(rows)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.max_delay
+                while len(self._pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            try:
+                self.flush()
+            except Exception:
+                time.sleep(self.max_delay)
+
+
+answer_buffer = AnswerWriteBuffer()